@@ -0,0 +1,58 @@
+"""
+Benchmark serial vs parallel PDF extraction on the sample PDFs.
+
+Usage (from backend/):
+    python bench_extraction.py [--workers 4] [--repeat 3]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from PyPDF2 import PdfReader
+from ingestion import extract_pdf_with_pages, PDF_EXTRACT_WORKERS
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "uploads")
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=max(2, PDF_EXTRACT_WORKERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'file':<26}{'pages':>6}{'serial s':>10}{'parallel s':>12}{'pages/s':>10}{'speedup':>9}")
+    print("-" * 73)
+
+    for path in sorted(glob.glob(os.path.join(UPLOAD_DIR, "*.pdf"))):
+        total_pages = len(PdfReader(path).pages)
+
+        serial_time, serial_pages = best_time(
+            lambda: list(extract_pdf_with_pages(path, workers=1)), args.repeat
+        )
+        # min_pages=0 forces the process pool even for small sample files
+        parallel_time, parallel_pages = best_time(
+            lambda: list(extract_pdf_with_pages(path, workers=args.workers, min_pages=0)), args.repeat
+        )
+
+        assert serial_pages == parallel_pages, f"Page order/content differs for {path}"
+
+        print(
+            f"{os.path.basename(path):<26}{total_pages:>6}{serial_time:>10.3f}{parallel_time:>12.3f}"
+            f"{total_pages / parallel_time:>10.1f}{serial_time / parallel_time:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Recall@k vs. size benchmark for the local index vector encodings.
+
+Builds the local index once per storage mode on the same synthetic,
+clustered embeddings (topic centroids plus noise, like chunks of a few
+documents) and compares each mode against exact float32 search:
+- bytes per vector and vector files on disk
+- recall@k of the returned chunk ids vs. the float32 top-k
+- search latency per query
+
+Usage (from backend/):
+    python bench_quantization.py [--vectors 20000] [--dims 768] [--queries 200] [--top-k 8]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from local_index import LocalVectorIndex
+from quantization import bytes_per_vector
+
+# (label, dtype, full-precision rerank)
+MODES = (
+    ("float32", "float32", False),
+    ("float16", "float16", False),
+    ("int8", "int8", False),
+    ("float16+rerank", "float16", True),
+    ("int8+rerank", "int8", True),
+)
+
+
+def synthetic_embeddings(n: int, dims: int, topics: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(topics, dims)).astype(np.float32)
+    labels = rng.integers(0, topics, size=n)
+    noise = rng.normal(scale=0.6, size=(n, dims)).astype(np.float32)
+    return centroids[labels] + noise
+
+
+def build_index(index_dir: str, dtype: str, rerank: bool, vectors: np.ndarray, batch: int = 1000):
+    index = LocalVectorIndex(index_dir, dtype=dtype, full_precision=rerank)
+    for start in range(0, len(vectors), batch):
+        index.add([
+            {"text": str(i), "filename": f"doc-{i % 50}.txt", "page_number": 1, "embedding": v}
+            for i, v in enumerate(vectors[start:start + batch].tolist(), start)
+        ])
+    return index
+
+
+def run_mode(dtype: str, rerank: bool, vectors: np.ndarray, queries: np.ndarray, top_k: int):
+    index_dir = tempfile.mkdtemp(prefix="documate-quant-")
+    try:
+        index = build_index(index_dir, dtype, rerank, vectors)
+        ids, latencies = [], []
+        for q in queries.tolist():
+            start = time.perf_counter()
+            hits = index.search(q, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids.append([int(h["text"]) for h in hits])
+        return {
+            "bytes_on_disk": index.size_bytes(),
+            "ids": ids,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+        }
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def recall(ids, exact_ids) -> float:
+    found = sum(len(set(a) & set(b)) for a, b in zip(ids, exact_ids))
+    return found / sum(len(b) for b in exact_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs. size for quantized vector storage")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=100, help="Clusters in the synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.vectors, args.dims, args.topics)
+    # Queries are perturbed stored vectors, so each has true near neighbours
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, args.vectors, size=args.queries)
+    queries = vectors[picks] + rng.normal(scale=0.3, size=(args.queries, args.dims)).astype(np.float32)
+
+    print(f"{args.vectors} vectors x {args.dims} dims, {args.queries} queries, recall@{args.top_k}\n")
+    print(f"{'mode':<16}{'bytes/vec':>10}{'disk MB':>10}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}")
+
+    exact_ids = None
+    for label, dtype, rerank in MODES:
+        result = run_mode(dtype, rerank, vectors, queries, args.top_k)
+        if exact_ids is None:
+            exact_ids = result["ids"]
+        per_vector = bytes_per_vector(dtype, args.dims) + (4 * args.dims if rerank else 0)
+        print(
+            f"{label:<16}{per_vector:>10}{result['bytes_on_disk'] / 1e6:>10.1f}"
+            f"{recall(result['ids'], exact_ids):>9.3f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
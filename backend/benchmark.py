@@ -0,0 +1,311 @@
+"""
+Offline benchmark for ingestion and question answering.
+
+Runs without Gemini or MongoDB: a deterministic fake embedder and
+generator (with configurable latency) and the local vector index in a
+temporary directory. Ingests every file in data/uploads, replays the
+questions in test_questions.md and reports:
+- pages/sec for extraction, chunks/sec for chunking, embedding and
+  end-to-end ingestion
+- p50/p95/p99 latency per /ask stage (embed, retrieval stages, packing,
+  generation, total)
+- peak RSS
+
+Results are saved as JSON; --compare prints the change against an
+earlier run and exits non-zero on regressions.
+
+Usage (from backend/):
+    python benchmark.py [--embed-latency 0.05] [--gen-latency 0.2] [--rounds 3]
+    python benchmark.py --compare ../data/benchmarks/<earlier>.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Offline by default: local vector index in a throwaway directory
+os.environ.setdefault("VECTOR_BACKEND", "local")
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-bench-")
+
+import numpy as np
+
+from ingestion import extract_document, chunk_text
+from embedding import embed_texts, set_embedder, EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY
+from generation import set_generator
+from pipeline import index_document
+from vector_store import clear_collection, RETRIEVAL_MODE, VECTOR_BACKEND
+from rag import embed_query, build_context, generate_answer, cite, query_cache, answer_cache
+from fakes import FakeEmbedder, FakeGenerator
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_DIR = os.path.join(BASE_DIR, "data", "uploads")
+QUESTIONS_PATH = os.path.join(BASE_DIR, "test_questions.md")
+RESULTS_DIR = os.path.join(BASE_DIR, "data", "benchmarks")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".md", ".markdown")
+
+# Higher is better for throughputs, lower for latencies
+THROUGHPUT_SUFFIX = "_per_sec"
+LATENCY_SUFFIXES = ("_ms", ".p50", ".p95", ".p99")
+
+
+def load_questions(path: str = QUESTIONS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return re.findall(r'\*\*Question\*\*:\s*"(.+?)"', f.read())
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "count": len(values),
+        "mean": round(float(arr.mean()), 3),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3)
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children."""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(max(own, children) / (1024 * 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_ingestion(paths):
+    """Time each ingestion stage separately, then the real pipeline end to end."""
+    pages_total = chunks_total = 0
+    extract_s = chunk_s = embed_s = 0.0
+    per_file = []
+
+    for path in paths:
+        start = time.perf_counter()
+        pages = list(extract_document(path))
+        extracted = time.perf_counter()
+        chunks = list(chunk_text(pages))
+        chunked = time.perf_counter()
+        embed_texts([c["text"] for c in chunks])
+        embedded = time.perf_counter()
+
+        pages_total += len(pages)
+        chunks_total += len(chunks)
+        extract_s += extracted - start
+        chunk_s += chunked - extracted
+        embed_s += embedded - chunked
+        per_file.append({
+            "file": os.path.basename(path),
+            "pages": len(pages),
+            "chunks": len(chunks),
+            "extract_ms": round((extracted - start) * 1000, 2),
+            "chunk_ms": round((chunked - extracted) * 1000, 2),
+            "embed_ms": round((embedded - chunked) * 1000, 2)
+        })
+
+    clear_collection()
+    start = time.perf_counter()
+    indexed = sum(index_document(path)["chunks_created"] for path in paths)
+    ingest_s = time.perf_counter() - start
+
+    return {
+        "files": len(paths),
+        "pages": pages_total,
+        "chunks": chunks_total,
+        "extract_pages_per_sec": round(pages_total / extract_s, 2) if extract_s else None,
+        "chunk_chunks_per_sec": round(chunks_total / chunk_s, 2) if chunk_s else None,
+        "embed_chunks_per_sec": round(chunks_total / embed_s, 2) if embed_s else None,
+        "ingest_chunks_per_sec": round(indexed / ingest_s, 2) if ingest_s else None,
+        "ingest_total_ms": round(ingest_s * 1000, 2),
+        "per_file": per_file
+    }
+
+
+def bench_ask(questions, rounds: int, top_k: int, warmup: int = 1):
+    """
+    Replay the questions through the /ask pipeline stages.
+    Caches are cleared every round so each round measures cold questions;
+    the first warmup rounds are not recorded.
+    """
+    stages = {}
+
+    def record(stage, ms):
+        if not warming_up:
+            stages.setdefault(stage, []).append(ms)
+
+    for round_number in range(warmup + rounds):
+        warming_up = round_number < warmup
+        query_cache.clear()
+        answer_cache.clear()
+        for question in questions:
+            start = time.perf_counter()
+            query_embedding = embed_query(question)
+            embedded = time.perf_counter()
+            chunks, timings, _ = build_context(question, query_embedding, top_k)
+            retrieved = time.perf_counter()
+            answer = generate_answer(question, chunks)
+            cite(answer, chunks)
+            done = time.perf_counter()
+
+            record("embed_ms", (embedded - start) * 1000)
+            for stage, ms in timings.items():
+                record(stage, ms)
+            record("retrieval_ms", (retrieved - embedded) * 1000)
+            record("generation_ms", (done - retrieved) * 1000)
+            record("total_ms", (done - start) * 1000)
+
+    return {stage: percentiles(values) for stage, values in stages.items()}
+
+
+def flatten(results):
+    """Comparable scalar metrics as {"section.metric[.stat]": value}."""
+    flat = {}
+    for key, value in results["ingestion"].items():
+        if isinstance(value, (int, float)) and value is not None:
+            flat[f"ingestion.{key}"] = value
+    for stage, stats in results["ask"].items():
+        for stat in ("p50", "p95", "p99"):
+            if stat in stats:
+                flat[f"ask.{stage}.{stat}"] = stats[stat]
+    flat["peak_rss_mb"] = results["peak_rss_mb"]
+    return flat
+
+
+def compare(baseline, current, threshold: float, min_delta_ms: float) -> int:
+    """
+    Print metric changes; return the number of regressions, i.e. latencies,
+    throughputs or memory that got worse by more than threshold percent.
+    Latency changes under min_delta_ms are treated as noise.
+    """
+    old, new = flatten(baseline), flatten(current)
+    print(f"\nCompared with {baseline['meta']['commit']} ({baseline['meta']['timestamp']}):")
+    if baseline["meta"]["config"] != current["meta"]["config"]:
+        print("Warning: benchmark configuration differs between runs")
+    print(f"{'metric':<36}{'before':>12}{'after':>12}{'change':>10}")
+    print("-" * 70)
+
+    regressions = 0
+    for key in sorted(set(old) & set(new)):
+        before, after = old[key], new[key]
+        change = (after - before) / before * 100 if before else 0.0
+        if key.endswith(THROUGHPUT_SUFFIX):
+            worse = -change
+        elif key.endswith(LATENCY_SUFFIXES):
+            worse = change if after - before >= min_delta_ms else 0.0
+        elif key == "peak_rss_mb":
+            worse = change
+        else:
+            worse = 0.0  # counts (files, pages, chunks) are not performance
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key:<36}{before:>12.2f}{after:>12.2f}{change:>+9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and /ask benchmark")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per fake embedding batch call")
+    parser.add_argument("--gen-latency", type=float, default=0.2, help="Seconds per fake generation")
+    parser.add_argument("--dims", type=int, default=768, help="Fake embedding dimensions")
+    parser.add_argument("--rounds", type=int, default=3, help="Times to replay the question set")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed rounds before measuring")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--uploads", default=UPLOAD_DIR, help="Directory of documents to ingest")
+    parser.add_argument("--questions", default=QUESTIONS_PATH)
+    parser.add_argument("--output", help="JSON results path (default: data/benchmarks/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    set_embedder(FakeEmbedder(latency=args.embed_latency, dims=args.dims))
+    set_generator(FakeGenerator(latency=args.gen_latency, answer="Benchmark answer.", cite_prompt=True))
+
+    paths = sorted(
+        p for p in glob.glob(os.path.join(args.uploads, "*"))
+        if p.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+    questions = load_questions(args.questions)
+    print(f"Ingesting {len(paths)} files, replaying {len(questions)} questions x {args.rounds}")
+
+    ingestion = bench_ingestion(paths)
+    ask = bench_ask(questions, args.rounds, args.top_k, args.warmup)
+    clear_collection()
+    shutil.rmtree(os.environ["LOCAL_INDEX_DIR"], ignore_errors=True)
+
+    timestamp = datetime.now(timezone.utc)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": timestamp.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {
+                "vector_backend": VECTOR_BACKEND,
+                "retrieval_mode": RETRIEVAL_MODE,
+                "embed_latency": args.embed_latency,
+                "gen_latency": args.gen_latency,
+                "dims": args.dims,
+                "rounds": args.rounds,
+                "warmup": args.warmup,
+                "top_k": args.top_k,
+                "embed_batch_size": EMBED_BATCH_SIZE,
+                "embed_max_concurrency": EMBED_MAX_CONCURRENCY
+            }
+        },
+        "ingestion": ingestion,
+        "ask": ask,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+    print(f"\nExtraction: {ingestion['extract_pages_per_sec']} pages/s ({ingestion['pages']} pages)")
+    print(f"Chunking:   {ingestion['chunk_chunks_per_sec']} chunks/s ({ingestion['chunks']} chunks)")
+    print(f"Embedding:  {ingestion['embed_chunks_per_sec']} chunks/s")
+    print(f"Ingestion:  {ingestion['ingest_chunks_per_sec']} chunks/s end to end")
+    print(f"\n{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print("-" * 46)
+    for stage, stats in ask.items():
+        print(f"{stage:<16}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}")
+    print(f"\nPeak RSS: {results['peak_rss_mb']} MB")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{results['meta']['commit']}-{timestamp.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+# backend/cache.py
+
+"""
+Caching Utilities
+
+- TTLCache: bounded in-memory LRU cache with per-entry expiry
+- DiskCache: optional SQLite tier so entries survive restarts and are
+  shared between uvicorn worker processes
+- Hit/miss counters for both tiers
+- EmbeddingStore: content-addressed SQLite store of chunk vectors
+- SingleFlight: concurrent identical computations share one run
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used in cache keys."""
+    return " ".join(question.lower().split())
+
+
+class DiskCache:
+    """
+    SQLite-backed key/value store for JSON-serializable values.
+    WAL mode lets several processes read and write the same file.
+    Every PRUNE_EVERY writes, expired rows are deleted and, above max_rows,
+    the least recently used rows are evicted.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_rows: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections must not cross a fork; reopen in the child
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL DEFAULT 0)"
+            )
+            # Files written before the size bound existed have no "used" column
+            if "used" not in {row[1] for row in conn.execute("PRAGMA table_info(cache)")}:
+                conn.execute("ALTER TABLE cache ADD COLUMN used REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache (created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """(value, seconds until it expires or None) for a live entry, else None."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            remaining = self.ttl - (now - row[1]) if self.ttl is not None else None
+            if remaining is not None and remaining <= 0:
+                return None
+            if self.max_rows is not None:
+                conn.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+                conn.commit()
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+            conn.commit()
+
+    def prune(self):
+        """Delete expired rows and evict down to max_rows now."""
+        with self._lock:
+            conn = self._connection()
+            self._prune(conn, time.time())
+            conn.commit()
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM cache WHERE created < ?", (now - self.ttl,))
+        if self.max_rows is not None:
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+
+class EmbeddingStore:
+    """
+    SQLite store of vectors keyed by SHA-256 of (model, text), so a chunk
+    is embedded once per model no matter how often it is re-ingested.
+    Vectors are packed float32. Once the vectors exceed max_bytes, the
+    least recently used entries are evicted. Entry and byte totals live in
+    a one-row meta table kept by triggers, so they change in the same
+    transaction as the rows and are read without scanning. Same WAL/fork
+    handling as DiskCache.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # text not sent to the embedding provider
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+            # Triggers first, then the totals (one scan, for stores created
+            # before they existed), under one write lock
+            conn.executescript("""
+                BEGIN IMMEDIATE;
+                CREATE TABLE IF NOT EXISTS embeddings_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL, bytes INTEGER NOT NULL);
+                CREATE TRIGGER IF NOT EXISTS embeddings_added AFTER INSERT ON embeddings BEGIN
+                    UPDATE embeddings_meta SET entries = entries + 1, bytes = bytes + length(new.vector);
+                END;
+                CREATE TRIGGER IF NOT EXISTS embeddings_removed AFTER DELETE ON embeddings BEGIN
+                    UPDATE embeddings_meta SET entries = entries - 1, bytes = bytes - length(old.vector);
+                END;
+                INSERT OR IGNORE INTO embeddings_meta (id, entries, bytes)
+                    SELECT 1, COUNT(*), COALESCE(SUM(length(vector)), 0) FROM embeddings;
+                COMMIT;
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Stored vectors in input order; None where the text has not been embedded."""
+        keys = [self.key(model, text) for text in texts]
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET used = ? WHERE key = ?", [(now, k) for k in found])
+                conn.commit()
+
+        vectors = []
+        for key, text in zip(keys, texts):
+            blob = found.get(key)
+            vectors.append(array("f", blob).tolist() if blob is not None else None)
+        with self._lock:
+            self.hits += sum(v is not None for v in vectors)
+            self.misses += sum(v is None for v in vectors)
+            self.bytes_saved += sum(len(t.encode("utf-8")) for t, v in zip(texts, vectors) if v is not None)
+        return vectors
+
+    def set_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [(self.key(model, text), array("f", vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            conn = self._connection()
+            # Same key, same vector: an existing row is only touched, which
+            # also keeps the insert/delete triggers (and the totals) exact
+            conn.executemany(
+                "INSERT INTO embeddings (key, vector, used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET used = excluded.used",
+                rows
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used vectors until the store is within max_bytes."""
+        excess = self._totals(conn)[1] - self.max_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in conn.execute("SELECT key, length(vector) FROM embeddings ORDER BY used"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    @staticmethod
+    def _totals(conn: sqlite3.Connection) -> Tuple[int, int]:
+        """(entries, bytes of vectors), from the meta row."""
+        return conn.execute("SELECT entries, bytes FROM embeddings_meta").fetchone()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            entries, size = self._totals(conn)
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions
+            }
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a maximum size and per-entry time-to-live.
+    An optional DiskCache acts as a second tier behind the in-memory one.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 3600, disk: Optional[DiskCache] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk = disk
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """get() for coroutines: a disk lookup runs on a worker thread."""
+        value = self._get_memory(key)
+        if value is not None or self.disk is None:
+            return value if value is not None else self._get_disk(key)
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+        return None
+
+    def _get_disk(self, key: str) -> Optional[Any]:
+        """Second-tier lookup after a memory miss (counts the miss if absent)."""
+        if self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is not None:
+                # Keep the disk entry's remaining lifetime, not a fresh TTL
+                value, remaining = entry
+                self._store(key, value, remaining)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        self._store(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def set_async(self, key: str, value: Any):
+        """set() for coroutines: the disk write runs on a worker thread."""
+        self._store(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def _store(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class _Call:
+    """One in-flight SingleFlight.do() computation."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one computation:
+    the first caller runs it, later callers wait and share its result (or
+    its exception). Nothing is kept once the computation finishes, so
+    this complements a cache rather than replacing it.
+    do() is for threads, do_async() for coroutines on an event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], "asyncio.Task"] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # The computation runs as its own task, so a caller that goes away
+        # (client disconnect) does not cancel it for everyone else
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda t: self._finish(task_key, t))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, task_key: Tuple[int, str], task: "asyncio.Task"):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller went away
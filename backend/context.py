@@ -0,0 +1,208 @@
+# backend/context.py
+
+"""
+Context Assembly (between retrieval and generation)
+
+- Re-ranks candidates with maximal marginal relevance (MMR) so
+  near-duplicate chunks don't crowd the prompt
+- Merges chunks from the same file/page whose text overlaps (chunk_text
+  uses a 100-word overlap), so shared text appears once
+- Packs the result into a token budget
+"""
+
+from typing import List, Dict, Optional, Tuple
+import math
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Candidates retrieved per requested chunk, for MMR to choose from
+CONTEXT_OVERSAMPLE = int(os.getenv("CONTEXT_OVERSAMPLE", "3"))
+
+# Longest word overlap looked for when merging neighbouring chunks
+MAX_MERGE_OVERLAP = 200
+
+
+def estimate_tokens(text: str) -> int:
+    """Word-based token estimate (750 words ~ 1000 tokens)."""
+    return math.ceil(len(text.split()) * 4 / 3)
+
+
+def _word_set(text: str) -> set:
+    return set(text.lower().split())
+
+
+def _similarity_matrix(chunks: List[Dict]) -> np.ndarray:
+    """
+    Pairwise similarity: cosine of embeddings when every chunk has one,
+    otherwise Jaccard overlap of word sets.
+    """
+    if all(c.get("embedding") is not None for c in chunks):
+        matrix = np.asarray([c["embedding"] for c in chunks], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+        return matrix @ matrix.T
+
+    words = [_word_set(c["text"]) for c in chunks]
+    n = len(chunks)
+    sims = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(words[i] | words[j])
+            sims[i, j] = sims[j, i] = len(words[i] & words[j]) / union if union else 0.0
+    return sims
+
+
+def _relevance(chunks: List[Dict], query_embedding: Optional[List[float]]) -> np.ndarray:
+    """Cosine to the query when embeddings are available, else rank-based."""
+    if query_embedding is not None and all(c.get("embedding") is not None for c in chunks):
+        matrix = np.asarray([c["embedding"] for c in chunks], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        norms[norms == 0] = 1.0
+        return (matrix @ query) / norms
+
+    n = len(chunks)
+    return np.asarray([1.0 - i / n for i in range(n)], dtype=np.float32)
+
+
+def mmr_rerank(
+    chunks: List[Dict],
+    query_embedding: Optional[List[float]],
+    top_k: int,
+    mmr_lambda: float = MMR_LAMBDA
+) -> List[Dict]:
+    """
+    Greedy maximal marginal relevance:
+    pick argmax(lambda * relevance - (1 - lambda) * max similarity to picked).
+    """
+    if len(chunks) <= 1:
+        return list(chunks[:top_k])
+
+    relevance = _relevance(chunks, query_embedding)
+    sims = _similarity_matrix(chunks)
+
+    selected = [int(np.argmax(relevance))]
+    remaining = [i for i in range(len(chunks)) if i != selected[0]]
+    while remaining and len(selected) < top_k:
+        redundancy = sims[np.ix_(remaining, selected)].max(axis=1)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        remaining.remove(best)
+
+    return [chunks[i] for i in selected]
+
+
+def _overlap(first: List[str], second: List[str]) -> int:
+    """Length of the longest suffix of first that is a prefix of second."""
+    for size in range(min(len(first), len(second), MAX_MERGE_OVERLAP), 0, -1):
+        if first[-size:] == second[:size]:
+            return size
+    return 0
+
+
+def page_span(chunk: Dict) -> Tuple[int, int]:
+    """(first page, last page) of a chunk; single-page chunks may omit page_end."""
+    return chunk["page_number"], chunk.get("page_end") or chunk["page_number"]
+
+
+def merge_adjacent(chunks: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    Merge chunks from the same file and pages whose texts overlap, and drop
+    chunks wholly contained in another. Keeps the position of the first
+    chunk of each merged group; its page span grows to cover both.
+    Returns (chunks, number merged away).
+    """
+    merged: List[Dict] = []
+    removed = 0
+
+    for chunk in chunks:
+        words = chunk["text"].split()
+        start, end = page_span(chunk)
+        absorbed = False
+        for existing in merged:
+            existing_start, existing_end = page_span(existing)
+            # Overlapping text implies a shared page, so spans must intersect
+            if existing["filename"] != chunk["filename"] or start > existing_end or end < existing_start:
+                continue
+            if chunk["text"] in existing["text"]:
+                absorbed = True
+            elif existing["text"] in chunk["text"]:
+                existing["text"] = chunk["text"]
+                absorbed = True
+            else:
+                existing_words = existing["text"].split()
+                after = _overlap(existing_words, words)
+                before = _overlap(words, existing_words)
+                if after:
+                    existing["text"] = " ".join(existing_words + words[after:])
+                    absorbed = True
+                elif before:
+                    existing["text"] = " ".join(words + existing_words[before:])
+                    absorbed = True
+            if absorbed:
+                existing.pop("embedding", None)
+                if (start, end) != (existing_start, existing_end):
+                    existing["page_number"] = min(start, existing_start)
+                    existing["page_end"] = max(end, existing_end)
+                removed += 1
+                break
+
+        if not absorbed:
+            merged.append(dict(chunk))
+
+    return merged, removed
+
+
+def pack_context(
+    chunks: List[Dict],
+    query_embedding: Optional[List[float]] = None,
+    top_k: int = 8,
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[List[Dict], Dict]:
+    """
+    MMR re-rank -> merge overlapping neighbours -> pack to token budget.
+    Returns the chunks for the prompt (without embeddings) and packing stats.
+    """
+    candidate_tokens = sum(estimate_tokens(c["text"]) for c in chunks)
+
+    selected = mmr_rerank(chunks, query_embedding, top_k)
+    naive_tokens = sum(estimate_tokens(c["text"]) for c in chunks[:top_k])
+    merged, merged_count = merge_adjacent(selected)
+
+    packed = []
+    used = 0
+    truncated = 0
+    for chunk in merged:
+        tokens = estimate_tokens(chunk["text"])
+        if used + tokens > token_budget:
+            if packed:
+                continue  # a smaller later chunk may still fit
+            # Always keep something: trim the best chunk to the budget
+            words = chunk["text"].split()[:int(token_budget * 3 / 4)]
+            chunk = {**chunk, "text": " ".join(words)}
+            tokens = estimate_tokens(chunk["text"])
+            truncated += 1
+        packed.append({k: v for k, v in chunk.items() if k != "embedding"})
+        used += tokens
+
+    stats = {
+        "candidates": len(chunks),
+        "candidate_tokens": candidate_tokens,
+        "selected": len(selected),
+        "merged": merged_count,
+        "packed": len(packed),
+        "dropped_over_budget": len(merged) - len(packed),
+        "truncated": truncated,
+        "tokens_without_packing": naive_tokens,
+        "tokens": used,
+        "token_budget": token_budget
+    }
+    return packed, stats
@@ -0,0 +1,190 @@
+# backend/dedup.py
+
+"""
+Near-Duplicate Chunk Detection (MinHash + LSH)
+
+Headers, footers, disclaimers and boilerplate repeat on every page, and
+each repeat would otherwise be embedded and stored as its own chunk.
+
+- Each chunk gets a MinHash signature over its word 3-grams; the share
+  of equal signature values estimates the Jaccard similarity of the texts
+- Signatures are split into bands; chunks sharing any band are candidates
+  (LSH), and candidates at or above DEDUP_THRESHOLD are near-duplicates
+- Within a document, near-duplicates collapse into the first chunk, which
+  records every page it appears on ("pages")
+- Across the corpus, a chunk that near-duplicates a stored chunk reuses
+  that chunk's vector instead of being embedded again
+
+The corpus index is persisted next to the local vector index and kept in
+step with inserts and deletes, like the BM25 index (lexical_index.py):
+a snapshot plus an append-only log (snapshot_log.py), so each batch
+writes only its own signatures, and deletes drop only their own buckets.
+"""
+
+from typing import List, Dict, Optional, Set, Tuple
+import hashlib
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+
+from snapshot_log import LoggedIndex
+
+# Load environment variables
+load_dotenv()
+
+DEDUP_INDEX_FILE = "minhash.pkl"
+
+# Estimated Jaccard similarity (of word 3-grams) at which chunks count as duplicates
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+
+# 32 bands of 4 rows: pairs above ~0.5 similarity almost always become candidates
+NUM_PERM = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+# Fixed seed: signatures must stay comparable across processes and restarts
+_A = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Lowercased word n-grams (the whole text for shorter texts)."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of a text's shingles."""
+    values = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles(text)),
+        dtype=np.uint64
+    )
+    # (a * x + b) mod p for every permutation and shingle; a, x < 2^32 so nothing overflows
+    hashed = (np.outer(_A, values) + _B[:, None]) % _MERSENNE
+    return hashed.min(axis=1)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(first == second))
+
+
+class NearDuplicateIndex(LoggedIndex):
+    """
+    LSH index of MinHash signatures, keyed by (filename, chunk_hash).
+    With a path it is persisted and reloaded when another process changes it;
+    without one it lives in memory (e.g. for one document being ingested).
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        super().__init__(path)
+
+    def _reset(self):
+        self.signatures: Dict[Tuple[str, str], np.ndarray] = {}
+        # (band, band values) -> keys
+        self.buckets: Dict[Tuple[int, bytes], Set[Tuple[str, str]]] = {}
+        self.by_filename: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def _state(self) -> Dict:
+        return {"signatures": self.signatures}
+
+    def _restore(self, state: Dict):
+        # Snapshots written before the log existed are the signatures dict itself
+        signatures = state["signatures"] if "signatures" in state else state
+        for key, signature in signatures.items():
+            self._insert(key, signature)
+
+    def _apply(self, op: Tuple):
+        if op[0] == "add":
+            for key, signature in op[1]:
+                self._insert(key, signature)
+        elif op[0] == "delete":
+            for key in self._matching(op[1], op[2]):
+                self._remove(key)
+
+    @staticmethod
+    def _bands(signature: np.ndarray):
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            yield band, signature[band * rows:(band + 1) * rows].tobytes()
+
+    def _insert(self, key: Tuple[str, str], signature: np.ndarray):
+        if key in self.signatures:
+            return
+        self.signatures[key] = signature
+        self.by_filename.setdefault(key[0], set()).add(key)
+        for band in self._bands(signature):
+            self.buckets.setdefault(band, set()).add(key)
+
+    def _remove(self, key: Tuple[str, str]):
+        signature = self.signatures.pop(key)
+        keys = self.by_filename[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.by_filename[key[0]]
+        for band in self._bands(signature):
+            bucket = self.buckets[band]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[band]
+
+    def _matching(self, filename: str, chunk_hashes: Optional[List[str]]) -> List[Tuple[str, str]]:
+        keys = self.by_filename.get(filename, ())
+        if chunk_hashes is None:
+            return list(keys)
+        hashes = set(chunk_hashes)
+        return [key for key in keys if key[1] in hashes]
+
+    def find(self, signature: np.ndarray) -> Optional[Tuple[str, str]]:
+        """Key of the most similar indexed chunk at or above the threshold, or None."""
+        with self._lock:
+            self._refresh()
+            candidates = set()
+            for band in self._bands(signature):
+                candidates.update(self.buckets.get(band, ()))
+            best, best_score = None, self.threshold
+            for key in candidates:
+                score = similarity(signature, self.signatures[key])
+                if score >= best_score:
+                    best, best_score = key, score
+            return best
+
+    def add(self, key: Tuple[str, str], signature: np.ndarray):
+        """Index one signature."""
+        with self._writing():
+            if key not in self.signatures:
+                self._record(("add", [(key, signature)]))
+
+    def add_chunks(self, chunks: List[Dict]):
+        """Index stored chunk documents (text, filename, chunk_hash) and persist."""
+        entries = [
+            ((chunk["filename"], chunk["chunk_hash"]), minhash(chunk["text"]))
+            for chunk in chunks if chunk.get("chunk_hash")
+        ]
+        if not entries:
+            return
+        with self._writing():
+            entries = [(key, signature) for key, signature in entries if key not in self.signatures]
+            if entries:
+                self._record(("add", entries))
+
+    def delete_by_filename(self, filename: str, chunk_hashes: Optional[List[str]] = None) -> int:
+        """Drop a document's signatures (or only the listed chunk hashes)."""
+        with self._writing():
+            removed = len(self._matching(filename, chunk_hashes))
+            if removed:
+                self._record(("delete", filename, list(chunk_hashes) if chunk_hashes is not None else None))
+            return removed
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self.signatures)
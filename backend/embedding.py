@@ -0,0 +1,181 @@
+# backend/embedding.py
+
+"""
+Embedding Pipeline
+
+- Pluggable embedder interface (Gemini by default, fakes for offline tests)
+- Sends texts to the provider in batches
+- Keeps a bounded number of batch requests in flight
+- Returns embeddings in the same order as the input texts
+- Async variants (embed_async / embed_batch_async) for the async /ask path
+- Optional persistent embedding store (EMBEDDING_STORE_PATH) that ingestion
+  checks before calling the provider, so vectors survive /reset and
+  re-ingests of unchanged text
+"""
+
+from typing import List, Optional
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from gemini import get_genai
+from cache import EmbeddingStore
+
+# Load environment variables
+load_dotenv()
+
+# Model
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Batching parameters
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+# Content-addressed vector store (SQLite); empty path disables it
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "")
+EMBEDDING_STORE_MAX_MB = float(os.getenv("EMBEDDING_STORE_MAX_MB", "1024"))
+
+
+class Embedder:
+    """
+    Base embedder interface.
+    Subclasses must implement embed_batch(); embed() is a convenience
+    wrapper for single texts. The async variants run the sync call on a
+    worker thread unless a subclass has a native async client.
+    """
+
+    model = EMBEDDING_MODEL
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    async def embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_batch, texts)
+
+    async def embed_async(self, text: str) -> List[float]:
+        return (await self.embed_batch_async([text]))[0]
+
+
+class GeminiEmbedder(Embedder):
+    """Embeds text with the Gemini embedding API."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # Gemini accepts a list of strings and returns one vector per entry
+        response = get_genai().embed_content(model=self.model, content=texts)
+        return response["embedding"]
+
+    def embed(self, text: str) -> List[float]:
+        response = get_genai().embed_content(model=self.model, content=text)
+        return response["embedding"]
+
+    async def embed_batch_async(self, texts: List[str]) -> List[List[float]]:
+        response = await get_genai().embed_content_async(model=self.model, content=texts)
+        return response["embedding"]
+
+    async def embed_async(self, text: str) -> List[float]:
+        response = await get_genai().embed_content_async(model=self.model, content=text)
+        return response["embedding"]
+
+
+_embedder: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    """Return the process-wide embedder (Gemini unless overridden)."""
+    global _embedder
+    if _embedder is None:
+        _embedder = GeminiEmbedder()
+    return _embedder
+
+
+def set_embedder(embedder: Optional[Embedder]):
+    """
+    Replace the process-wide embedder.
+    Used by tests and benchmarks to run without the Gemini API.
+    Passing None restores the default on next use.
+    """
+    global _embedder
+    _embedder = embedder
+
+
+def embed_texts(
+    texts: List[str],
+    embedder: Optional[Embedder] = None,
+    batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None
+) -> List[List[float]]:
+    """
+    Embed many texts using batched, concurrent provider calls.
+    Output order always matches input order.
+    """
+    if not texts:
+        return []
+
+    embedder = embedder or get_embedder()
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    max_concurrency = max(1, max_concurrency or EMBED_MAX_CONCURRENCY)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if len(batches) == 1 or max_concurrency == 1:
+        results = [embedder.embed_batch(batch) for batch in batches]
+    else:
+        # executor.map yields results in submission order, and at most
+        # max_concurrency batches are in flight at any time
+        workers = min(max_concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(embedder.embed_batch, batches))
+
+    embeddings = []
+    for batch, vectors in zip(batches, results):
+        if len(vectors) != len(batch):
+            raise ValueError(
+                f"Embedder returned {len(vectors)} vectors for a batch of {len(batch)} texts"
+            )
+        embeddings.extend(vectors)
+
+    return embeddings
+
+
+_store: Optional[EmbeddingStore] = None
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """Return the persistent embedding store, or None when EMBEDDING_STORE_PATH is unset."""
+    global _store
+    if _store is None and EMBEDDING_STORE_PATH:
+        _store = EmbeddingStore(EMBEDDING_STORE_PATH, max_bytes=int(EMBEDDING_STORE_MAX_MB * 1024 * 1024))
+    return _store
+
+
+def set_embedding_store(store: Optional[EmbeddingStore]):
+    """Replace the embedding store (tests); None falls back to EMBEDDING_STORE_PATH."""
+    global _store
+    _store = store
+
+
+def embed_texts_stored(texts: List[str], embedder: Optional[Embedder] = None) -> List[List[float]]:
+    """
+    embed_texts, but vectors already in the embedding store (same text and
+    model) are read from it, and new ones are added to it.
+    """
+    store = get_embedding_store()
+    if store is None or not texts:
+        return embed_texts(texts, embedder=embedder)
+
+    embedder = embedder or get_embedder()
+    embeddings = store.get_many(embedder.model, texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fresh = embed_texts([texts[i] for i in missing], embedder=embedder)
+        store.set_many(embedder.model, [texts[i] for i in missing], fresh)
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+    return embeddings
@@ -0,0 +1,89 @@
+# backend/fakes.py
+
+"""
+Offline Embedding / Generation Clients
+
+Shared by the test scripts, benchmark.py and load_test.py. They only add
+latency: time.sleep on the sync path, asyncio.sleep on the async path,
+so the async handlers are measured without worker threads.
+Nothing here reads or sets configuration; each script sets its own
+environment before importing the app.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+
+from embedding import Embedder
+from generation import Generator
+
+ANSWER = "Smart cities use sensors. [Source: city.txt, Page 1]"
+
+SOURCE_PATTERN = re.compile(r"\[Source: [^\]]+\]")
+
+
+class FakeEmbedder(Embedder):
+    """Deterministic offline embedder that sleeps to mimic provider latency."""
+
+    model = "fake-embedding"
+
+    def __init__(self, latency: float = 0.05, dims: int = 8):
+        self.latency = latency
+        self.dims = dims
+        self.calls = 0
+
+    def embed_batch(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def embed_batch_async(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:self.dims]]
+
+
+class FakeGenerator(Generator):
+    """
+    Scripted offline generator: waits latency seconds, then streams the
+    answer word by word, interval seconds apart.
+    - The question "explode" fails, for error-path tests
+    - cite_prompt=True appends the prompt's first [Source: ...] tag
+    - calls counts generations
+    """
+
+    model = "fake-generator"
+
+    def __init__(self, latency: float = 0.0, interval: float = 0.0, answer: str = ANSWER, cite_prompt: bool = False):
+        self.latency = latency
+        self.interval = interval
+        self.answer = answer
+        self.cite_prompt = cite_prompt
+        self.calls = 0
+
+    def _answer(self, prompt: str) -> str:
+        if "Question: explode" in prompt:
+            raise RuntimeError("generation failed")
+        if self.cite_prompt:
+            source = SOURCE_PATTERN.search(prompt)
+            return f"{self.answer} {source.group(0) if source else ''}".strip()
+        return self.answer
+
+    def stream(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        for i, word in enumerate(self._answer(prompt).split()):
+            time.sleep(self.interval)
+            yield word if i == 0 else " " + word
+
+    async def generate_async(self, prompt):
+        if self.interval:
+            return await super().generate_async(prompt)
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._answer(prompt)
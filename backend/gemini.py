@@ -0,0 +1,40 @@
+# backend/gemini.py
+
+"""
+Lazy Gemini SDK
+
+google.generativeai takes most of a second to import, so it is imported
+and configured on first use (or by the startup warm-up in warmup.py)
+instead of when the backend is imported.
+"""
+
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+_genai = None
+_lock = threading.Lock()
+
+
+def get_genai():
+    """Return the configured google.generativeai module (imported once)."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _genai = genai
+    return _genai
+
+
+def open_client():
+    """Create the SDK's gRPC client ahead of the first request (no network call)."""
+    from google.generativeai.client import get_default_generative_client
+    get_genai()
+    if not os.getenv("GEMINI_API_KEY"):
+        return None  # without a key the SDK probes for cloud credentials instead
+    return get_default_generative_client()
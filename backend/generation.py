@@ -0,0 +1,97 @@
+# backend/generation.py
+
+"""
+Answer Generation
+
+- Pluggable generator interface (Gemini by default, fakes for offline tests)
+- generate() returns the whole answer; stream() yields text as the model
+  produces it
+- generate_async() / stream_async() serve the async /ask path
+"""
+
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+
+from gemini import get_genai
+
+# Model
+GENERATION_MODEL = "models/gemini-flash-latest"
+
+
+class Generator:
+    """
+    Base generator interface.
+    Subclasses must implement stream(); generate() joins the stream.
+    The async variants run the sync calls on worker threads unless a
+    subclass has a native async client.
+    """
+
+    model = GENERATION_MODEL
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt)).strip()
+
+    async def generate_async(self, prompt: str) -> str:
+        return await asyncio.to_thread(self.generate, prompt)
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        # Each next() may block on the provider, so it runs off the event loop
+        iterator = iter(self.stream(prompt))
+        done = object()
+        while True:
+            text = await asyncio.to_thread(next, iterator, done)
+            if text is done:
+                return
+            yield text
+
+
+class GeminiGenerator(Generator):
+    """Generates answers with the Gemini API."""
+
+    def __init__(self, model: str = GENERATION_MODEL):
+        self.model = model
+
+    def generate(self, prompt: str) -> str:
+        response = get_genai().GenerativeModel(self.model).generate_content(prompt)
+        return response.text.strip()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        response = get_genai().GenerativeModel(self.model).generate_content(prompt, stream=True)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def generate_async(self, prompt: str) -> str:
+        response = await get_genai().GenerativeModel(self.model).generate_content_async(prompt)
+        return response.text.strip()
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        model = get_genai().GenerativeModel(self.model)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+_generator: Optional[Generator] = None
+
+
+def get_generator() -> Generator:
+    """Return the process-wide generator (Gemini unless overridden)."""
+    global _generator
+    if _generator is None:
+        _generator = GeminiGenerator()
+    return _generator
+
+
+def set_generator(generator: Optional[Generator]):
+    """
+    Replace the process-wide generator.
+    Used by tests and benchmarks to run without the Gemini API.
+    Passing None restores the default on next use.
+    """
+    global _generator
+    _generator = generator
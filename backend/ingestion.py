@@ -1,45 +1,109 @@
 # backend/ingestion.py
 
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional
+import hashlib
+import math
+import multiprocessing
 import os
-from PyPDF2 import PdfReader
-from docx import Document
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_pdf_with_pages(pdf_path: str) -> List[Dict]:
+from metrics import span, TimedIterator
+
+# Parallel PDF extraction: PDFs with at least PDF_PARALLEL_MIN_PAGES pages
+# are split into page ranges and extracted by a process pool
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+
+# Chunking mode: "page" restarts at every page; "flow" lets chunks run
+# across page boundaries within a document (fewer, fuller chunks)
+CHUNK_MODE = os.getenv("CHUNK_MODE", "page").lower()
+
+
+def _extract_pdf_range(pdf_path: str, start: int, end: int) -> List[Dict]:
     """
-    Extract text from a PDF file page by page.
-    Each page keeps its page number for citations.
+    Extract pages [start, end) of a PDF (0-based indices).
+    Top-level so it can run in a worker process.
     """
+    from PyPDF2 import PdfReader
+
     reader = PdfReader(pdf_path)
     filename = os.path.basename(pdf_path)
     pages = []
 
-    for page_number, page in enumerate(reader.pages, start=1):
-        text = page.extract_text()
+    for index in range(start, end):
+        text = reader.pages[index].extract_text()
         if text and text.strip():
             pages.append({
                 "text": text,
-                "page_number": page_number,
+                "page_number": index + 1,
                 "filename": filename
             })
     return pages
 
 
-def extract_docx(docx_path: str) -> List[Dict]:
+def extract_pdf_with_pages(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    min_pages: Optional[int] = None
+) -> Iterator[Dict]:
+    """
+    Extract text from a PDF file page by page, yielding each page.
+    Each page keeps its page number for citations.
+    Large PDFs are extracted in parallel; page order is preserved.
+    """
+    from PyPDF2 import PdfReader
+
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    min_pages = PDF_PARALLEL_MIN_PAGES if min_pages is None else min_pages
+
+    reader = PdfReader(pdf_path)
+    total_pages = len(reader.pages)
+    if workers <= 1 or total_pages < max(min_pages, 2):
+        filename = os.path.basename(pdf_path)
+        for index, page in enumerate(reader.pages):
+            text = page.extract_text()
+            if text and text.strip():
+                yield {
+                    "text": text,
+                    "page_number": index + 1,
+                    "filename": filename
+                }
+        return
+
+    # A few ranges per worker evens out pages that are slow to parse
+    range_count = min(total_pages, workers * 4)
+    bounds = [total_pages * i // range_count for i in range(range_count + 1)]
+
+    # "spawn" avoids forking a process that holds threads and sockets
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        results = pool.map(
+            _extract_pdf_range,
+            [pdf_path] * range_count,
+            bounds[:-1],
+            bounds[1:]
+        )
+        # map() yields ranges in order as soon as each one is ready
+        for page_range in results:
+            yield from page_range
+
+
+def extract_docx(docx_path: str) -> Iterator[Dict]:
     """
     Extract text from a DOCX file.
     Treats entire document as page 1.
     """
+    from docx import Document
+
     doc = Document(docx_path)
     filename = os.path.basename(docx_path)
     text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
     
     if text.strip():
-        return [{"text": text, "page_number": 1, "filename": filename}]
-    return []
+        yield {"text": text, "page_number": 1, "filename": filename}
 
 
-def extract_txt(txt_path: str) -> List[Dict]:
+def extract_txt(txt_path: str) -> Iterator[Dict]:
     """
     Extract text from a TXT file.
     Treats entire file as page 1.
@@ -49,11 +113,10 @@ def extract_txt(txt_path: str) -> List[Dict]:
         text = f.read()
     
     if text.strip():
-        return [{"text": text, "page_number": 1, "filename": filename}]
-    return []
+        yield {"text": text, "page_number": 1, "filename": filename}
 
 
-def extract_markdown(md_path: str) -> List[Dict]:
+def extract_markdown(md_path: str) -> Iterator[Dict]:
     """
     Extract text from a Markdown file.
     Treats entire file as page 1.
@@ -63,58 +126,140 @@ def extract_markdown(md_path: str) -> List[Dict]:
         text = f.read()
     
     if text.strip():
-        return [{"text": text, "page_number": 1, "filename": filename}]
-    return []
+        yield {"text": text, "page_number": 1, "filename": filename}
 
 
-def extract_document(file_path: str) -> List[Dict]:
+def extract_document(file_path: str) -> Iterator[Dict]:
     """
     Route to appropriate extractor based on file extension.
     Supports: PDF, DOCX, TXT, Markdown
+    Pages are yielded lazily; wrap in list() to materialize them.
     """
     ext = file_path.lower().split('.')[-1]
     
     if ext == 'pdf':
-        return extract_pdf_with_pages(file_path)
+        pages = extract_pdf_with_pages(file_path)
     elif ext == 'docx':
-        return extract_docx(file_path)
+        pages = extract_docx(file_path)
     elif ext == 'txt':
-        return extract_txt(file_path)
+        pages = extract_txt(file_path)
     elif ext in ['md', 'markdown']:
-        return extract_markdown(file_path)
+        pages = extract_markdown(file_path)
     else:
         raise ValueError(f"Unsupported file type: .{ext}")
 
+    # Extraction time is recorded as the "extract" stage once pages run out
+    return TimedIterator("extract", pages)
+
+
+def file_fingerprint(file_path: str) -> str:
+    """SHA-256 of the raw file bytes, used to skip unchanged uploads."""
+    h = hashlib.sha256()
+    with span("fingerprint"), open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_fingerprint(text: str) -> str:
+    """
+    SHA-256 of a chunk's text. Pages are deliberately left out, so a chunk
+    that moves (a page inserted before it) keeps its hash and embedding.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _make_chunk(text: str, filename: str, page_start: int, page_end: int) -> Dict:
+    return {
+        "text": text,
+        "page_number": page_start,
+        "page_start": page_start,
+        "page_end": page_end,
+        "filename": filename,
+        "chunk_hash": chunk_fingerprint(text)
+    }
+
 
 def chunk_text(
-    pages: List[Dict],
+    pages: Iterable[Dict],
     chunk_size: int = 750,
-    overlap: int = 100
-) -> List[Dict]:
+    overlap: int = 100,
+    mode: Optional[str] = None,
+    stats: Optional[Dict] = None
+) -> Iterator[Dict]:
     """
-    Split text into overlapping chunks.
+    Split text into overlapping chunks, yielding each chunk.
     Chunking helps retrieval accuracy and keeps context manageable.
-    """
-    chunks = []
+    Each chunk carries a chunk_hash content fingerprint and the pages it
+    spans (page_start / page_end; page_number is page_start).
 
+    mode "page" (default: CHUNK_MODE) chunks each page separately; "flow"
+    chunks the document's words as one stream. If a stats dict is given,
+    it receives "chunks" and "per_page_chunks" (what "page" mode yields).
+    """
+    mode = (mode or CHUNK_MODE).lower()
+    if mode not in ("page", "flow"):
+        raise ValueError(f"Unknown chunk mode: {mode}")
+    step = max(chunk_size - overlap, 1)  # avoids an infinite loop when overlap >= chunk_size
+    if stats is not None:
+        stats.update(chunks=0, per_page_chunks=0)
+
+    chunks = _flow_chunks(pages, chunk_size, step, stats) if mode == "flow" else _page_chunks(pages, chunk_size, step)
+    for chunk in chunks:
+        if stats is not None:
+            stats["chunks"] += 1
+            if mode == "page":
+                stats["per_page_chunks"] += 1
+        yield chunk
+
+
+def _page_chunks(pages: Iterable[Dict], chunk_size: int, step: int) -> Iterator[Dict]:
     for page in pages:
         words = page["text"].split()
         start = 0
 
         while start < len(words):
             end = start + chunk_size
-            chunk_words = words[start:end]
+            text = " ".join(words[start:end])
+            yield _make_chunk(text, page["filename"], page["page_number"], page["page_number"])
+            start += step
 
-            chunks.append({
-                "text": " ".join(chunk_words),
-                "page_number": page["page_number"],
-                "filename": page["filename"]
-            })
 
-            #start = end - overlap
-            start = max(end - overlap, start + 1)   #To avoid infine loop when overlap >= chunk_size
+def _flow_chunks(pages: Iterable[Dict], chunk_size: int, step: int, stats: Optional[Dict]) -> Iterator[Dict]:
+    # Sliding window over the document's words; each word remembers its
+    # page, so a chunk's span is the pages of its first and last word
+    words: List[str] = []
+    word_pages: List[int] = []
+    fresh = 0  # words not yet in any emitted chunk
+    filename = None
+
+    def emit():
+        return _make_chunk(" ".join(words), filename, word_pages[0], word_pages[-1])
 
-    return chunks
+    for page in pages:
+        if filename is not None and page["filename"] != filename:
+            # Never flow across documents
+            if fresh:
+                yield emit()
+            words, word_pages, fresh = [], [], 0
+        filename = page["filename"]
+
+        page_words = page["text"].split()
+        if stats is not None:
+            stats["per_page_chunks"] += math.ceil(len(page_words) / step)
+
+        for word in page_words:
+            words.append(word)
+            word_pages.append(page["page_number"])
+            fresh += 1
+            if len(words) == chunk_size:
+                yield emit()
+                del words[:step]
+                del word_pages[:step]
+                fresh = 0
+
+    if fresh:
+        yield emit()
 
 
 
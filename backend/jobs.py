@@ -0,0 +1,245 @@
+# backend/jobs.py
+
+"""
+Background Ingestion Jobs
+
+- /upload reserves a job, saves the file and enqueues the job instead of
+  indexing inline
+- A small worker pool runs the pipeline so bursts of uploads cannot
+  take every thread away from /ask
+- Queue depth is bounded; jobs can be cancelled while queued or between
+  embedding windows
+- Each job reports its stage, chunks processed and throughput
+- Operations on the whole knowledge base (/reset) run only while no job
+  is queued or running, and hold off new jobs until they finish
+"""
+
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from pipeline import Progress
+
+# Load environment variables
+load_dotenv()
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "16"))
+# Finished jobs kept for polling before the oldest are forgotten
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised inside the pipeline when a job has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+class FileBusy(Exception):
+    """Raised when a file already has a queued or running job."""
+
+
+class JobsActive(Exception):
+    """Raised when an operation needs every job to be finished."""
+
+
+class Job(Progress):
+    """State of one ingestion job, updated by the worker as it runs."""
+
+    def __init__(self, filename: str, file_path: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.file_path = file_path
+        self.status = "queued"
+        self.stage = "queued"
+        self.chunks_total = 0
+        self.chunks_processed = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+
+    # Progress interface (called from the worker thread)
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+
+    def set_total(self, total: int):
+        self.chunks_total = total
+
+    def advance(self, count: int):
+        self.chunks_processed += count
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "chunks_total": self.chunks_total,
+            "chunks_processed": self.chunks_processed,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(self.chunks_processed / elapsed, 2) if elapsed > 0 else 0.0,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class JobManager:
+    """Bounded thread pool plus a registry of submitted jobs."""
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_pending: int = INGEST_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._exclusive = False
+
+    def reserve(self, filename: str, file_path: str) -> Job:
+        """
+        Register a queued job for filename before its file is written, so
+        the busy check and the registration are one step.
+        Raises FileBusy when the file already has an active job and
+        QueueFull when max_pending jobs are already active.
+        """
+        with self._lock:
+            if self._exclusive:
+                raise FileBusy("The knowledge base is being reset")
+            active = [j for j in self._jobs.values() if j.status in ACTIVE_STATUSES]
+            if any(j.filename == filename for j in active):
+                raise FileBusy(f"{filename} is already being indexed")
+            if len(active) >= self.max_pending:
+                raise QueueFull(f"Ingestion queue is full ({self.max_pending} jobs pending)")
+            job = Job(filename, file_path)
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        return job
+
+    def start(self, job: Job, run: Callable[[Job], Dict]):
+        """Queue run(job) for a reserved job on the worker pool."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+            self._executor.submit(self._run, job, run)
+
+    def release(self, job: Job):
+        """Drop a reservation that will never start (e.g. saving the file failed)."""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Run the enclosed block with no job queued or running: raises
+        JobsActive if there is one, and refuses new reservations (FileBusy)
+        until the block ends.
+        """
+        with self._lock:
+            active = [j for j in self._jobs.values() if j.status in ACTIVE_STATUSES]
+            if active:
+                raise JobsActive(f"{len(active)} ingestion job(s) queued or running; wait for them or cancel them first")
+            if self._exclusive:
+                raise JobsActive("The knowledge base is already being reset")
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._exclusive = False
+
+    def _run(self, job: Job, run: Callable[[Job], Dict]):
+        with self._lock:
+            if job._cancel.is_set():
+                return  # cancelled while queued
+            job.status = "running"
+            job.started_at = time.time()
+
+        try:
+            job.result = run(job)
+            job.status = "completed"
+            job.stage = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_old_jobs(self):
+        finished = [j for j in self._jobs.values() if j.status not in ACTIVE_STATUSES]
+        finished.sort(key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def active_for(self, filename: str) -> Optional[Job]:
+        """Return the queued/running job for a filename, if any."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.filename == filename and job.status in ACTIVE_STATUSES:
+                    return job
+        return None
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job. Queued jobs never start; running jobs stop at the
+        next checkpoint and keep status "running" until they do.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status in ACTIVE_STATUSES:
+                job.cancel()
+                if job.status == "queued":
+                    job.status = job.stage = "cancelled"
+                    job.finished_at = time.time()
+        return job
+
+    def queue_depth(self) -> Dict:
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "max_pending": self.max_pending,
+            "workers": self.workers
+        }
+
+    def shutdown(self):
+        """Cancel outstanding jobs and stop the workers."""
+        for job in self.list():
+            self.cancel(job.id)
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+job_manager = JobManager()
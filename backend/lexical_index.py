@@ -0,0 +1,266 @@
+# backend/lexical_index.py
+
+"""
+Local BM25 Inverted Index
+
+Complements vector search for literal matches (clause numbers, error
+codes, SKUs) that embeddings tend to miss:
+- Built during ingestion from the same chunks chunk_text produces
+- Posting lists are compact typed arrays (doc ids + term frequencies)
+- Per-file deletes are tombstones, compacted once they pile up
+- Persisted next to the local vector index as a snapshot plus an
+  append-only log of changes (see snapshot_log.py), so a write costs its
+  own batch and other processes catch up by replaying the log
+- Chunk text is not stored: hits carry (filename, chunk_hash) and the
+  text is read back from the vector store
+"""
+
+from typing import List, Dict, Optional, Tuple
+import heapq
+import math
+import os
+import re
+from array import array
+
+from local_index import LOCAL_INDEX_DIR
+from snapshot_log import LoggedIndex
+
+LEXICAL_INDEX_FILE = "bm25.pkl"
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Compact posting lists once this fraction of documents is deleted
+COMPACT_RATIO = 0.25
+
+# Words, optionally joined by - . / _ (e.g. "ERR-404", "4.2.1", "SKU_1234")
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens. Compound identifiers are indexed whole and as parts,
+    so "ERR-404" matches queries for "err-404", "err" or "404".
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        if any(sep in match for sep in "-./"):
+            tokens.extend(p for p in re.split(r"[-./]", match) if p)
+    return tokens
+
+
+class InvertedIndex(LoggedIndex):
+    """BM25 index over chunk texts, keyed by internal document ids."""
+
+    def __init__(self, index_dir: str = LOCAL_INDEX_DIR):
+        super().__init__(os.path.join(index_dir, LEXICAL_INDEX_FILE))
+
+    def _reset(self):
+        # term -> (doc ids, term frequencies), both array("I")
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_lengths = array("I")
+        self.records: List[Optional[Dict]] = []
+        self.deleted = set()
+        self.total_length = 0
+
+    def _state(self) -> Dict:
+        return {
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+            "records": self.records,
+            "deleted": self.deleted,
+            "total_length": self.total_length
+        }
+
+    def _restore(self, state: Dict):
+        self.postings = state["postings"]
+        self.doc_lengths = state["doc_lengths"]
+        self.records = state["records"]
+        self.deleted = state["deleted"]
+        self.total_length = state["total_length"]
+
+    def _apply(self, op: Tuple):
+        kind = op[0]
+        if kind == "add":
+            self._apply_add(op[1])
+        elif kind == "update":
+            self._apply_update(op[1], op[2])
+        elif kind == "delete":
+            self._apply_delete(op[1], op[2])
+
+    @property
+    def live_count(self) -> int:
+        return len(self.records) - len(self.deleted)
+
+    def add(self, chunks: List[Dict]):
+        """Index chunk documents (text, filename, page_number, chunk_hash)."""
+        if not chunks:
+            return
+        entries = []
+        for chunk in chunks:
+            tokens = tokenize(chunk["text"])
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            record = {
+                "filename": chunk["filename"],
+                "page_number": chunk["page_number"],
+                "page_end": chunk.get("page_end"),
+                "pages": chunk.get("pages"),
+                "chunk_hash": chunk.get("chunk_hash")
+            }
+            if not record["chunk_hash"]:
+                record["text"] = chunk["text"]  # no key to read it back by
+            entries.append((record, counts, len(tokens)))
+        with self._writing():
+            self._record(("add", entries))
+
+    def _apply_add(self, entries: List[Tuple[Dict, Dict[str, int], int]]):
+        for record, counts, length in entries:
+            doc_id = len(self.records)
+            for term, tf in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = (array("I"), array("I"))
+                postings[0].append(doc_id)
+                postings[1].append(tf)
+            self.records.append(dict(record))
+            self.doc_lengths.append(length)
+            self.total_length += length
+
+    def update_records(self, filename: str, per_chunk: Dict[str, Dict]):
+        """Set metadata fields (e.g. pages) on a document's chunks, by chunk_hash."""
+        with self._writing():
+            self._record(("update", filename, per_chunk))
+
+    def _apply_update(self, filename: str, per_chunk: Dict[str, Dict]):
+        for record in self.records:
+            if record is not None and record["filename"] == filename and record.get("chunk_hash") in per_chunk:
+                record.update(per_chunk[record["chunk_hash"]])
+
+    def delete_by_filename(self, filename: str, chunk_hashes: Optional[List[str]] = None) -> int:
+        """Tombstone a document's chunks (or only the listed chunk hashes)."""
+        with self._writing():
+            hashes = set(chunk_hashes) if chunk_hashes is not None else None
+            removed = sum(
+                1 for record in self.records
+                if record is not None and record["filename"] == filename
+                and (hashes is None or record.get("chunk_hash") in hashes)
+            )
+            if removed:
+                self._record(("delete", filename, chunk_hashes))
+            return removed
+
+    def _apply_delete(self, filename: str, chunk_hashes: Optional[List[str]]):
+        hashes = set(chunk_hashes) if chunk_hashes is not None else None
+        for doc_id, record in enumerate(self.records):
+            if record is None or record["filename"] != filename:
+                continue
+            if hashes is not None and record.get("chunk_hash") not in hashes:
+                continue
+            self.records[doc_id] = None
+            self.deleted.add(doc_id)
+            self.total_length -= self.doc_lengths[doc_id]
+
+        # Deterministic, so replaying the log renumbers the same way
+        if len(self.deleted) > COMPACT_RATIO * max(len(self.records), 1):
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned documents and renumber the rest."""
+        remap = {}
+        records = []
+        doc_lengths = array("I")
+        for doc_id, record in enumerate(self.records):
+            if record is not None:
+                remap[doc_id] = len(records)
+                records.append(record)
+                doc_lengths.append(self.doc_lengths[doc_id])
+
+        postings = {}
+        for term, (doc_ids, tfs) in self.postings.items():
+            new_ids, new_tfs = array("I"), array("I")
+            for doc_id, tf in zip(doc_ids, tfs):
+                if doc_id in remap:
+                    new_ids.append(remap[doc_id])
+                    new_tfs.append(tf)
+            if new_ids:
+                postings[term] = (new_ids, new_tfs)
+
+        self.postings = postings
+        self.records = records
+        self.doc_lengths = doc_lengths
+        self.deleted = set()
+
+    def search(self, query: str, top_k: int = 8, filenames: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Top-k chunks by BM25 score, as filename/page_number/chunk_hash records.
+        Text is included only for chunks indexed without a chunk_hash; the
+        caller reads the rest from the vector store.
+        With filenames, only those documents are scored (IDF stays corpus-wide).
+        """
+        allowed = set(filenames) if filenames is not None else None
+        with self._lock:
+            self._refresh()
+            n = self.live_count
+            if n == 0 or top_k <= 0:
+                return []
+            avg_length = self.total_length / n
+
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                doc_ids, tfs = postings
+                df = len(doc_ids) - sum(1 for d in doc_ids if d in self.deleted) if self.deleted else len(doc_ids)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for doc_id, tf in zip(doc_ids, tfs):
+                    if doc_id in self.deleted:
+                        continue
+                    if allowed is not None and self.records[doc_id]["filename"] not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            hits = []
+            for doc_id, _ in best:
+                record = self.records[doc_id]
+                hit = {
+                    "filename": record["filename"],
+                    "page_number": record["page_number"],
+                    "page_end": record.get("page_end"),
+                    "pages": record.get("pages"),
+                    "chunk_hash": record.get("chunk_hash")
+                }
+                if "text" in record:
+                    hit["text"] = record["text"]
+                hits.append(hit)
+            return hits
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self.live_count
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], top_k: int, k: int = 60) -> List[Dict]:
+    """
+    Merge ranked lists with RRF: score = sum(1 / (k + rank)).
+    Chunks are matched across lists by (filename, page_number, text).
+    """
+    scores: Dict[tuple, float] = {}
+    records: Dict[tuple, Dict] = {}
+    for results in result_lists:
+        for rank, record in enumerate(results, start=1):
+            key = (record["filename"], record["page_number"], record["text"])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            records.setdefault(key, record)
+
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+    return [records[key] for key in ranked[:top_k]]
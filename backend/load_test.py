@@ -0,0 +1,113 @@
+"""
+Concurrent /ask load test against fake upstreams.
+
+Runs the app in-process (httpx ASGI transport, no network) with the local
+vector index in a temporary directory and fake embedding / generation
+clients that only add latency (asyncio.sleep on the async path,
+time.sleep on the sync path). For each concurrency level it fires
+--requests distinct questions at:
+- /ask        the async handler
+- /ask/sync   the previous sync handler, added here for comparison; it
+              runs on Starlette's worker threads (40 by default)
+and reports throughput and p50/p95 latency.
+
+Usage (from backend/):
+    python load_test.py [--concurrency 1 16 64 128] [--requests 256]
+                        [--embed-latency 0.05] [--gen-latency 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# Offline: local vector index in a throwaway directory
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-load-")
+
+import httpx
+import numpy as np
+
+import upstream
+from main import app, QuestionRequest
+from embedding import set_embedder
+from generation import set_generator
+from rag import ask_question, query_cache, answer_cache
+from vector_store import insert_chunks
+from fakes import FakeEmbedder, FakeGenerator
+
+
+def ask_sync(request: QuestionRequest):
+    """The sync /ask handler as it was before the async path."""
+    result = ask_question(request.question, request.top_k, request.filenames or None)
+    return {"answer": result["answer"], "sources": result["citations"]}
+
+
+async def run(client: httpx.AsyncClient, path: str, concurrency: int, total: int, tag: str):
+    """Send total questions with at most concurrency in flight."""
+    pending = iter(range(total))
+    latencies = []
+
+    async def worker():
+        for i in pending:
+            start = time.perf_counter()
+            response = await client.post(path, json={"question": f"{tag} sensors question {i}", "top_k": 3})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "rps": total / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+async def main_async(args):
+    embedder = FakeEmbedder(latency=args.embed_latency)
+    set_embedder(embedder)
+    set_generator(FakeGenerator(latency=args.gen_latency))
+    upstream.UPSTREAM_CONCURRENCY.update(embedding=args.upstream_limit, generation=args.upstream_limit)
+
+    texts = [f"Smart city sensor report number {i} about traffic and air quality." for i in range(200)]
+    insert_chunks([
+        {"text": t, "embedding": embedder._vector(t), "filename": "city.txt", "page_number": i + 1}
+        for i, t in enumerate(texts)
+    ])
+    app.add_api_route("/ask/sync", ask_sync, methods=["POST"])
+
+    print(
+        f"embed {args.embed_latency * 1000:.0f} ms + generate {args.gen_latency * 1000:.0f} ms per question, "
+        f"{args.requests} requests per run, upstream limit {args.upstream_limit}\n"
+    )
+    print(f"{'concurrency':>11}  {'path':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        for concurrency in args.concurrency:
+            for path in ("/ask/sync", "/ask"):
+                # Distinct questions and empty caches: every request hits the upstreams
+                query_cache.clear()
+                answer_cache.clear()
+                result = await run(client, path, concurrency, args.requests, tag=f"{path}-{concurrency}")
+                print(
+                    f"{concurrency:>11}  {path:<10}{result['rps']:>9.1f}"
+                    f"{result['p50_ms']:>9.0f}{result['p95_ms']:>9.0f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /ask load test with fake upstreams")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 128])
+    parser.add_argument("--requests", type=int, default=256, help="Requests per run")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--gen-latency", type=float, default=0.2)
+    parser.add_argument("--upstream-limit", type=int, default=64, help="Embedding / generation calls in flight")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
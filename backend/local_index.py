@@ -0,0 +1,781 @@
+# backend/local_index.py
+
+"""
+Local In-Process Vector Index
+
+Alternative to Atlas $vectorSearch that runs without any database:
+- Embeddings live in one contiguous matrix (unit-normalized), stored as
+  float32, float16 or int8 with per-row scales (LOCAL_VECTOR_DTYPE)
+- The matrix is persisted as a raw file and memory-mapped on cold start
+- Quantized indexes can keep float32 copies to re-score the best
+  candidates exactly (LOCAL_FULL_PRECISION_RERANK)
+- Chunk metadata (filename, page_number, hashes) is kept in a JSON-lines
+  file; chunk text goes to a separate file and is only read for the
+  rows a search returns
+- Files are append-only: metadata updates and deletes go to a small log
+  replayed on load, deleted rows are masked out of searches, and the
+  files are compacted once enough rows are dead (or the log is large)
+- Cosine top-k search is a matrix product plus argpartition
+- A filename -> rows map scopes searches and deletes to single documents
+- A small per-document manifest (chunk counts, sizes, hashes) sits next
+  to the index so status checks never read the chunk files
+- Writers (uvicorn workers, manage.py) take an exclusive file lock, so
+  concurrent writes from several processes cannot lose rows
+"""
+
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+import json
+import os
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run a single writer process
+    fcntl = None
+
+from quantization import VECTOR_DTYPES, quantize, dequantize, score
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(BASE_DIR, "data", "index"))
+
+# One raw file per encoding; int8 also stores one float32 scale per row.
+# Data files are versioned by generation (vectors-<id>.f32, records-<id>.jsonl,
+# ...); indexes written before generations existed use the plain names.
+VECTOR_FILES = {"float32": "vectors.f32", "float16": "vectors.f16", "int8": "vectors.i8"}
+VECTORS_FILE = VECTOR_FILES["float32"]
+SCALES_FILE = "scales.f32"
+RECORDS_FILE = "records.jsonl"
+TEXTS_FILE = "texts.bin"  # the file in use is named in the first line of the records file
+OPS_FILE = "ops.jsonl"
+META_FILE = "meta.json"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "index.lock"
+MANIFEST_LOCK_FILE = "manifest.lock"
+DATA_FILE_PREFIXES = ("vectors", "scales", "records", "texts", "ops")
+
+# Encoding for new indexes: float32, float16 or int8 (an existing index
+# keeps the encoding recorded in its meta.json)
+LOCAL_VECTOR_DTYPE = os.getenv("LOCAL_VECTOR_DTYPE", "float32").lower()
+# Also store float32 copies and re-score the best quantized candidates
+# with them (only those rows of the float32 file are read)
+LOCAL_FULL_PRECISION_RERANK = os.getenv("LOCAL_FULL_PRECISION_RERANK", "false").lower() == "true"
+# Quantized candidates re-scored per requested result
+RERANK_OVERSAMPLE = int(os.getenv("RERANK_OVERSAMPLE", "4"))
+# Deleted rows stay in the files, masked out of searches, until they are
+# more than this fraction of all rows; then the files are compacted
+LOCAL_COMPACT_DEAD_FRACTION = float(os.getenv("LOCAL_COMPACT_DEAD_FRACTION", "0.25"))
+# Fold the metadata log into a new records file once it is larger than
+# the records file (and at least this many bytes)
+OPS_COMPACT_MIN_BYTES = 1 << 20
+# Rows copied at a time when compaction rewrites the vector files
+COMPACT_BLOCK_ROWS = 65536
+
+# Fields returned by search, matching the Atlas $project stage
+RECORD_FIELDS = ("text", "filename", "page_number", "page_end", "pages")
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """Advisory lock on path (exclusive, or shared for readers), held across processes for the enclosed block."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_text(texts, record: Dict) -> str:
+    """A record's chunk text (inline in records written before texts.bin existed)."""
+    if "text" in record:
+        return record["text"]
+    return os.pread(texts.fileno(), record["text_size"], record["text_offset"]).decode("utf-8")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _versioned(name: str, generation: Optional[str]) -> str:
+    """File name of one generation of a data file (None: the plain name)."""
+    if generation is None:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{generation}{ext}"
+
+
+def _data_files(index_dir: str) -> List[str]:
+    """Every vector, records, texts and log file in the index directory, of any generation."""
+    return [
+        name for name in os.listdir(index_dir)
+        if name.split(".")[0].split("-")[0] in DATA_FILE_PREFIXES
+    ]
+
+
+def _read_lines(path: str, start: int, end: Optional[int]) -> List[Tuple[Dict, int]]:
+    """
+    JSON lines between byte offsets start and end (the end of the file if
+    None), each with the offset just after it. A line cut short by a
+    crash is left out.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        f.seek(start)
+        data = f.read(-1 if end is None else end - start)
+    entries = []
+    offset = start
+    for line in data.split(b"\n")[:-1]:
+        offset += len(line) + 1
+        if line.strip():
+            entries.append((json.loads(line), offset))
+    return entries
+
+
+def _write_at(path: str, offset: int, data: bytes):
+    """Write data at offset and cut the file there, dropping any uncommitted tail."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.pwrite(fd, data, offset)
+        os.ftruncate(fd, offset + len(data))
+    finally:
+        os.close(fd)
+
+
+class LocalVectorIndex:
+    """
+    Memory-mapped vector index with filename-level deletes.
+    Vectors are stored as float32, float16 or int8 (see quantization.py).
+    Rows are only appended; updates and deletes are logged, and deleted
+    rows are masked out until compaction. meta.json is written last by
+    every write and commits it: other processes pick up the new rows and
+    log entries on their next call, and writes from several processes
+    are serialized with a lock file.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = LOCAL_INDEX_DIR,
+        dtype: Optional[str] = None,
+        full_precision: Optional[bool] = None
+    ):
+        self.index_dir = index_dir
+        self._default_dtype = (dtype or LOCAL_VECTOR_DTYPE).lower()
+        if self._default_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype: {self._default_dtype}")
+        self._default_full_precision = (
+            LOCAL_FULL_PRECISION_RERANK if full_precision is None else full_precision
+        )
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+        self._reset()
+        self._refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _write_lock(self):
+        return file_lock(self._path(LOCK_FILE))
+
+    def _columns(self) -> List[Tuple[str, np.dtype, int]]:
+        """(file name, element type, values per row) for each vector file."""
+        columns = [(VECTOR_FILES[self.dtype], np.dtype(self.dtype), self.dim)]
+        if self.dtype == "int8":
+            columns.append((SCALES_FILE, np.dtype(np.float32), 1))
+        if self.full_precision and self.dtype != "float32":
+            columns.append((VECTORS_FILE, np.dtype(np.float32), self.dim))
+        return columns
+
+    def _encode(self, matrix: np.ndarray) -> Dict[str, np.ndarray]:
+        codes, scales = quantize(matrix, self.dtype)
+        encoded = {VECTOR_FILES[self.dtype]: codes}
+        if scales is not None:
+            encoded[SCALES_FILE] = scales[:, None]
+        if self.full_precision and self.dtype != "float32":
+            encoded[VECTORS_FILE] = np.ascontiguousarray(matrix, dtype=np.float32)
+        return encoded
+
+    @property
+    def _codes(self) -> np.ndarray:
+        return self._arrays[VECTOR_FILES[self.dtype]]
+
+    @property
+    def _scales(self) -> Optional[np.ndarray]:
+        scales = self._arrays.get(SCALES_FILE)
+        return scales[:, 0] if scales is not None else None
+
+    @property
+    def _full(self) -> Optional[np.ndarray]:
+        """Exact float32 rows, if stored (always, for the float32 layout)."""
+        return self._arrays.get(VECTORS_FILE)
+
+    def _records_path(self) -> str:
+        return self._path(_versioned(RECORDS_FILE, self._generation))
+
+    def _ops_path(self) -> str:
+        return self._path(_versioned(OPS_FILE, self._generation))
+
+    def _reset(self):
+        """Empty, uncommitted state."""
+        self.dim: Optional[int] = None
+        self.dtype = self._default_dtype
+        self.full_precision = self._default_full_precision
+        self._arrays: Dict[str, np.ndarray] = {VECTOR_FILES[self.dtype]: np.zeros((0, 0), dtype=self.dtype)}
+        # One entry per row; None marks a deleted row
+        self._records: List[Optional[Dict]] = []
+        self._dead_rows = np.zeros(0, dtype=np.int64)
+        self._rows_by_filename: Dict[str, np.ndarray] = {}
+        self._texts = None
+        self._texts_name = TEXTS_FILE
+        # Generation of the records and log files, and of the vector and text files
+        self._generation: Optional[str] = None
+        self._data_generation: Optional[str] = None
+        # Committed bytes of the records and log files
+        self._records_size = 0
+        self._ops_size = 0
+        self._meta_stamp = None
+
+    def _stamp(self):
+        """Identifies one version of meta.json (replaced, never edited, by each write)."""
+        try:
+            stat = os.stat(self._path(META_FILE))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _map(self, count: int) -> Dict[str, np.ndarray]:
+        """Map the first count rows of each vector file (no vector copy is made)."""
+        arrays = {}
+        for name, dtype, width in self._columns():
+            if count:
+                path = self._path(_versioned(name, self._data_generation))
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", shape=(count, width))
+            else:
+                arrays[name] = np.zeros((0, width), dtype=dtype)
+        return arrays
+
+    def _load(self):
+        """Read the committed index from disk (the caller holds the file lock)."""
+        stamp = self._stamp()
+        meta = self._read_meta()
+        self._reset()
+        if meta is None:
+            return
+
+        self.dim = meta["dim"]
+        # Indexes written before quantization existed are plain float32
+        self.dtype = meta.get("dtype", "float32")
+        self.full_precision = meta.get("full_precision", False)
+        self._generation = meta.get("generation")
+        self._data_generation = meta.get("data_generation")
+
+        entries = _read_lines(self._records_path(), 0, meta.get("records_size"))
+        header_end = 0
+        # The header line names the texts file the offsets point into
+        if entries and "texts_file" in entries[0][0]:
+            self._texts_name = entries[0][0]["texts_file"]
+            header_end = entries.pop(0)[1]
+
+        # A crash between writes can leave one file longer than the others;
+        # only rows present in all of them are visible
+        count = min(len(entries), meta["count"])
+        for name, dtype, width in self._columns():
+            path = self._path(_versioned(name, self._data_generation))
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            count = min(count, size // (dtype.itemsize * width))
+
+        self._append_rows([record for record, _ in entries[:count]])
+        self._records_size = entries[count - 1][1] if count else header_end
+        self._arrays = self._map(count)
+        # Held open: compaction deletes the file, and this handle keeps
+        # reading the version these records' offsets point into
+        texts_path = self._path(self._texts_name)
+        self._texts = open(texts_path, "rb") if os.path.exists(texts_path) else None
+
+        for op, end in _read_lines(self._ops_path(), 0, meta.get("ops_size", 0)):
+            self._apply(op)
+            self._ops_size = end
+        self._meta_stamp = stamp
+
+    def _catch_up(self):
+        """Apply writes committed since the last read (the caller holds the file lock)."""
+        stamp = self._stamp()
+        if stamp == self._meta_stamp:
+            return
+        meta = self._read_meta()
+        if (
+            meta is None or self.dim is None or "records_size" not in meta
+            or meta.get("generation") != self._generation
+            or meta["count"] < len(self._records)
+        ):
+            # First read, cleared, compacted, or written by an older version
+            self._load()
+            return
+
+        if meta["count"] > len(self._records):
+            entries = _read_lines(self._records_path(), self._records_size, meta["records_size"])
+            self._append_rows([record for record, _ in entries])
+            self._records_size = meta["records_size"]
+            self._arrays = self._map(len(self._records))
+            if self._texts is None:
+                self._texts = open(self._path(self._texts_name), "rb")
+        for op, end in _read_lines(self._ops_path(), self._ops_size, meta["ops_size"]):
+            self._apply(op)
+            self._ops_size = end
+        self._meta_stamp = stamp
+
+    def _refresh(self):
+        if self._stamp() != self._meta_stamp:
+            # Shared lock: never read a write that is only half done
+            with file_lock(self._path(LOCK_FILE), shared=True):
+                self._catch_up()
+
+    def _append_rows(self, records: List[Dict]):
+        start = len(self._records)
+        self._records.extend(records)
+        rows: Dict[str, List[int]] = {}
+        for i, r in enumerate(records, start):
+            rows.setdefault(r["filename"], []).append(i)
+        for name, ids in rows.items():
+            new = np.asarray(ids, dtype=np.int64)
+            old = self._rows_by_filename.get(name)
+            self._rows_by_filename[name] = new if old is None else np.concatenate([old, new])
+
+    def _apply(self, op: Dict):
+        """Apply one log entry to the records in memory."""
+        if op["op"] == "delete":
+            doomed: Dict[str, List[int]] = {}
+            for i in op["rows"]:
+                if i < len(self._records) and self._records[i] is not None:
+                    doomed.setdefault(self._records[i]["filename"], []).append(i)
+                    self._records[i] = None
+            for name, ids in doomed.items():
+                left = np.setdiff1d(self._rows_by_filename[name], ids)
+                if len(left):
+                    self._rows_by_filename[name] = left
+                else:
+                    del self._rows_by_filename[name]
+            dead = [i for ids in doomed.values() for i in ids]
+            if dead:
+                self._dead_rows = np.concatenate([self._dead_rows, np.asarray(dead, dtype=np.int64)])
+        elif op["op"] == "update":
+            per_chunk = op.get("per_chunk") or {}
+            for i in self._rows_by_filename.get(op["filename"], ()):
+                if i >= op["count"]:
+                    break  # appended after the update
+                r = self._records[i]
+                self._records[i] = {**r, **op["fields"], **per_chunk.get(r.get("chunk_hash"), {})}
+
+    def _rows(self, filenames: List[str]) -> np.ndarray:
+        """Sorted row numbers of every chunk of the given documents."""
+        parts = [self._rows_by_filename[f] for f in set(filenames) if f in self._rows_by_filename]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def _commit(self):
+        """Replace meta.json, which makes everything written before it visible."""
+        tmp_path = self._path(META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "count": len(self._records),
+                "dtype": self.dtype,
+                "full_precision": self.full_precision,
+                "generation": self._generation,
+                "data_generation": self._data_generation,
+                "records_size": self._records_size,
+                "ops_size": self._ops_size
+            }, f)
+        os.replace(tmp_path, self._path(META_FILE))
+        self._meta_stamp = self._stamp()
+
+    @contextmanager
+    def _writing(self):
+        """Hold both locks, caught up with other writers; a failed write is rolled back."""
+        with self._lock, self._write_lock():
+            self._catch_up()
+            try:
+                yield
+            except BaseException:
+                # Uncommitted bytes are ignored on disk and cut by the next write
+                self._load()
+                raise
+
+    def add(self, documents: List[Dict]):
+        """Append chunk documents (each with an "embedding") to the index."""
+        if not documents:
+            return
+
+        matrix = _normalize(np.asarray([d["embedding"] for d in documents], dtype=np.float32))
+
+        with self._writing():
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._generation = self._data_generation = os.urandom(4).hex()
+                self._texts_name = _versioned(TEXTS_FILE, self._data_generation)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+
+            # Only the new rows are written; existing bytes are never touched
+            count = len(self._records)
+            encoded = self._encode(matrix)
+            for name, dtype, width in self._columns():
+                data = np.ascontiguousarray(encoded[name], dtype=dtype).tobytes()
+                _write_at(self._path(_versioned(name, self._data_generation)), count * dtype.itemsize * width, data)
+
+            # Texts first: a crash leaves unreferenced bytes, never a record without its text
+            texts_path = self._path(self._texts_name)
+            offset = os.path.getsize(texts_path) if count and os.path.exists(texts_path) else 0
+            records = []
+            with open(texts_path, "ab" if count else "wb") as f:
+                for d in documents:
+                    data = d["text"].encode("utf-8")
+                    f.write(data)
+                    record = {k: v for k, v in d.items() if k not in ("embedding", "_id", "text")}
+                    records.append({**record, "text_offset": offset, "text_size": len(data)})
+                    offset += len(data)
+
+            lines = [json.dumps(r) + "\n" for r in records]
+            if not self._records_size:
+                lines.insert(0, json.dumps({"texts_file": self._texts_name}) + "\n")
+            data = "".join(lines).encode("utf-8")
+            _write_at(self._records_path(), self._records_size, data)
+            self._records_size += len(data)
+
+            self._append_rows(records)
+            self._arrays = self._map(len(self._records))
+            if self._texts is None:
+                self._texts = open(texts_path, "rb")
+            self._commit()
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """Return the top-k records by cosine similarity."""
+        return self.search_batch([query_embedding], top_k, include_embeddings, filenames)[0]
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        """
+        Score several queries with one matrix product.
+        With filenames, only those documents' rows are read and scored.
+        Quantized indexes with full-precision copies re-score the best
+        RERANK_OVERSAMPLE * top_k candidates exactly.
+        """
+        with self._lock:
+            self._refresh()
+            records, texts = self._records, self._texts
+            all_codes, all_scales, full = self._codes, self._scales, self._full
+            rerank = full is not None and self.dtype != "float32"
+            rows = self._rows(filenames) if filenames is not None else None
+            dead = self._dead_rows
+
+        codes, scales = all_codes, all_scales
+        if rows is not None:
+            codes = codes[rows]
+            scales = scales[rows] if scales is not None else None
+            dead = dead[:0]  # the filename map only has live rows
+
+        n = len(codes) - len(dead)
+        if n == 0 or top_k <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        scores = score(queries, codes, scales)
+        if len(dead):
+            scores[:, dead] = -np.inf
+        k = min(top_k, n)
+        depth = min(n, k * RERANK_OVERSAMPLE) if rerank else k
+
+        # argpartition finds the unordered top candidates in O(n); only they get sorted
+        top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+        results = []
+        for row, candidates in enumerate(top):
+            ids = rows[candidates] if rows is not None else candidates
+            if rerank:
+                exact = np.asarray(full[ids], dtype=np.float32) @ queries[row]
+                ids = ids[np.argsort(-exact)[:k]]
+            else:
+                ids = ids[np.argsort(-scores[row, candidates])]
+
+            hits = []
+            for i in ids:
+                record = records[i]
+                if record is None:
+                    continue  # deleted since the scores were taken
+                hit = {field: record.get(field) for field in RECORD_FIELDS}
+                hit["text"] = _read_text(texts, record)
+                if include_embeddings:
+                    if full is not None:
+                        hit["embedding"] = full[i].tolist()
+                    else:
+                        scale = all_scales[i:i + 1] if all_scales is not None else None
+                        hit["embedding"] = dequantize(all_codes[i:i + 1], scale)[0].tolist()
+                hits.append(hit)
+            results.append(hits)
+        return results
+
+    def _with_text(self, record: Dict) -> Dict:
+        text = _read_text(self._texts, record)
+        record = {k: v for k, v in record.items() if k not in ("text_offset", "text_size")}
+        record["text"] = text
+        return record
+
+    def all_records(self) -> List[Dict]:
+        """Stored metadata and text (without vectors) for every chunk."""
+        with self._lock:
+            self._refresh()
+            return [self._with_text(r) for r in self._records if r is not None]
+
+    def records(self, filename: str, include_text: bool = True) -> List[Dict]:
+        """Stored metadata (without vectors) for every chunk of a document."""
+        with self._lock:
+            self._refresh()
+            rows = [self._records[i] for i in self._rows([filename])]
+            if include_text:
+                return [self._with_text(r) for r in rows]
+            return [dict(r) for r in rows]
+
+    def delete_by_filename(self, filename: str, chunk_hashes: Optional[List[str]] = None) -> int:
+        """
+        Remove chunks of a document: the rows are marked deleted in the log
+        and dropped from the files by a later compaction.
+        With chunk_hashes, only chunks whose chunk_hash is listed are removed.
+        """
+        hashes = set(chunk_hashes) if chunk_hashes is not None else None
+        with self._writing():
+            doomed = [
+                int(i) for i in self._rows([filename])
+                if hashes is None or self._records[i].get("chunk_hash") in hashes
+            ]
+            if not doomed:
+                return 0
+            self._log({"op": "delete", "rows": doomed})
+            return len(doomed)
+
+    def embeddings(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[float]]:
+        """Stored (normalized) vectors by (filename, chunk_hash); missing keys are left out."""
+        wanted = set(keys)
+        with self._lock:
+            self._refresh()
+            rows = {}
+            for i in self._rows(list({filename for filename, _ in wanted})):
+                key = (self._records[i]["filename"], self._records[i].get("chunk_hash"))
+                if key in wanted:
+                    rows[key] = int(i)
+            full, codes, scales = self._full, self._codes, self._scales
+
+        vectors = {}
+        for key, i in rows.items():
+            if full is not None:
+                vectors[key] = full[i].tolist()
+            else:
+                scale = scales[i:i + 1] if scales is not None else None
+                vectors[key] = dequantize(codes[i:i + 1], scale)[0].tolist()
+        return vectors
+
+    def texts(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Stored text by (filename, chunk_hash); missing keys are left out."""
+        wanted = set(keys)
+        with self._lock:
+            self._refresh()
+            texts = {}
+            for i in self._rows(list({filename for filename, _ in wanted})):
+                record = self._records[i]
+                key = (record["filename"], record.get("chunk_hash"))
+                if key in wanted:
+                    texts[key] = _read_text(self._texts, record)
+            return texts
+
+    def update_records(self, filename: str, fields: Dict, per_chunk: Optional[Dict[str, Dict]] = None):
+        """
+        Set metadata fields on every chunk of a document, plus per_chunk
+        fields on the chunks whose chunk_hash is listed. Only logged when
+        something changes.
+        """
+        per_chunk = per_chunk or {}
+        with self._writing():
+            changed = False
+            wanted = {}
+            for i in self._rows([filename]):
+                record = self._records[i]
+                fields_for = per_chunk.get(record.get("chunk_hash"), {})
+                if any(record.get(k) != v for k, v in {**fields, **fields_for}.items()):
+                    changed = True
+                    if fields_for:
+                        wanted[record["chunk_hash"]] = fields_for
+            if not changed:
+                return
+            self._log({
+                "op": "update",
+                "filename": filename,
+                "fields": fields,
+                "per_chunk": wanted,
+                "count": len(self._records)
+            })
+
+    def _log(self, op: Dict):
+        """Append a change to the log, apply it and commit (inside _writing())."""
+        data = (json.dumps(op) + "\n").encode("utf-8")
+        _write_at(self._ops_path(), self._ops_size, data)
+        self._ops_size += len(data)
+        self._apply(op)
+        self._commit()
+
+        dead = len(self._dead_rows)
+        if dead > LOCAL_COMPACT_DEAD_FRACTION * len(self._records) or \
+                self._ops_size > max(OPS_COMPACT_MIN_BYTES, self._records_size):
+            self._compact()
+
+    def _compact(self):
+        """
+        Write the live rows, with the log folded in, as a new generation
+        of files and commit it. Vectors and texts are only rewritten when
+        rows were deleted. Readers keep the files they have open until
+        they catch up.
+        """
+        generation = os.urandom(4).hex()
+        live = np.asarray([i for i, r in enumerate(self._records) if r is not None], dtype=np.int64)
+        records = [self._records[i] for i in live]
+
+        if len(live) < len(self._records):
+            texts_name = _versioned(TEXTS_FILE, generation)
+            offset = 0
+            with open(self._path(texts_name), "wb") as f:
+                for n, record in enumerate(records):
+                    data = _read_text(self._texts, record).encode("utf-8")
+                    f.write(data)
+                    record = {k: v for k, v in record.items() if k != "text"}
+                    records[n] = {**record, "text_offset": offset, "text_size": len(data)}
+                    offset += len(data)
+            for name, array in self._arrays.items():
+                with open(self._path(_versioned(name, generation)), "wb") as f:
+                    for start in range(0, len(live), COMPACT_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(array[live[start:start + COMPACT_BLOCK_ROWS]]).tobytes())
+            self._data_generation = generation
+            self._texts_name = texts_name
+
+        self._generation = generation
+        lines = [json.dumps({"texts_file": self._texts_name}) + "\n"]
+        lines.extend(json.dumps(r) + "\n" for r in records)
+        data = "".join(lines).encode("utf-8")
+        with open(self._records_path(), "wb") as f:
+            f.write(data)
+        self._records = records
+        self._records_size = len(data)
+        self._ops_size = 0
+        self._commit()
+        self._load()
+
+        # Files of earlier generations (including any left by a crash) are no longer referenced
+        current = {self._texts_name, os.path.basename(self._records_path()), os.path.basename(self._ops_path())}
+        current.update(_versioned(name, self._data_generation) for name, _, _ in self._columns())
+        for name in _data_files(self.index_dir):
+            if name not in current:
+                os.remove(self._path(name))
+
+    def clear(self):
+        """Delete the whole index from disk."""
+        with self._lock, self._write_lock():
+            self._arrays = {}
+            for name in (META_FILE, *_data_files(self.index_dir)):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._load()
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._records) - len(self._dead_rows)
+
+    def filenames(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._rows_by_filename)
+
+    def size_bytes(self) -> int:
+        """Bytes on disk for the vector files (records excluded; deleted rows count until compaction)."""
+        with self._lock:
+            self._refresh()
+            total = 0
+            for name, _, _ in (self._columns() if self.dim is not None else []):
+                path = self._path(_versioned(name, self._data_generation))
+                total += os.path.getsize(path) if os.path.exists(path) else 0
+            return total
+
+
+class LocalManifest:
+    """
+    Per-document summary (filename, chunk_count, text_bytes, file_bytes,
+    file_hash, ingested_at) stored as one JSON file next to the index.
+    Each change replaces the file atomically, under a lock file so
+    read-modify-write cycles from several processes do not interleave.
+    """
+
+    def __init__(self, index_dir: str = LOCAL_INDEX_DIR):
+        self.path = os.path.join(index_dir, MANIFEST_FILE)
+        self.lock_path = os.path.join(index_dir, MANIFEST_LOCK_FILE)
+        self._lock = threading.RLock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return {e["filename"]: e for e in json.load(f)}
+
+    def _write(self, entries: Dict[str, Dict]):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sorted(entries.values(), key=lambda e: e["filename"]), f)
+        os.replace(tmp_path, self.path)
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            return sorted(self._read().values(), key=lambda e: e["filename"])
+
+    def upsert(self, entry: Dict):
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read()
+            entries[entry["filename"]] = dict(entry)
+            self._write(entries)
+
+    def remove(self, filename: str):
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read()
+            if entries.pop(filename, None) is not None:
+                self._write(entries)
+
+    def replace(self, entries: List[Dict]):
+        with self._lock, file_lock(self.lock_path):
+            self._write({e["filename"]: dict(e) for e in entries})
+
+    def clear(self):
+        with self._lock, file_lock(self.lock_path):
+            if os.path.exists(self.path):
+                os.remove(self.path)
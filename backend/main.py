@@ -4,27 +4,66 @@
 FastAPI Backend for Document Q&A (RAG) System
 
 Endpoints:
-- POST /upload : Upload and index PDF
+- POST /upload : Upload a document and queue it for indexing
+- GET /jobs    : Ingestion jobs (GET/DELETE /jobs/{job_id} to poll/cancel)
 - POST /ask    : Ask questions
+- POST /ask/stream : Ask questions, streaming the answer (server-sent events)
+- POST /ask/batch  : Ask many questions in one request
+- DELETE /documents/{filename} : Remove one document from the knowledge base
 - DELETE /reset: Clear knowledge base
 - GET /status  : System status
+- GET /metrics : Prometheus metrics (stage latencies, caches, queue, chunks)
 """
 
 import os
+import json
 import shutil
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import tempfile
+import time
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-from ingestion import extract_document, chunk_text
-from rag import embed_text, ask_question
-from vector_store import insert_chunks, clear_collection, get_stats, get_collection
+from pipeline import index_document
+from jobs import job_manager, QueueFull, FileBusy, JobsActive
+from rag import (
+    ask_question_async, ask_question_stream_async, ask_questions_batch,
+    get_cache_stats, get_coalescing_stats, invalidate_answer_cache
+)
+from vector_store import (
+    clear_collection, get_stats, get_manifest, delete_document,
+    init_client, close_client, VECTOR_BACKEND
+)
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, CONTENT_TYPE, GaugeFunc, CounterFunc, collect_timings
+import warmup
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Document Q&A API")
+# Largest accepted /ask/batch request
+BATCH_ASK_MAX_QUESTIONS = int(os.getenv("BATCH_ASK_MAX_QUESTIONS", "500"))
+# Largest top_k a request may ask for (retrieval fetches several times as many candidates)
+ASK_MAX_TOP_K = int(os.getenv("ASK_MAX_TOP_K", "50"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled MongoClient per worker process (not needed by the local index).
+    # Creating it does no I/O; indexes, the pool and SDK clients are
+    # opened by the background warm-up so startup is not blocked
+    if VECTOR_BACKEND == "atlas":
+        init_client()
+    warmup.start(warmup.default_steps(VECTOR_BACKEND))
+    yield
+    job_manager.shutdown()
+    close_client()
+
+
+app = FastAPI(title="Document Q&A API", lifespan=lifespan)
 
 # Allow frontend (Streamlit) to access backend
 app.add_middleware(
@@ -35,9 +74,66 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/jobs/{job_id}), not raw path, to bound series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    return response
+
+
+# Gauges read at scrape time
+def _cache_metric(field):
+    return lambda: {(name,): stats[field] for name, stats in get_cache_stats().items()}
+
+
+def _embedding_store_bytes_saved():
+    stats = get_cache_stats().get("embedding_store")
+    return {(): stats["bytes_saved"]} if stats else {}
+
+
+REGISTRY.register(CounterFunc("documate_cache_hits_total", "Cache hits", _cache_metric("hits"), ("cache",)))
+REGISTRY.register(CounterFunc("documate_cache_misses_total", "Cache misses", _cache_metric("misses"), ("cache",)))
+REGISTRY.register(GaugeFunc("documate_cache_hit_ratio", "Cache hit ratio", _cache_metric("hit_ratio"), ("cache",)))
+REGISTRY.register(CounterFunc(
+    "documate_embedding_store_bytes_saved_total",
+    "Bytes of chunk text not sent to the embedding provider (served by the embedding store)",
+    _embedding_store_bytes_saved
+))
+REGISTRY.register(CounterFunc(
+    "documate_coalesced_requests_total",
+    "Requests that waited on an identical in-flight computation",
+    lambda: {(kind,): count for kind, count in get_coalescing_stats().items()},
+    ("kind",)
+))
+REGISTRY.register(GaugeFunc(
+    "documate_ingest_jobs",
+    "Ingestion jobs by state",
+    lambda: {(state,): job_manager.queue_depth()[state] for state in ("queued", "running")},
+    ("state",)
+))
+REGISTRY.register(GaugeFunc("documate_chunks", "Chunks in the knowledge base", lambda: get_stats()["total_chunks"]))
+REGISTRY.register(GaugeFunc("documate_documents", "Documents in the knowledge base", lambda: len(get_manifest())))
+
+
 class QuestionRequest(BaseModel):
     question: str
-    top_k: int = 5
+    top_k: int = Field(5, ge=1, le=ASK_MAX_TOP_K)
+    filenames: Optional[List[str]] = None  # limit retrieval to these documents
+    debug_timings: bool = False  # include per-stage timings in the response
+
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    top_k: int = Field(5, ge=1, le=ASK_MAX_TOP_K)
+    filenames: Optional[List[str]] = None
 
 
 @app.get("/")
@@ -48,22 +144,56 @@ def health_check():
 @app.get("/status")
 def status():
     stats = get_stats()
-    collection = get_collection()
-    unique_docs = collection.distinct("filename")
 
     return {
         "total_chunks": stats["total_chunks"],
-        "total_documents": len(unique_docs),
-        "documents": unique_docs,  # Add list of document names
-        "status": "active" if stats["total_chunks"] > 0 else "empty"
+        "total_documents": len(stats["documents"]),
+        "documents": stats["documents"],  # Add list of document names
+        "manifest": stats["manifest"],  # Per-document chunk counts, sizes, ingest times
+        "status": "active" if stats["total_chunks"] > 0 else "empty",
+        "cache": get_cache_stats(),
+        "coalesced": get_coalescing_stats(),
+        "warmup": warmup.status()
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def run_ingest_job(job, debug_timings: bool = False) -> dict:
+    """Worker-side body of an upload job."""
+    with collect_timings(debug_timings) as timings:
+        result = index_document(job.file_path, job)
+    if result["chunks_added"] or result["chunks_removed"]:
+        invalidate_answer_cache()
+
+    response = {
+        "message": (
+            "Document unchanged, already indexed" if result["skipped"]
+            else "Document indexed successfully"
+        ),
+        "filename": job.filename,
+        "chunks_created": result["chunks_created"],
+        "chunks_reused": result["chunks_reused"],
+        "chunks_added": result["chunks_added"],
+        "chunks_removed": result["chunks_removed"],
+        "chunking": result.get("chunking"),  # chunks / embedding calls saved by CHUNK_MODE=flow
+        "dedup": result.get("dedup")  # embeddings skipped for near-duplicates (DEDUP_NEAR_DUPLICATES)
     }
+    if timings is not None:
+        response["debug_timings"] = timings.to_dict()
+    return response
 
 
-@app.post("/upload")
-def upload_document(file: UploadFile = File(...)):
+@app.post("/upload", status_code=202)
+def upload_document(file: UploadFile = File(...), debug_timings: bool = False):
     """
-    Upload and index a document.
+    Save a document and queue it for indexing.
     Supports: PDF, DOCX, TXT, Markdown
+    Poll GET /jobs/{job_id} for progress and the final result
+    (with ?debug_timings=true the result has a per-stage breakdown).
     """
     # Validate file type
     allowed_extensions = ['.pdf', '.docx', '.txt', '.md', '.markdown']
@@ -74,7 +204,7 @@ def upload_document(file: UploadFile = File(...)):
             status_code=400, 
             detail="Supported formats: PDF, DOCX, TXT, Markdown"
         )
-    
+
     # Absolute upload path (safe)
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     upload_dir = os.path.join(base_dir, "data", "uploads")
@@ -82,58 +212,190 @@ def upload_document(file: UploadFile = File(...)):
 
     file_path = os.path.join(upload_dir, file.filename)
 
+    # Reserve before touching the file: one with an active job (which may
+    # still be reading it) is never overwritten, nor one refused with 429
     try:
-        # Save file
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
+        job = job_manager.reserve(file.filename, file_path)
+    except FileBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
 
-        # Extract + chunk (works for all formats)
-        pages = extract_document(file_path)
-        chunks = chunk_text(pages)
-
-        # Generate embeddings & store
-        documents = []
-        for chunk in chunks:
-            embedding = embed_text(chunk["text"])
-            documents.append({
-                "text": chunk["text"],
-                "embedding": embedding,
-                "filename": chunk["filename"],
-                "page_number": chunk["page_number"]
-            })
-
-        insert_chunks(documents)
-
-        return {
-            "message": "Document indexed successfully",
-            "filename": file.filename,
-            "chunks_created": len(documents)
-        }
+    tmp_path = None
+    try:
+        # Save to a temp file and move it into place in one step
+        with tempfile.NamedTemporaryFile("wb", dir=upload_dir, prefix=".upload-", delete=False) as f:
+            tmp_path = f.name
+            shutil.copyfileobj(file.file, f)
+        os.replace(tmp_path, file_path)
+        job_manager.start(job, lambda job: run_ingest_job(job, debug_timings))
 
     except Exception as e:
+        job_manager.release(job)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {
+        "message": "Document queued for indexing",
+        "filename": file.filename,
+        "job_id": job.id,
+        "status": job.status
+    }
+
+
+@app.get("/jobs")
+def list_jobs():
+    return {
+        "queue": job_manager.queue_depth(),
+        "jobs": [job.to_dict() for job in job_manager.list()]
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 
 @app.post("/ask")
-def ask(request: QuestionRequest):
+async def ask(request: QuestionRequest):
+    # Async end to end: waiting on the embedding API, MongoDB and the
+    # generation API does not hold one of the threadpool's worker threads
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
     try:
-        result = ask_question(request.question, request.top_k)
+        with collect_timings(request.debug_timings) as timings:
+            result = await ask_question_async(request.question, request.top_k, request.filenames or None)
 
-        return {
+        response = {
             "answer": result["answer"],
-            "sources": result["citations"]
+            "sources": result["citations"],
+            "retrieval_ms": result["retrieval_ms"],
+            "context_stats": result["context_stats"]
         }
+        if timings is not None:
+            response["debug_timings"] = timings.to_dict()
+        return response
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
+@app.post("/ask/stream")
+async def ask_stream(request: QuestionRequest):
+    """
+    Server-sent events: a "citations" event once retrieval finishes,
+    "token" events as the answer is generated, then a "done" event with
+    the full answer, final citations and time-to-first-token.
+    """
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    async def event_stream():
+        try:
+            async for event in ask_question_stream_async(request.question, request.top_k, request.filenames or None):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            # Headers are already sent, so errors travel as an event
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/ask/batch")
+def ask_batch(request: BatchQuestionRequest):
+    """
+    Answer many questions at once. Results come back in request order;
+    a question that fails carries its own "error" instead of failing
+    the whole batch.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(request.questions) > BATCH_ASK_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_ASK_MAX_QUESTIONS} questions per batch"
+        )
+
+    try:
+        batch = ask_questions_batch(request.questions, request.top_k, filenames=request.filenames or None)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "results": [
+            {
+                "question": item["question"],
+                "answer": item.get("answer"),
+                "sources": item.get("citations", []),
+                "retrieval_ms": item.get("retrieval_ms"),
+                "generation_ms": item.get("generation_ms"),
+                "context_stats": item.get("context_stats"),
+                "error": item["error"]
+            }
+            for item in batch["results"]
+        ],
+        "timings": batch["timings"]
+    }
+
+
+@app.delete("/documents/{filename}")
+def delete_document_endpoint(filename: str):
+    """
+    Remove one document's chunks and manifest entry.
+    Other documents stay indexed; nothing is re-embedded.
+    """
+    if job_manager.active_for(filename):
+        raise HTTPException(
+            status_code=409,
+            detail=f"{filename} is being indexed; cancel the job first"
+        )
+
+    try:
+        known = any(e["filename"] == filename for e in get_manifest())
+        removed = delete_document(filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if not known and removed == 0:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    invalidate_answer_cache()
+    return {
+        "message": f"{filename} removed",
+        "filename": filename,
+        "chunks_removed": removed
+    }
+
 
 @app.delete("/reset")
 def reset():
-    clear_collection()
+    """
+    Remove every document. Refused (409) while an upload is queued or
+    running, since its job would keep writing chunks into the emptied store.
+    """
+    try:
+        with job_manager.exclusive():
+            clear_collection()
+    except JobsActive as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    invalidate_answer_cache()
     return {"message": "Knowledge base reset successfully"}
 
 
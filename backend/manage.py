@@ -0,0 +1,35 @@
+"""
+Maintenance commands for the knowledge base.
+
+Usage (from backend/):
+    python manage.py rebuild-bm25      # rebuild the BM25 index (RETRIEVAL_MODE=hybrid)
+    python manage.py rebuild-manifest  # recompute the document manifest from stored chunks
+    python manage.py rebuild-dedup     # rebuild the near-duplicate index (DEDUP_NEAR_DUPLICATES=true)
+"""
+
+import argparse
+
+from vector_store import rebuild_lexical_index, rebuild_manifest, rebuild_duplicate_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DocuMate maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-bm25", help="Rebuild the BM25 index from the vector store")
+    commands.add_parser("rebuild-manifest", help="Rebuild the document manifest from the vector store")
+    commands.add_parser("rebuild-dedup", help="Rebuild the near-duplicate index from the vector store")
+    args = parser.parse_args()
+
+    if args.command == "rebuild-bm25":
+        total = rebuild_lexical_index()
+        print(f"BM25 index rebuilt from {total} chunks")
+    elif args.command == "rebuild-manifest":
+        total = rebuild_manifest()
+        print(f"Manifest rebuilt for {total} documents")
+    elif args.command == "rebuild-dedup":
+        total = rebuild_duplicate_index()
+        print(f"Near-duplicate index rebuilt from {total} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# backend/metrics.py
+
+"""
+Latency Spans and Prometheus Metrics
+
+- span("stage") times a block and records it in the
+  documate_stage_seconds histogram
+- collect_timings() additionally gathers the spans of one request, for
+  the optional debug_timings field on /ask and /upload
+- Counters, histograms and scrape-time callbacks render in the Prometheus text
+  format for GET /metrics (no client library needed)
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import bisect
+import math
+import threading
+import time
+
+# Seconds; spans run from sub-millisecond lookups to minute-long uploads
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named metric family with fixed label names."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram of observed values."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class GaugeFunc(Metric):
+    """
+    Value read at scrape time from a callback.
+    The callback returns a number, or {label values tuple: number}.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}"
+            for k, v in sorted(value.items())
+        ]
+
+
+class CounterFunc(GaugeFunc):
+    """Like GaugeFunc, for a callback that reads a running total."""
+
+    type = "counter"
+
+
+class Registry:
+    """Ordered collection of metric families."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception:
+                continue  # a failing gauge callback must not break the scrape
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "documate_stage_seconds",
+    "Time spent in each pipeline stage",
+    labelnames=("stage",)
+))
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "documate_http_request_seconds",
+    "HTTP request latency by route",
+    labelnames=("method", "route", "status")
+))
+
+
+# Spans of the current request, when debug timings were asked for
+_collector: ContextVar[Optional["TimingCollector"]] = ContextVar("timing_collector", default=None)
+
+
+class TimingCollector:
+    """
+    Per-request totals: stage -> milliseconds and number of spans.
+    Stages computed once for several coalesced requests are marked shared.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+        self._shared = set()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def merge(self, other: "TimingCollector", shared: bool = False):
+        """Add another collector's totals (shared: work done for another request too)."""
+        with other._lock:
+            stages = {stage: list(totals) for stage, totals in other._stages.items()}
+            other_shared = set(other._shared)
+        with self._lock:
+            for stage, (seconds, calls) in stages.items():
+                totals = self._stages.setdefault(stage, [0.0, 0])
+                totals[0] += seconds
+                totals[1] += calls
+                if shared or stage in other_shared:
+                    self._shared.add(stage)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        with self._lock:
+            timings = {}
+            for stage, (seconds, calls) in self._stages.items():
+                timings[stage] = {"ms": round(seconds * 1000, 2), "calls": calls}
+                if stage in self._shared:
+                    timings[stage]["shared"] = True
+            return timings
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a finished span (histogram + current request collector)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings(enabled: bool = True) -> Iterator[Optional[TimingCollector]]:
+    """
+    Gather every span in this context (and in threads started with a copy
+    of it) into a TimingCollector. Yields None when not enabled.
+    """
+    if not enabled:
+        yield None
+        return
+    collector = TimingCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def collect_call(fn: Callable[[], Any]) -> Tuple[Any, TimingCollector]:
+    """Run fn() with its spans gathered into a new collector; returns (result, collector)."""
+    collector = TimingCollector()
+    token = _collector.set(collector)
+    try:
+        return fn(), collector
+    finally:
+        _collector.reset(token)
+
+
+async def collect_call_async(fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, TimingCollector]:
+    """collect_call for a coroutine function."""
+    collector = TimingCollector()
+    token = _collector.set(collector)
+    try:
+        return await fn(), collector
+    finally:
+        _collector.reset(token)
+
+
+def add_timings(collector: TimingCollector, shared: bool = False):
+    """Add collected spans to the current request's timings, if it collects any."""
+    current = _collector.get()
+    if current is not None:
+        current.merge(collector, shared)
+
+
+class TimedIterator:
+    """
+    Wraps an iterator and times only the work done producing items.
+    With exclude, time spent in another TimedIterator it consumes is
+    subtracted, so chained stages (extract -> chunk) are reported apart.
+    One span is recorded when the iterator is exhausted or closed.
+    """
+
+    def __init__(self, stage: str, iterable: Iterable, exclude: Optional["TimedIterator"] = None):
+        self.stage = stage
+        self.elapsed = 0.0
+        self._iterator = iter(iterable)
+        self._exclude = exclude
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self.elapsed += time.perf_counter() - start
+            self.finish()
+            raise
+        self.elapsed += time.perf_counter() - start
+        return item
+
+    def finish(self):
+        if self._done:
+            return
+        self._done = True
+        excluded = self._exclude.elapsed if self._exclude is not None else 0.0
+        observe_stage(self.stage, max(0.0, self.elapsed - excluded))
+
+    def close(self):
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
+        self.finish()
+
+
+class TimedAsyncIterator:
+    """TimedIterator for async iterators (the async streaming path)."""
+
+    def __init__(self, stage: str, iterable: AsyncIterable):
+        self.stage = stage
+        self.elapsed = 0.0
+        self._iterator = iterable.__aiter__()
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        start = time.perf_counter()
+        try:
+            item = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self.elapsed += time.perf_counter() - start
+            self.finish()
+            raise
+        self.elapsed += time.perf_counter() - start
+        return item
+
+    def finish(self):
+        if self._done:
+            return
+        self._done = True
+        observe_stage(self.stage, self.elapsed)
+
+    async def aclose(self):
+        aclose = getattr(self._iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        self.finish()
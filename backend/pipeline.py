@@ -0,0 +1,333 @@
+# backend/pipeline.py
+
+"""
+Ingestion Pipeline: Extract -> Chunk -> Embed -> Store
+
+The pipeline streams: pages and chunks are generated lazily, embedded in
+bounded batches, and each batch is inserted by a background writer (in
+INSERT_BATCH_SIZE upserts, see vector_store.insert_chunks) while the next
+batch is being embedded. Peak memory is a few batches, not the
+whole document.
+
+Uploads are incremental:
+- An unchanged file (same content hash) is skipped entirely
+- A changed file only embeds chunks whose content hash is new and
+  deletes chunks that no longer exist
+
+With DEDUP_NEAR_DUPLICATES=true, near-duplicate chunks (see dedup.py)
+are not embedded: repeats within the document collapse into the first
+occurrence, which lists every page it appears on, and chunks that
+near-duplicate a stored chunk of another document reuse its vector.
+
+Vectors come from the persistent embedding store (EMBEDDING_STORE_PATH,
+see embedding.py) when the same text was embedded before, e.g. before
+a /reset; only the rest are sent to the embedding provider.
+
+Progress (stage, chunks processed) is reported through a Progress object,
+which is also where cancellation is checked between embedding windows.
+A cancelled or failed run removes the chunks it added before re-raising,
+so only a finished ingest is ever searchable.
+Stage timings (extract, chunk, embed, insert, finalize) go to metrics.py.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+import contextvars
+import math
+import os
+import queue
+import threading
+
+from ingestion import extract_document, chunk_text, file_fingerprint, CHUNK_MODE
+from embedding import embed_texts_stored, EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY
+from vector_store import insert_chunks, get_fingerprints, finalize_document, delete_chunks, get_duplicate_index, get_embeddings
+from dedup import NearDuplicateIndex, minhash
+from metrics import REGISTRY, Counter, TimedIterator, span
+
+CHUNKS_EMBEDDED = REGISTRY.register(Counter(
+    "documate_chunks_embedded_total",
+    "Chunks embedded and stored by ingestion"
+))
+EMBEDDINGS_SKIPPED = REGISTRY.register(Counter(
+    "documate_embeddings_skipped_total",
+    "Chunks not embedded because they near-duplicate another chunk",
+    labelnames=("scope",)
+))
+DOCUMENTS_INGESTED = REGISTRY.register(Counter(
+    "documate_documents_ingested_total",
+    "Ingested documents by outcome",
+    labelnames=("outcome",)
+))
+
+
+class Progress:
+    """
+    Receives pipeline progress. The base class ignores everything;
+    jobs.Job overrides it to track state and support cancellation.
+    """
+
+    def set_stage(self, stage: str):
+        pass
+
+    def set_total(self, total: int):
+        pass
+
+    def advance(self, count: int):
+        pass
+
+    def check_cancelled(self):
+        pass
+
+
+def _batched(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _BatchWriter:
+    """
+    Inserts document batches on a background thread.
+    The queue is bounded, so embedding never runs more than
+    max_pending batches ahead of the database.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        self._queue: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        # Run in a copy of the caller's context so its timing spans are collected
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._run,), name="ingest-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._error is None:
+                try:
+                    insert_chunks(batch)
+                except BaseException as e:
+                    self._error = e
+
+    def put(self, batch: List[Dict]):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(batch)
+
+    def close(self):
+        """Wait for queued batches to be written; re-raise any write error."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def index_document(file_path: str, progress: Optional[Progress] = None) -> Dict:
+    """
+    Index one saved file and report what changed.
+    Returns chunks_created plus chunks_reused / chunks_added / chunks_removed,
+    chunk counts versus per-page chunking under "chunking", and embeddings
+    skipped for near-duplicates under "dedup" (when enabled).
+    """
+    progress = progress or Progress()
+    filename = os.path.basename(file_path)
+
+    progress.set_stage("fingerprinting")
+    file_hash = file_fingerprint(file_path)
+
+    existing = get_fingerprints(filename)
+    if existing and all(e.get("file_hash") == file_hash for e in existing):
+        DOCUMENTS_INGESTED.inc(outcome="skipped")
+        return {
+            "skipped": True,
+            "chunks_created": len(existing),
+            "chunks_reused": len(existing),
+            "chunks_added": 0,
+            "chunks_removed": 0
+        }
+
+    # chunk_hash is a hash of the text alone, so a chunk that only moved
+    # (e.g. a page was inserted before it) is reused and just re-placed
+    stored = {e.get("chunk_hash"): e for e in existing}
+    existing_hashes = set(stored)
+    placement: Dict[str, Dict] = {}  # chunk_hash -> first page span + every page it appears on
+    text_bytes = 0
+    chunk_stats: Dict = {}
+
+    corpus_duplicates = get_duplicate_index()
+    document_duplicates = NearDuplicateIndex() if corpus_duplicates is not None else None
+    collapsed = 0
+
+    def new_chunks() -> Iterator[Dict]:
+        nonlocal text_bytes, collapsed
+        # Extract + chunk lazily (works for all formats); only chunks whose
+        # hash is not already stored move on to embedding
+        pages = extract_document(file_path)
+        chunks = chunk_text(pages, stats=chunk_stats)
+        for chunk in TimedIterator("chunk", chunks, exclude=pages):
+            if chunk["chunk_hash"] in placement:
+                # Identical text again: one chunk, listing both places
+                _add_occurrence(placement[chunk["chunk_hash"]], chunk)
+                continue
+            if document_duplicates is not None:
+                signature = minhash(chunk["text"])
+                original = document_duplicates.find(signature)
+                if original is not None:
+                    _add_occurrence(placement[original[1]], chunk)
+                    collapsed += 1
+                    continue
+                document_duplicates.add((filename, chunk["chunk_hash"]), signature)
+            placement[chunk["chunk_hash"]] = {
+                "page_number": chunk["page_number"],
+                "page_start": chunk["page_start"],
+                "page_end": chunk["page_end"],
+                "pages": _span_pages(chunk),
+                "occurrences": 1
+            }
+            text_bytes += len(chunk["text"].encode("utf-8"))
+            progress.set_total(len(placement))
+            if chunk["chunk_hash"] in existing_hashes:
+                progress.advance(1)
+            else:
+                if corpus_duplicates is not None:
+                    # A stored near-duplicate lends its vector (looked up per batch)
+                    chunk["duplicate_of"] = corpus_duplicates.find(signature)
+                yield chunk
+
+    # Each window of chunks is embedded with concurrent batch requests,
+    # then handed to the writer while the next window is embedded
+    window = EMBED_BATCH_SIZE * EMBED_MAX_CONCURRENCY
+    added = 0
+    reused = 0
+    writer = _BatchWriter()
+    try:
+        try:
+            progress.set_stage("extracting")
+            for batch in _batched(new_chunks(), window):
+                progress.check_cancelled()
+                progress.set_stage("embedding")
+                borrowed = get_embeddings([c["duplicate_of"] for c in batch if c.get("duplicate_of")])
+                embeddings = [borrowed.get(chunk.get("duplicate_of")) for chunk in batch]
+                # Chunks without a near-duplicate (or whose one was deleted meanwhile) are embedded
+                missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+                if missing:
+                    with span("embed"):
+                        fresh = embed_texts_stored([batch[i]["text"] for i in missing])
+                    for i, embedding in zip(missing, fresh):
+                        embeddings[i] = embedding
+                reused += len(batch) - len(missing)
+
+                # file_hash is recorded only once the whole file is stored, so an
+                # interrupted upload is never mistaken for a complete one
+                writer.put([
+                    {
+                        "text": chunk["text"],
+                        "embedding": embedding,
+                        "filename": chunk["filename"],
+                        "page_number": chunk["page_number"],
+                        "page_start": chunk["page_start"],
+                        "page_end": chunk["page_end"],
+                        "chunk_hash": chunk["chunk_hash"],
+                        "file_hash": None
+                    }
+                    for chunk, embedding in zip(batch, embeddings)
+                ])
+                added += len(batch)
+                progress.advance(len(batch))
+        finally:
+            progress.set_stage("storing")
+            writer.close()
+
+        # Remove stale chunks only after new ones are stored, so the document
+        # never disappears from search; the manifest entry is written with them
+        stale_hashes = existing_hashes - set(placement)
+        removed = finalize_document(
+            filename,
+            file_hash,
+            list(stale_hashes),
+            chunk_count=len(placement),
+            text_bytes=text_bytes,
+            file_bytes=os.path.getsize(file_path),
+            chunk_fields=_moved_chunks(placement, stored)
+        )
+    except BaseException:
+        # A cancelled or failed run leaves nothing of itself searchable: the
+        # chunks it added (stored with file_hash=None) are removed again
+        progress.set_stage("rolling back")
+        delete_chunks(filename, list(set(placement) - existing_hashes))
+        raise
+
+    CHUNKS_EMBEDDED.inc(added - reused)
+    EMBEDDINGS_SKIPPED.inc(collapsed, scope="document")
+    EMBEDDINGS_SKIPPED.inc(reused, scope="corpus")
+    DOCUMENTS_INGESTED.inc(outcome="indexed")
+
+    result = {
+        "skipped": False,
+        "chunks_created": len(placement),
+        "chunks_reused": len(placement) - added,
+        "chunks_added": added,
+        "chunks_removed": removed,
+        "chunking": _chunking_report(chunk_stats)
+    }
+    if document_duplicates is not None:
+        result["dedup"] = {
+            "collapsed_in_document": collapsed,
+            "reused_from_corpus": reused,
+            "embeddings_skipped": collapsed + reused
+        }
+    return result
+
+
+def _moved_chunks(placement: Dict[str, Dict], stored: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Page fields to update, by chunk_hash: reused chunks whose position
+    changed, and chunks that turned out to appear on several pages.
+    New chunks were stored with their first position already.
+    """
+    updates = {}
+    for chunk_hash, place in placement.items():
+        # "pages" marks repeated text only; one chunk spanning pages has page_start..page_end
+        pages = sorted(set(place["pages"]))
+        fields = {
+            "page_number": place["page_number"],
+            "page_start": place["page_start"],
+            "page_end": place["page_end"],
+            "pages": pages if place["occurrences"] > 1 and len(pages) > 1 else None
+        }
+        current = stored.get(chunk_hash, {**fields, "pages": None})
+        if any(current.get(k) != v for k, v in fields.items()):
+            updates[chunk_hash] = fields
+    return updates
+
+
+def _span_pages(chunk: Dict) -> List[int]:
+    """Every page a chunk covers (several in flow mode)."""
+    return list(range(chunk["page_start"], chunk["page_end"] + 1))
+
+
+def _add_occurrence(place: Dict, chunk: Dict):
+    """Record another place the same (or near-duplicate) text appears."""
+    place["pages"].extend(_span_pages(chunk))
+    place["occurrences"] += 1
+
+
+def _chunking_report(stats: Dict) -> Dict:
+    """Chunks (and embedding batch calls) saved versus per-page chunking."""
+    chunks = stats.get("chunks", 0)
+    per_page = stats.get("per_page_chunks", 0)
+    return {
+        "mode": CHUNK_MODE,
+        "chunks": chunks,
+        "per_page_chunks": per_page,
+        "chunks_saved": per_page - chunks,
+        # For a full (non-incremental) ingest of the document
+        "embedding_calls_saved": math.ceil(per_page / EMBED_BATCH_SIZE) - math.ceil(chunks / EMBED_BATCH_SIZE)
+    }
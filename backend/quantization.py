@@ -0,0 +1,72 @@
+# backend/quantization.py
+
+"""
+Compact Vector Encodings for the Local Index
+
+- float32: 4 bytes per dimension (the original layout)
+- float16: 2 bytes per dimension, plain half-precision cast
+- int8:    1 byte per dimension plus one float32 scale per vector
+           (symmetric scalar quantization: x ~= code * scale)
+
+Vectors are unit-normalized before encoding, so scores stay cosine
+similarities. Scoring works block by block, so only one block of codes is
+ever widened to float32 at a time.
+"""
+
+from typing import Optional, Tuple
+import numpy as np
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Rows widened to float32 per scoring block (~6 MB at 768 dims)
+SCORE_BLOCK_ROWS = 2048
+
+
+def bytes_per_vector(dtype: str, dim: int) -> int:
+    """Storage for one encoded vector, including its scale."""
+    if dtype == "float32":
+        return 4 * dim
+    if dtype == "float16":
+        return 2 * dim
+    if dtype == "int8":
+        return dim + 4
+    raise ValueError(f"Unknown vector dtype: {dtype}")
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Encode float32 rows. Returns (codes, per-row scales or None)."""
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector dtype: {dtype}")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode rows back to float32."""
+    matrix = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        matrix = matrix * np.asarray(scales, dtype=np.float32)[:, None]
+    return matrix
+
+
+def score(queries: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    queries (q x dim, float32) against encoded rows -> (q x n) scores.
+    int8 rows are scored in code space and rescaled per row afterwards.
+    """
+    if codes.dtype == np.float32:
+        return queries @ codes.T
+
+    scores = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+    for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+        block = np.asarray(codes[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        scores[:, start:start + len(block)] = queries @ block.T
+    if scales is not None:
+        scores *= np.asarray(scales, dtype=np.float32)[None, :]
+    return scores
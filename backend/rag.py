@@ -3,76 +3,227 @@
 """
 RAG (Retrieval-Augmented Generation)
 
-- Embeds text using Google Gemini
-- Retrieves relevant chunks from MongoDB Atlas Vector Search
-- Generates grounded answers with citations
+- Embeds text using Google Gemini (query embeddings are cached)
+- Retrieves relevant chunks from MongoDB Atlas Vector Search (or the local index),
+  optionally fused with BM25 keyword results (RETRIEVAL_MODE=hybrid)
+- Packs retrieved chunks into a token budget (MMR + overlap merging)
+- Generates grounded answers with citations (answers are cached until
+  the knowledge base changes), whole or streamed token by token
+- Answers batches of questions with batched embedding and vector search
+- Has an async variant of /ask (and streaming) whose upstream calls are
+  bounded per upstream (see upstream.py)
 """
 
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+import asyncio
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import google.generativeai as genai
 
-from vector_store import get_collection
+from vector_store import search_chunks, search_chunks_async, search_chunks_batch, lexical_search, RETRIEVAL_MODE
+from lexical_index import reciprocal_rank_fusion
+from context import pack_context, page_span, CONTEXT_OVERSAMPLE
+from embedding import EMBEDDING_MODEL, get_embedder, get_embedding_store, embed_texts
+from generation import GENERATION_MODEL, get_generator
+from cache import TTLCache, DiskCache, SingleFlight, normalize_question
+from metrics import span, TimedAsyncIterator, collect_call, collect_call_async, add_timings
+from upstream import limit
 
-# Load environment variables
+# Load environment variables (the Gemini SDK is configured on first use, see gemini.py)
 load_dotenv(override=True)
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Models: EMBEDDING_MODEL lives in embedding.py, GENERATION_MODEL in generation.py
 
-# Models
-EMBEDDING_MODEL = "models/text-embedding-004"
-GENERATION_MODEL = "models/gemini-flash-latest"
+NOT_FOUND_ANSWER = "I couldn't find this information in the uploaded document."
+
+# Query embedding cache (QUERY_CACHE_PATH enables the shared on-disk tier)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+QUERY_CACHE_DISK_SIZE = int(os.getenv("QUERY_CACHE_DISK_SIZE", "100000"))
+
+query_cache = TTLCache(
+    max_size=QUERY_CACHE_SIZE,
+    ttl=QUERY_CACHE_TTL,
+    disk=DiskCache(QUERY_CACHE_PATH, ttl=QUERY_CACHE_TTL, max_rows=QUERY_CACHE_DISK_SIZE) if QUERY_CACHE_PATH else None
+)
+
+# Answer cache, flushed whenever chunks are added or removed
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "")
+ANSWER_CACHE_DISK_SIZE = int(os.getenv("ANSWER_CACHE_DISK_SIZE", "50000"))
+
+answer_cache = TTLCache(
+    max_size=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL,
+    disk=DiskCache(ANSWER_CACHE_PATH, ttl=ANSWER_CACHE_TTL, max_rows=ANSWER_CACHE_DISK_SIZE) if ANSWER_CACHE_PATH else None
+)
+
+# Concurrent identical questions (and query embeddings) share one computation
+ask_flight = SingleFlight()
+embed_flight = SingleFlight()
+
+# Hybrid retrieval: each half returns this many candidates before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Batch /ask: questions answered concurrently (bounds generation calls)
+BATCH_ASK_CONCURRENCY = int(os.getenv("BATCH_ASK_CONCURRENCY", "4"))
+
+# Bump whenever the prompt below changes so old answers are not reused
+PROMPT_VERSION = "1"
+
+
+def _coalesced(flight: SingleFlight, key: str, fn):
+    """
+    flight.do(key, fn), keeping debug timings for every caller: the spans
+    of the one computation are added to each caller's timings, marked
+    shared for callers that waited on another request's call.
+    """
+    caller = object()
+    result, timings, leader = flight.do(key, lambda: (*collect_call(fn), caller))
+    add_timings(timings, shared=leader is not caller)
+    return result
+
+
+async def _coalesced_async(flight: SingleFlight, key: str, fn):
+    """_coalesced for coroutine functions (flight.do_async)."""
+    caller = object()
+
+    async def run():
+        result, timings = await collect_call_async(fn)
+        return result, timings, caller
+
+    result, timings, leader = await flight.do_async(key, run)
+    add_timings(timings, shared=leader is not caller)
+    return result
 
 
 def embed_text(text: str) -> List[float]:
-    """Convert text into an embedding vector using Gemini."""
-    response = genai.embed_content(
-        model=EMBEDDING_MODEL,
-        content=text
-    )
-    return response["embedding"]
+    """Convert text into an embedding vector using the configured embedder."""
+    return get_embedder().embed(text)
 
 
-def retrieve_chunks(query_embedding: List[float], top_k: int = 8) -> List[Dict]:
-    """Retrieve top-k relevant chunks from MongoDB using vector search."""
-    collection = get_collection()
+def embed_query(question: str) -> List[float]:
+    """
+    Embed a question, reusing a cached vector for repeated questions.
+    Keyed by embedding model + normalized question text.
+    """
+    embedder = get_embedder()
+    key = _query_key(embedder, question)
 
-    results = collection.aggregate([
-        {
-            "$vectorSearch": {
-                "index": "vector_index",
-                "path": "embedding",
-                "queryVector": query_embedding,
-                "numCandidates": 100,
-                "limit": top_k
-            }
-        },
-        {
-            "$project": {
-                "_id": 0,
-                "text": 1,
-                "filename": 1,
-                "page_number": 1
-            }
-        }
-    ])
+    embedding = query_cache.get(key)
+    if embedding is None:
+        embedding = _coalesced(embed_flight, key, lambda: _embed_and_cache(embedder, question, key))
+    return embedding
 
-    return list(results)
 
+def _embed_and_cache(embedder, question: str, key: str) -> List[float]:
+    with span("embed_query"):
+        embedding = embedder.embed(question)
+    query_cache.set(key, embedding)
+    return embedding
+
+
+def _query_key(embedder, question: str) -> str:
+    return f"{embedder.model}\x00{normalize_question(question)}"
+
+
+def retrieve_chunks(
+    query_embedding: List[float],
+    top_k: int = 8,
+    include_embeddings: bool = False,
+    filenames: Optional[List[str]] = None
+) -> List[Dict]:
+    """Retrieve top-k relevant chunks from the configured vector backend."""
+    return search_chunks(query_embedding, top_k, include_embeddings, filenames)
+
+
+def retrieve(
+    question: str,
+    query_embedding: List[float],
+    top_k: int = 8,
+    include_embeddings: bool = False,
+    filenames: Optional[List[str]] = None
+) -> Tuple[List[Dict], Dict]:
+    """
+    Retrieve top-k chunks for a question, plus per-stage latency in ms.
+    In hybrid mode, vector and BM25 candidates are fused with
+    reciprocal-rank fusion; otherwise this is plain vector search.
+    With filenames, both searches are limited to those documents.
+    """
+    start = time.perf_counter()
+    vector_results = retrieve_chunks(query_embedding, _retrieval_depth(top_k), include_embeddings, filenames)
+    timings = {"vector_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    return _fuse(question, vector_results, top_k, timings, filenames), timings
 
-def generate_answer(question: str, chunks: List[Dict]) -> str:
-    """Generate an answer strictly from retrieved context."""
-    if not chunks:
-        return "I couldn't find this information in the uploaded document."
 
+def _retrieval_depth(top_k: int) -> int:
+    """Vector candidates to fetch: hybrid mode fetches extra for fusion."""
+    if RETRIEVAL_MODE != "hybrid":
+        return top_k
+    return max(top_k, HYBRID_CANDIDATES)
+
+
+def _fuse(
+    question: str,
+    vector_results: List[Dict],
+    top_k: int,
+    timings: Dict,
+    filenames: Optional[List[str]] = None
+) -> List[Dict]:
+    """Fuse vector results with BM25 results in hybrid mode (records timings)."""
+    if RETRIEVAL_MODE != "hybrid":
+        return vector_results
+
+    start = time.perf_counter()
+    bm25_results = lexical_search(question, _retrieval_depth(top_k), filenames)
+    timings["bm25_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    start = time.perf_counter()
+    with span("fusion"):
+        chunks = reciprocal_rank_fusion([vector_results, bm25_results], top_k, k=RRF_K)
+    timings["fusion_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return chunks
+
+
+def build_context(
+    question: str,
+    query_embedding: List[float],
+    top_k: int = 8,
+    filenames: Optional[List[str]] = None
+) -> Tuple[List[Dict], Dict, Dict]:
+    """
+    Retrieve an oversampled candidate set and pack it for the prompt.
+    Returns (chunks, timings, packing stats).
+    """
+    candidates, timings = retrieve(
+        question, query_embedding, top_k * CONTEXT_OVERSAMPLE, include_embeddings=True, filenames=filenames
+    )
+    chunks, stats = _pack(candidates, query_embedding, top_k, timings)
+    return chunks, timings, stats
+
+
+def _pack(candidates: List[Dict], query_embedding: List[float], top_k: int, timings: Dict) -> Tuple[List[Dict], Dict]:
+    start = time.perf_counter()
+    with span("packing"):
+        chunks, stats = pack_context(candidates, query_embedding, top_k)
+    timings["packing_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return chunks, stats
+
+
+def build_prompt(question: str, chunks: List[Dict]) -> str:
+    """Build the grounded-answer prompt from retrieved context."""
     context = "\n\n".join(
-        f"[Source: {c['filename']}, Page {c['page_number']}]\n{c['text']}"
+        f"[Source: {c['filename']}, {page_label(c)}]\n{c['text']}"
         for c in chunks
     )
 
-    prompt = f"""You are a helpful assistant that answers questions based on provided document context.
+    return f"""You are a helpful assistant that answers questions based on provided document context.
 
 RULES:
 1. Answer using ONLY the information in the context below
@@ -88,43 +239,394 @@ Question: {question}
 
 Answer:"""
 
-    model = genai.GenerativeModel(GENERATION_MODEL)
-    response = model.generate_content(prompt)
 
-    return response.text.strip()
+def page_label(chunk: Dict) -> str:
+    """
+    "Page 3", "Pages 3-4" for a chunk that runs across pages, or
+    "Pages 1, 3, 5" for text repeated on several pages.
+    """
+    if len(chunk.get("pages") or []) > 1:
+        return "Pages " + ", ".join(str(p) for p in chunk["pages"])
+    start, end = page_span(chunk)
+    return f"Page {start}" if start == end else f"Pages {start}-{end}"
+
+
+def generate_answer(question: str, chunks: List[Dict]) -> str:
+    """Generate an answer strictly from retrieved context."""
+    if not chunks:
+        return NOT_FOUND_ANSWER
 
+    prompt = build_prompt(question, chunks)
+    with span("generate"):
+        return get_generator().generate(prompt)
 
-def ask_question(question: str, top_k: int = 8) -> Dict:
+
+def answer_cache_key(question: str, chunks: List[Dict]) -> str:
+    """
+    Cache key for a generated answer: prompt version + generation model +
+    normalized question + identities of the retrieved chunks, in order.
+    """
+    h = hashlib.sha256()
+    model = get_generator().model
+    h.update(f"{PROMPT_VERSION}\x00{model}\x00{normalize_question(question)}".encode("utf-8"))
+    for c in chunks:
+        identity = f"{c['filename']}\x00{c['page_number']}\x00{c['text']}"
+        h.update(b"\x01" + hashlib.sha256(identity.encode("utf-8")).digest())
+    return h.hexdigest()
+
+
+def invalidate_answer_cache():
+    """Drop all cached answers. Called after ingest, delete and reset."""
+    answer_cache.clear()
+
+
+def ask_question(question: str, top_k: int = 8, filenames: Optional[List[str]] = None) -> Dict:
     """
     Full RAG pipeline:
-    Embed -> Retrieve -> Generate -> Cite 
+    Embed -> Retrieve -> Pack -> Generate -> Cite 
+    filenames limits retrieval to those documents (None searches all).
+    Identical questions asked while one is in flight wait for its result.
     """
-    query_embedding = embed_text(question)
-    chunks = retrieve_chunks(query_embedding, top_k)
+    return _coalesced(ask_flight, _ask_key(question, top_k, filenames), lambda: _ask(question, top_k, filenames))
+
+
+def _ask(question: str, top_k: int, filenames: Optional[List[str]]) -> Dict:
+    query_embedding = embed_query(question)
+    chunks, retrieval_ms, context_stats = build_context(question, query_embedding, top_k, filenames)
+
+    result = _cached_answer(question, chunks)
+    return {**result, "retrieval_ms": retrieval_ms, "context_stats": context_stats}
+
+
+def _ask_key(question: str, top_k: int, filenames: Optional[List[str]]) -> str:
+    scope = "\x00".join(sorted(set(filenames))) if filenames is not None else "*"
+    return f"{normalize_question(question)}\x01{top_k}\x01{scope}"
+
+
+def _cached_answer(question: str, chunks: List[Dict]) -> Dict:
+    key = answer_cache_key(question, chunks)
+    result = answer_cache.get(key)
+    if result is None:
+        result = _answer_with_citations(question, chunks)
+        answer_cache.set(key, result)
+    return result
+
+
+def _answer_with_citations(question: str, chunks: List[Dict]) -> Dict:
     answer = generate_answer(question, chunks)
+    return {
+        "answer": answer,
+        "citations": cite(answer, chunks)
+    }
+
 
+def cite(answer: str, chunks: List[Dict]) -> List[Dict]:
+    """Unique (filename, page) citations, or none if the answer was not found."""
     # No citations if answer not found
     if "couldn't find this information" in answer.lower():  #More flexible check
-        return {
-            "answer": answer,
-            "citations": []
-        }
+        return []
+
+    return build_citations(chunks)
 
+
+def build_citations(chunks: List[Dict]) -> List[Dict]:
     #Proper citation deduplication
     seen = set()
     citations = []
 
     for c in chunks:
-        key = (c["filename"], c["page_number"])
+        start, end = page_span(c)
+        key = (c["filename"], start, end)
         if key not in seen:
             seen.add(key)
-            citations.append({
+            citation = {
                 "filename": c["filename"],
-                "page_number": c["page_number"]
-            })
+                "page_number": start
+            }
+            if end != start:
+                citation["page_end"] = end  # chunk runs across pages
+            if len(c.get("pages") or []) > 1:
+                citation["pages"] = c["pages"]  # repeated text, collapsed at ingestion
+            citations.append(citation)
+
+    return citations
+
+
+# Async request path: the same pipeline, but waiting on the embedding API,
+# MongoDB and the generation API does not hold a worker thread. Blocking
+# in-process work (disk cache tiers, BM25 search, fusion and packing) runs
+# on worker threads so it never stalls the event loop.
+
+async def embed_query_async(question: str) -> List[float]:
+    """embed_query for the async path (same cache)."""
+    embedder = get_embedder()
+    key = _query_key(embedder, question)
+
+    embedding = await query_cache.get_async(key)
+    if embedding is None:
+        embedding = await _coalesced_async(embed_flight, key, lambda: _embed_and_cache_async(embedder, question, key))
+    return embedding
+
 
+async def _embed_and_cache_async(embedder, question: str, key: str) -> List[float]:
+    with span("embed_query"):
+        async with limit("embedding"):
+            embedding = await embedder.embed_async(question)
+    await query_cache.set_async(key, embedding)
+    return embedding
+
+
+async def build_context_async(
+    question: str,
+    query_embedding: List[float],
+    top_k: int = 8,
+    filenames: Optional[List[str]] = None
+) -> Tuple[List[Dict], Dict, Dict]:
+    """build_context for the async path."""
+    depth = top_k * CONTEXT_OVERSAMPLE
+    start = time.perf_counter()
+    vector_results = await search_chunks_async(
+        query_embedding, _retrieval_depth(depth), include_embeddings=True, filenames=filenames
+    )
+    timings = {"vector_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    chunks, stats = await asyncio.to_thread(
+        _fuse_and_pack, question, vector_results, query_embedding, top_k, timings, filenames
+    )
+    return chunks, timings, stats
+
+
+def _fuse_and_pack(
+    question: str,
+    vector_results: List[Dict],
+    query_embedding: List[float],
+    top_k: int,
+    timings: Dict,
+    filenames: Optional[List[str]]
+) -> Tuple[List[Dict], Dict]:
+    candidates = _fuse(question, vector_results, top_k * CONTEXT_OVERSAMPLE, timings, filenames)
+    return _pack(candidates, query_embedding, top_k, timings)
+
+
+async def _answer_with_citations_async(question: str, chunks: List[Dict]) -> Dict:
+    answer = NOT_FOUND_ANSWER
+    if chunks:
+        with span("generate"):
+            async with limit("generation"):
+                answer = await get_generator().generate_async(build_prompt(question, chunks))
     return {
         "answer": answer,
-        "citations": citations
+        "citations": cite(answer, chunks)
+    }
+
+
+async def ask_question_async(question: str, top_k: int = 8, filenames: Optional[List[str]] = None) -> Dict:
+    """ask_question for the async path (same caches, result and coalescing)."""
+    return await _coalesced_async(
+        ask_flight, _ask_key(question, top_k, filenames), lambda: _ask_async(question, top_k, filenames)
+    )
+
+
+async def _ask_async(question: str, top_k: int, filenames: Optional[List[str]]) -> Dict:
+    query_embedding = await embed_query_async(question)
+    chunks, retrieval_ms, context_stats = await build_context_async(question, query_embedding, top_k, filenames)
+
+    key = answer_cache_key(question, chunks)
+    result = await answer_cache.get_async(key)
+    if result is None:
+        result = await _answer_with_citations_async(question, chunks)
+        await answer_cache.set_async(key, result)
+    return {**result, "retrieval_ms": retrieval_ms, "context_stats": context_stats}
+
+
+async def ask_question_stream_async(
+    question: str,
+    top_k: int = 8,
+    filenames: Optional[List[str]] = None
+) -> AsyncIterator[Dict]:
+    """
+    Streaming RAG pipeline. Yields events:
+    - {"event": "citations", "data": [...]} as soon as retrieval finishes
+    - {"event": "token", "data": "..."} for each piece of answer text
+    - {"event": "done", "data": {answer, citations, ttft_ms, retrieval_ms,
+      context_stats, total_ms}}
+    The final citations are empty when the answer was not found.
+    """
+    start = time.perf_counter()
+    query_embedding = await embed_query_async(question)
+    chunks, retrieval_ms, context_stats = await build_context_async(question, query_embedding, top_k, filenames)
+
+    yield {"event": "citations", "data": build_citations(chunks)}
+
+    key = answer_cache_key(question, chunks)
+    cached = await answer_cache.get_async(key)
+
+    async def tokens():
+        if cached is not None:
+            yield cached["answer"]
+        elif not chunks:
+            yield NOT_FOUND_ANSWER
+        else:
+            # The generation slot is held until the stream is finished
+            async with limit("generation"):
+                stream = get_generator().stream_async(build_prompt(question, chunks))
+                async for token in TimedAsyncIterator("generate", stream):
+                    yield token
+
+    ttft_ms = None
+    parts = []
+    async for token in tokens():
+        if ttft_ms is None:
+            ttft_ms = (time.perf_counter() - start) * 1000
+        parts.append(token)
+        yield {"event": "token", "data": token}
+
+    answer = "".join(parts).strip()
+    result = {"answer": answer, "citations": cite(answer, chunks)}
+    if cached is None:
+        await answer_cache.set_async(key, result)
+
+    yield {
+        "event": "done",
+        "data": {
+            **result,
+            "ttft_ms": round(ttft_ms or 0.0, 1),
+            "retrieval_ms": retrieval_ms,
+            "context_stats": context_stats,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+    }
+
+
+def _embed_questions(questions: List[str]) -> Tuple[List, List]:
+    """
+    Embed many questions: cache hits first, then one batched call for the
+    distinct misses. If the batched call fails, each miss is retried alone
+    so a single bad question does not fail the rest.
+    Returns (embeddings, errors) aligned with questions.
+    """
+    embedder = get_embedder()
+    keys = [_query_key(embedder, q) for q in questions]
+    embeddings = [query_cache.get(key) for key in keys]
+    errors = [None] * len(questions)
+
+    missing: Dict[str, List[int]] = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(keys[i], []).append(i)
+    if not missing:
+        return embeddings, errors
+
+    texts = [questions[positions[0]] for positions in missing.values()]
+    try:
+        with span("embed_query_batch"):
+            vectors = embed_texts(texts, embedder)
+    except Exception:
+        vectors = []
+        for text, positions in zip(texts, missing.values()):
+            try:
+                vectors.append(embedder.embed(text))
+            except Exception as e:
+                vectors.append(None)
+                for i in positions:
+                    errors[i] = f"Embedding failed: {e}"
+
+    for (key, positions), vector in zip(missing.items(), vectors):
+        if vector is None:
+            continue
+        query_cache.set(key, vector)
+        for i in positions:
+            embeddings[i] = vector
+    return embeddings, errors
+
+
+def ask_questions_batch(
+    questions: List[str],
+    top_k: int = 8,
+    max_concurrency: Optional[int] = None,
+    filenames: Optional[List[str]] = None
+) -> Dict:
+    """
+    Batched RAG pipeline for many questions:
+    Embed (one batched call) -> Retrieve (one batched vector search) ->
+    Pack -> Generate (bounded concurrency) -> Cite
+
+    Returns {"results": [...], "timings": {...}}. Results are in input
+    order; each has answer, citations, retrieval_ms, context_stats,
+    generation_ms and error (None unless that question failed).
+    """
+    start = time.perf_counter()
+    results = [{"question": q, "error": None} for q in questions]
+    for item in results:
+        if not item["question"].strip():
+            item["error"] = "Question cannot be empty"
+    live = [i for i, item in enumerate(results) if item["error"] is None]
+    timings = {}
+
+    # Embed
+    stage = time.perf_counter()
+    embeddings, errors = _embed_questions([questions[i] for i in live])
+    for i, error in zip(live, errors):
+        results[i]["error"] = error
+    live_embeddings = {i: e for i, e in zip(live, embeddings) if e is not None}
+    live = list(live_embeddings)
+    timings["embed_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+
+    # Retrieve: one batched vector search for every live question
+    stage = time.perf_counter()
+    depth = _retrieval_depth(top_k * CONTEXT_OVERSAMPLE)
+    try:
+        vector_results = search_chunks_batch(
+            [live_embeddings[i] for i in live], depth, include_embeddings=True, filenames=filenames
+        )
+    except Exception as e:
+        vector_results = []
+        for i in live:
+            results[i]["error"] = f"Retrieval failed: {e}"
+        live = []
+    timings["vector_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+
+    def answer(i: int, candidates: List[Dict]):
+        item = results[i]
+        try:
+            item_timings = {"vector_ms": timings["vector_ms"]}
+            candidates = _fuse(item["question"], candidates, top_k * CONTEXT_OVERSAMPLE, item_timings, filenames)
+            chunks, stats = _pack(candidates, live_embeddings[i], top_k, item_timings)
+            item["retrieval_ms"] = item_timings
+            item["context_stats"] = stats
+
+            gen_start = time.perf_counter()
+            item.update(_cached_answer(item["question"], chunks))
+            item["generation_ms"] = round((time.perf_counter() - gen_start) * 1000, 2)
+        except Exception as e:
+            item["error"] = str(e)
+
+    # Fuse, pack and generate per question, at most max_concurrency at once
+    stage = time.perf_counter()
+    workers = max(1, min(max_concurrency or BATCH_ASK_CONCURRENCY, len(live) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(answer, live, vector_results))
+    timings["generation_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    return {"results": results, "timings": timings}
+
+
+def get_cache_stats() -> Dict:
+    """Hit/miss counters for the RAG caches (and the ingestion embedding store, if enabled)."""
+    stats = {
+        "query_embeddings": query_cache.stats(),
+        "answers": answer_cache.stats()
     }
+    store = get_embedding_store()
+    if store is not None:
+        stats["embedding_store"] = store.stats()
+    return stats
+
 
+def get_coalescing_stats() -> Dict:
+    """Requests that shared an identical in-flight computation, by kind."""
+    return {
+        "ask": ask_flight.coalesced,
+        "query_embedding": embed_flight.coalesced
+    }
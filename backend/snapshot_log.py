@@ -0,0 +1,175 @@
+# backend/snapshot_log.py
+
+"""
+Snapshot + Append-Only Log Persistence
+
+For in-memory indexes kept next to the local vector index (BM25 in
+lexical_index.py, MinHash in dedup.py):
+- A change is applied in memory and appended to a log as one pickled
+  entry, so a write costs the size of its batch, not of the index
+- Once the log outgrows the snapshot, the whole state is written to a new
+  snapshot that names a new, empty log (amortized linear rewrites)
+- Other processes catch up by replaying the log tail, or reload when the
+  snapshot changes; writers hold a file lock
+- A torn entry at the end of the log (crash mid-write) is ignored and
+  overwritten by the next write
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+import glob
+import os
+import pickle
+import threading
+
+from local_index import file_lock
+
+# Fold the log into a new snapshot once it is larger than the snapshot
+# (and at least this many bytes)
+LOG_COMPACT_MIN_BYTES = 1 << 20
+
+
+class LoggedIndex:
+    """
+    Base class. Subclasses implement _reset(), _state(), _restore(state)
+    and _apply(op), and make every change through _record(op) inside
+    _writing(). Without a path the index lives in memory only.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._log_name: Optional[str] = None
+        self._log_offset = 0
+        self._reset()
+        if path is not None:
+            self.index_dir = os.path.dirname(path)
+            self._stem = os.path.splitext(os.path.basename(path))[0]
+            self.lock_path = os.path.join(self.index_dir, self._stem + ".lock")
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._load()
+
+    # Subclass hooks
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _state(self) -> Dict:
+        raise NotImplementedError
+
+    def _restore(self, state: Dict):
+        raise NotImplementedError
+
+    def _apply(self, op: Tuple):
+        raise NotImplementedError
+
+    # Persistence
+
+    def _log_path(self) -> str:
+        return os.path.join(self.index_dir, self._log_name)
+
+    def _load(self):
+        self._reset()
+        self._mtime = None
+        self._log_name = None
+        self._log_offset = 0
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            state = pickle.load(f)
+            self._mtime = os.fstat(f.fileno()).st_mtime_ns
+        # Snapshots written before the log existed name none
+        self._log_name = state.pop("log", None)
+        self._restore(state)
+        self._replay()
+
+    def _replay(self):
+        """Apply log entries written since the last read."""
+        if self._log_name is None:
+            return
+        try:
+            f = open(self._log_path(), "rb")
+        except FileNotFoundError:
+            return  # nothing logged yet, or compacted away (the snapshot changed)
+        with f:
+            f.seek(self._log_offset)
+            while True:
+                try:
+                    op = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break  # end of the log, or an entry cut short by a crash
+                self._apply(op)
+                self._log_offset = f.tell()
+
+    def _refresh(self):
+        if self.path is None:
+            return
+        mtime = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+        if mtime != self._mtime:
+            self._load()
+        elif self._log_name is not None:
+            try:
+                size = os.path.getsize(self._log_path())
+            except FileNotFoundError:
+                return
+            if size > self._log_offset:
+                self._replay()
+
+    @contextmanager
+    def _writing(self):
+        """Hold the thread lock and the file lock, caught up with other writers."""
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            with file_lock(self.lock_path):
+                self._refresh()
+                yield
+
+    def _record(self, op: Tuple):
+        """Apply a change and log it (inside _writing())."""
+        self._apply(op)
+        if self.path is None:
+            return
+        if self._log_name is None:
+            self._snapshot()
+            return
+        data = pickle.dumps(op, protocol=pickle.HIGHEST_PROTOCOL)
+        fd = os.open(self._log_path(), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Written at the end of the valid entries, dropping any torn tail
+            os.pwrite(fd, data, self._log_offset)
+            os.ftruncate(fd, self._log_offset + len(data))
+        finally:
+            os.close(fd)
+        self._log_offset += len(data)
+        if self._log_offset > max(LOG_COMPACT_MIN_BYTES, os.path.getsize(self.path)):
+            self._snapshot()
+
+    def _snapshot(self):
+        """Write the whole state to a new snapshot with an empty log."""
+        old_log = self._log_name
+        self._log_name = f"{self._stem}-{os.urandom(4).hex()}.log"
+        self._log_offset = 0
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({**self._state(), "log": self._log_name}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        if old_log is not None and os.path.exists(os.path.join(self.index_dir, old_log)):
+            os.remove(os.path.join(self.index_dir, old_log))
+
+    def clear(self):
+        with self._writing():
+            self._reset()
+            if self.path is not None:
+                logs = glob.glob(os.path.join(self.index_dir, f"{self._stem}-*.log"))
+                for path in [self.path, *logs]:
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._mtime = None
+            self._log_name = None
+            self._log_offset = 0
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+
+# Run fully offline: local vector index in a temp dir, fake embedder/generator
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+from fastapi.testclient import TestClient
+
+from main import app
+from embedding import set_embedder
+from generation import set_generator
+from vector_store import insert_chunks
+from fakes import FakeEmbedder, FakeGenerator
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.05)
+    set_embedder(embedder)
+    set_generator(FakeGenerator(latency=0.2))
+
+    texts = [
+        "Smart cities use sensors and data to improve services.",
+        "Traffic lights adapt to congestion in real time."
+    ]
+    insert_chunks([
+        {"text": t, "embedding": embedder.embed(t), "filename": "city.txt", "page_number": i + 1}
+        for i, t in enumerate(texts)
+    ])
+    embedder.calls = 0
+
+    questions = [f"What do smart cities do? ({i})" for i in range(8)] + ["explode", "  "]
+
+    print("Testing /ask/batch...")
+    client = TestClient(app)
+    start = time.perf_counter()
+    response = client.post("/ask/batch", json={"questions": questions, "top_k": 2})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    body = response.json()
+    results = body["results"]
+
+    print(f"Answered {len(results)} questions in {elapsed:.2f}s")
+    print("Timings:", body["timings"])
+    print(f"Embedding calls: {embedder.calls}")
+
+    assert [r["question"] for r in results] == questions
+    assert embedder.calls == 1, "Questions were not embedded in one batch"
+    for r in results[:8]:
+        assert r["error"] is None and r["sources"], r
+    assert results[8]["error"] == "generation failed"
+    assert results[9]["error"] == "Question cannot be empty"
+    # 9 generations at 0.2s each would take 1.8s one after another
+    assert elapsed < 1.5, "Generation did not run concurrently"
+
+    assert client.post("/ask/batch", json={"questions": []}).status_code == 400
+
+
+if __name__ == "__main__":
+    main()
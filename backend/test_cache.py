@@ -0,0 +1,52 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from cache import DiskCache, TTLCache
+
+
+def main():
+    directory = tempfile.mkdtemp(prefix="documate-cache-")
+
+    print("Testing expired rows are deleted...")
+    disk = DiskCache(os.path.join(directory, "ttl.sqlite"), ttl=0.2)
+    disk.set("old", 1)
+    time.sleep(0.3)
+    disk.set("new", 2)
+    disk.prune()
+    assert disk.get("old") is None and disk.get("new") == 2
+    assert disk.count() == 1
+
+    print("Testing the row bound evicts least recently used rows...")
+    disk = DiskCache(os.path.join(directory, "bounded.sqlite"), ttl=3600, max_rows=100)
+    disk.set("keep", "hot")
+    for i in range(DiskCache.PRUNE_EVERY * 3):
+        disk.set(f"k{i}", i)
+        if i % 10 == 0:
+            assert disk.get("keep") == "hot"  # touched, so never the oldest
+    disk.prune()
+    print(f"rows: {disk.count()}, evicted: {disk.evictions}")
+    assert disk.count() == 100
+    assert disk.get("keep") == "hot" and disk.get("k0") is None
+
+    print("Testing a disk hit keeps its remaining TTL in memory...")
+    path = os.path.join(directory, "shared.sqlite")
+    TTLCache(ttl=0.5, disk=DiskCache(path, ttl=0.5)).set("q", "answer")
+    time.sleep(0.3)
+    cache = TTLCache(ttl=0.5, disk=DiskCache(path, ttl=0.5))
+    assert cache.get("q") == "answer" and cache.stats()["disk_hits"] == 1
+    time.sleep(0.3)
+    # 0.6s after it was written: expired, even though it entered memory 0.3s ago
+    assert cache.get("q") is None
+
+    print("Testing the async lookups reach the disk tier...")
+    path = os.path.join(directory, "async.sqlite")
+    asyncio.run(TTLCache(disk=DiskCache(path)).set_async("q", [0.5]))
+    cache = TTLCache(disk=DiskCache(path))
+    assert asyncio.run(cache.get_async("q")) == [0.5] and cache.stats()["disk_hits"] == 1
+    assert asyncio.run(cache.get_async("missing")) is None and cache.stats()["misses"] == 1
+
+
+if __name__ == "__main__":
+    main()
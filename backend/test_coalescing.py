@@ -0,0 +1,106 @@
+import asyncio
+import os
+import tempfile
+import threading
+
+# Run fully offline: local vector index in a temp dir, fake embedder/generator
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+import httpx
+
+from main import app
+from embedding import set_embedder
+from generation import set_generator
+from metrics import collect_timings
+from rag import ask_question, get_coalescing_stats, query_cache, answer_cache
+from vector_store import insert_chunks
+from fakes import FakeEmbedder, FakeGenerator
+
+
+async def ask_concurrently(questions, top_ks=None, debug=False):
+    top_ks = top_ks or [2] * len(questions)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/ask", json={"question": q, "top_k": k, "debug_timings": debug})
+            for q, k in zip(questions, top_ks)
+        ))
+    return [r.json() for r in responses]
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.1)
+    generator = FakeGenerator(latency=0.3)
+    set_embedder(embedder)
+    set_generator(generator)
+
+    texts = ["Smart cities use sensors.", "Traffic lights adapt to congestion."]
+    insert_chunks([
+        {"text": t, "embedding": embedder.embed(t), "filename": "city.txt", "page_number": i + 1}
+        for i, t in enumerate(texts)
+    ])
+    embedder.calls = 0
+
+    print("Testing 20 concurrent identical /ask requests...")
+    # Same question after normalization (case, whitespace)
+    questions = ["What do smart cities use?"] * 10 + ["  what do SMART cities use? "] * 10
+    answers = asyncio.run(ask_concurrently(questions))
+    print(f"Embedding calls: {embedder.calls}, generation calls: {generator.calls}")
+    print("Coalesced:", get_coalescing_stats())
+    assert len({a["answer"] for a in answers}) == 1
+    assert embedder.calls == 1 and generator.calls == 1
+    assert get_coalescing_stats()["ask"] == 19
+
+    print("Testing a different top_k only shares the query embedding...")
+    query_cache.clear()
+    answer_cache.clear()
+    embedder.calls = generator.calls = 0
+    asyncio.run(ask_concurrently(["What do smart cities use?"] * 2, top_ks=[1, 2]))
+    assert generator.calls == 2 and embedder.calls == 1
+    assert get_coalescing_stats()["query_embedding"] == 1
+
+    print("Testing sync ask_question from threads...")
+    query_cache.clear()
+    answer_cache.clear()
+    embedder.calls = generator.calls = 0
+    threads = [threading.Thread(target=ask_question, args=("Traffic lights?", 2)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"Embedding calls: {embedder.calls}, generation calls: {generator.calls}")
+    assert embedder.calls == 1 and generator.calls == 1
+    assert get_coalescing_stats()["ask"] == 19 + 7
+
+    from fastapi.testclient import TestClient
+    metrics = TestClient(app).get("/metrics").text
+    assert 'documate_coalesced_requests_total{kind="ask"} 26' in metrics
+
+    print("Testing coalesced requests report the shared computation's timings...")
+    answer_cache.clear()
+    answers = asyncio.run(ask_concurrently(["Which lights adapt?"] * 4, debug=True))
+    generate = [a["debug_timings"]["generate"] for a in answers]
+    print("generate:", generate)
+    assert all(g["ms"] >= 250 and g["calls"] == 1 for g in generate)
+    assert sorted(g.get("shared", False) for g in generate) == [False, True, True, True]
+
+    answer_cache.clear()
+    timings = []
+
+    def ask_timed():
+        with collect_timings() as collector:
+            ask_question("Which lights adapt?", 2)
+        timings.append(collector.to_dict())
+
+    threads = [threading.Thread(target=ask_timed) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(t["generate"]["ms"] >= 250 for t in timings)
+    assert sorted(t["generate"].get("shared", False) for t in timings) == [False, True, True, True]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from context import pack_context, mmr_rerank, merge_adjacent, estimate_tokens
+
+
+def chunk(text, page=1, filename="doc.txt", embedding=None):
+    result = {"text": text, "filename": filename, "page_number": page}
+    if embedding is not None:
+        result["embedding"] = embedding
+    return result
+
+
+def test_mmr_prefers_diverse_chunks():
+    print("Testing MMR picks a diverse chunk over a near-duplicate...")
+    query = [1.0, 1.0, 1.0]
+    best = chunk("Sensors measure traffic.", embedding=[1.0, 1.0, 0.0])
+    duplicate = chunk("Sensors measure the traffic.", page=2, embedding=[1.0, 1.0, -0.01])
+    diverse = chunk("Budgets fund the sensors.", page=3, embedding=[0.0, 1.0, 0.5])
+
+    picked = mmr_rerank([best, duplicate, diverse], query, top_k=2)
+    assert picked == [best, diverse], [c["text"] for c in picked]
+    # Relevance alone (lambda=1) keeps the duplicate
+    assert mmr_rerank([best, duplicate, diverse], query, top_k=2, mmr_lambda=1.0) == [best, duplicate]
+
+    print("Testing MMR falls back to rank and word overlap without embeddings...")
+    ranked = [chunk("alpha beta gamma delta"), chunk("alpha beta gamma delta epsilon", page=2), chunk("zeta eta theta", page=3)]
+    assert [c["page_number"] for c in mmr_rerank(ranked, None, top_k=2)] == [1, 3]
+
+
+def test_merge_adjacent():
+    print("Testing overlapping chunks of one page are merged...")
+    first = chunk("one two three four five six")
+    second = chunk("five six seven eight")
+    contained = chunk("two three four")
+    other_page = chunk("seven eight nine", page=4)
+    merged, removed = merge_adjacent([first, second, contained, other_page])
+    assert removed == 2
+    assert [c["text"] for c in merged] == ["one two three four five six seven eight", "seven eight nine"]
+    assert first["text"] == "one two three four five six"  # inputs are not modified
+
+    print("Testing a merge across a page boundary widens the page span...")
+    merged, removed = merge_adjacent([chunk("a b c d", page=2), {**chunk("c d e f", page=2), "page_end": 3}])
+    assert removed == 1 and merged[0]["page_number"] == 2 and merged[0]["page_end"] == 3
+
+
+def test_pack_to_budget():
+    words = " ".join(f"w{i}" for i in range(300))  # 400 estimated tokens
+    chunks = [
+        chunk(words, page=1, embedding=[1.0, 0.0]),
+        chunk("short answer text", page=2, embedding=[0.5, 0.5]),
+        chunk(words.replace("w", "x"), page=3, embedding=[0.0, 1.0])
+    ]
+
+    print("Testing chunks over the token budget are dropped...")
+    packed, stats = pack_context(chunks, query_embedding=[1.0, 0.0], top_k=3, token_budget=500)
+    assert stats["selected"] == 3 and stats["packed"] == 2 and stats["dropped_over_budget"] == 1
+    assert stats["tokens"] <= 500 and stats["tokens_without_packing"] == 804
+    assert all("embedding" not in c for c in packed)
+    assert "embedding" in chunks[0]  # the caller's chunks keep theirs
+
+    print("Testing the best chunk is truncated when nothing fits...")
+    packed, stats = pack_context(chunks, query_embedding=[1.0, 0.0], top_k=1, token_budget=100)
+    assert stats["truncated"] == 1 and stats["packed"] == 1
+    assert estimate_tokens(packed[0]["text"]) <= 100
+    assert packed[0]["text"].startswith("w0 w1")
+
+
+def main():
+    test_mmr_prefers_diverse_chunks()
+    test_merge_adjacent()
+    test_pack_to_budget()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+# Run fully offline: local vector index in a temp dir, fake embedder
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+os.environ["DEDUP_NEAR_DUPLICATES"] = "true"
+
+from dedup import NearDuplicateIndex, minhash, similarity
+from embedding import set_embedder
+from pipeline import index_document
+from vector_store import get_duplicate_index, delete_document, search_chunks
+from fakes import FakeEmbedder
+
+BOILERPLATE = " ".join(f"word{i}" for i in range(649))
+
+
+def write_document(directory, filename, marker):
+    """650-word blocks that differ in one word: every 750-word chunk is a near-duplicate."""
+    path = os.path.join(directory, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(" ".join(f"{marker}{i} {BOILERPLATE}" for i in range(4)))
+    return path
+
+
+def main():
+    print("Testing MinHash similarity...")
+    first = minhash(f"confidential {BOILERPLATE}")
+    second = minhash(f"proprietary {BOILERPLATE}")
+    unrelated = minhash("Smart cities use sensors to adapt traffic lights to congestion.")
+    print(f"near-duplicate: {similarity(first, second):.2f}, unrelated: {similarity(first, unrelated):.2f}")
+    assert similarity(first, second) > 0.9 and similarity(first, unrelated) < 0.1
+
+    index = NearDuplicateIndex()
+    index.add(("a.txt", "h1"), first)
+    assert index.find(second) == ("a.txt", "h1")
+    assert index.find(unrelated) is None
+
+    print("Testing the persisted index appends and deletes incrementally...")
+    path = os.path.join(tempfile.mkdtemp(prefix="documate-minhash-"), "minhash.pkl")
+    writer, reader = NearDuplicateIndex(path), NearDuplicateIndex(path)
+    writer.add_chunks([{"text": f"confidential {BOILERPLATE}", "filename": "a.txt", "chunk_hash": "h1"}])
+    snapshot = os.stat(path).st_mtime_ns
+    writer.add_chunks([{"text": f"unrelated {i} " * 20, "filename": "b.txt", "chunk_hash": f"u{i}"} for i in range(5)])
+    assert os.stat(path).st_mtime_ns == snapshot  # appended to the log, snapshot untouched
+    assert reader.find(second) == ("a.txt", "h1") and reader.count() == 6
+    assert writer.delete_by_filename("a.txt") == 1
+    assert reader.find(second) is None and reader.count() == 5
+    assert all(("a.txt", "h1") not in keys for keys in reader.buckets.values())
+
+    embedder = FakeEmbedder(latency=0.0)
+    set_embedder(embedder)
+    upload_dir = tempfile.mkdtemp(prefix="documate-uploads-")
+
+    print("Testing near-duplicates within a document...")
+    result = index_document(write_document(upload_dir, "policy.txt", "clause"))
+    print(result["dedup"], f"{result['chunks_created']} chunks stored")
+    assert result["dedup"]["collapsed_in_document"] >= 2
+    assert result["chunks_created"] + result["dedup"]["collapsed_in_document"] == 4
+    assert get_duplicate_index().count() == result["chunks_created"]
+
+    print("Testing near-duplicates across the corpus...")
+    embedder.calls = 0
+    result = index_document(write_document(upload_dir, "handbook.txt", "section"))
+    print(result["dedup"], f"embedding calls: {embedder.calls}")
+    assert result["dedup"]["reused_from_corpus"] == result["chunks_added"]
+    assert embedder.calls == 0
+    hits = search_chunks(embedder.embed(BOILERPLATE), top_k=10, filenames=["handbook.txt"])
+    assert hits and {h["filename"] for h in hits} == {"handbook.txt"}
+    assert hits[0]["pages"] is None  # every repeat was on page 1; "pages" lists several pages only
+
+    print("Testing deletes keep the near-duplicate index in step...")
+    delete_document("policy.txt")
+    assert {key[0] for key in get_duplicate_index().signatures} == {"handbook.txt"}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+# Run fully offline: local vector index in a temp dir, fake embedder/generator
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["RETRIEVAL_MODE"] = "hybrid"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+from fastapi.testclient import TestClient
+
+from main import app
+from embedding import set_embedder
+from generation import set_generator
+from vector_store import insert_chunks, finalize_document
+from fakes import FakeEmbedder, FakeGenerator
+
+
+def add_document(embedder, filename, texts):
+    insert_chunks([
+        {
+            "text": t,
+            "embedding": embedder.embed(t),
+            "filename": filename,
+            "page_number": i + 1,
+            "chunk_hash": f"{filename}-{i}"
+        }
+        for i, t in enumerate(texts)
+    ])
+    finalize_document(
+        filename, f"{filename}-hash", [],
+        chunk_count=len(texts), text_bytes=sum(len(t) for t in texts)
+    )
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.0)
+    set_embedder(embedder)
+    set_generator(FakeGenerator())
+
+    add_document(embedder, "city.txt", ["Smart cities use sensors.", "Traffic lights adapt to congestion."])
+    add_document(embedder, "farm.txt", ["Farms rotate crops each season.", "Sensors track soil moisture."])
+    add_document(embedder, "ocean.txt", ["Tides follow the moon."])
+
+    client = TestClient(app)
+
+    print("Testing filenames filter on /ask...")
+    response = client.post("/ask", json={"question": "sensors", "top_k": 5, "filenames": ["farm.txt"]})
+    assert response.status_code == 200
+    sources = {s["filename"] for s in response.json()["sources"]}
+    print("Sources:", sources)
+    assert sources == {"farm.txt"}
+
+    response = client.post("/ask/batch", json={"questions": ["sensors", "tides"], "filenames": ["ocean.txt"]})
+    for item in response.json()["results"]:
+        assert {s["filename"] for s in item["sources"]} == {"ocean.txt"}
+
+    print("Testing DELETE /documents/{filename}...")
+    response = client.delete("/documents/city.txt")
+    print(response.json())
+    assert response.status_code == 200 and response.json()["chunks_removed"] == 2
+    assert client.delete("/documents/city.txt").status_code == 404
+
+    status = client.get("/status").json()
+    assert status["documents"] == ["farm.txt", "ocean.txt"]
+    assert status["total_chunks"] == 3
+
+    response = client.post("/ask", json={"question": "Smart cities use sensors.", "top_k": 5})
+    assert "city.txt" not in {s["filename"] for s in response.json()["sources"]}
+
+    print("Testing top_k bounds...")
+    assert client.post("/ask", json={"question": "sensors", "top_k": 10_000}).status_code == 422
+    assert client.post("/ask/batch", json={"questions": ["sensors"], "top_k": 0}).status_code == 422
+
+
+if __name__ == "__main__":
+    main()
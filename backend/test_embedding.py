@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+
+from embedding import embed_texts, embed_texts_stored, set_embedding_store
+from cache import EmbeddingStore
+from fakes import FakeEmbedder
+
+
+def main():
+    texts = [f"chunk number {i}" for i in range(200)]
+    embedder = FakeEmbedder()
+    expected = [embedder._vector(t) for t in texts]
+
+    print("Testing serial embedding (batch_size=1, concurrency=1)...")
+    start = time.perf_counter()
+    serial = embed_texts(texts[:20], embedder=embedder, batch_size=1, max_concurrency=1)
+    print(f"20 texts in {time.perf_counter() - start:.2f}s")
+    assert serial == expected[:20]
+    print("-" * 50)
+
+    print("Testing batched + concurrent embedding (batch_size=16, concurrency=4)...")
+    embedder.calls = 0
+    start = time.perf_counter()
+    embeddings = embed_texts(texts, embedder=embedder, batch_size=16, max_concurrency=4)
+    print(f"{len(texts)} texts in {time.perf_counter() - start:.2f}s "
+          f"using {embedder.calls} provider calls")
+
+    assert len(embeddings) == len(texts)
+    assert embeddings == expected, "Embeddings are out of order"
+    print("Order preserved: OK")
+    print("-" * 50)
+
+    print("Testing the persistent embedding store...")
+    path = os.path.join(tempfile.mkdtemp(prefix="documate-embeddings-"), "embeddings.sqlite")
+    set_embedding_store(EmbeddingStore(path, max_bytes=150 * embedder.dims * 4))
+    embedder.calls = 0
+    embed_texts_stored(texts[:100], embedder=embedder)
+    # A new store on the same file, as after a restart or /reset
+    store = EmbeddingStore(path, max_bytes=150 * embedder.dims * 4)
+    set_embedding_store(store)
+    calls = embedder.calls
+    stored = embed_texts_stored(texts[:120], embedder=embedder)
+    print(f"Provider calls: {embedder.calls - calls}, store stats: {store.stats()}")
+    assert embedder.calls - calls == 1  # only the 20 new texts
+    assert all(abs(a - b) < 1e-6 for v, w in zip(stored, expected) for a, b in zip(v, w))
+    assert store.stats()["hits"] == 100 and store.stats()["bytes_saved"] > 0
+
+    embed_texts_stored(texts[120:], embedder=embedder)
+    print(f"After eviction: {store.stats()}")
+    assert store.stats()["size_bytes"] <= store.max_bytes and store.stats()["evictions"] == 50
+
+    # Running totals match a scan, also after re-storing texts already present
+    store.set_many(embedder.model, texts[150:], expected[150:])
+    scan = store._connection().execute("SELECT COUNT(*), SUM(length(vector)) FROM embeddings").fetchone()
+    assert (store.stats()["entries"], store.stats()["size_bytes"]) == scan == (150, 150 * embedder.dims * 4)
+    set_embedding_store(None)
+
+
+if __name__ == "__main__":
+    main()
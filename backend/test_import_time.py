@@ -0,0 +1,48 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Importing the app must stay fast (cold starts, worker forks) and must not
+# pull in dependencies that warmup.py loads in the background
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+RUNS = 5
+
+LAZY_MODULES = ("google.generativeai", "PyPDF2", "docx", "pymongo")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure():
+    """Import main in a fresh interpreter; returns (ms, lazy modules loaded)."""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, VECTOR_BACKEND="atlas")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=backend_dir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["ms"], result["loaded"]
+
+
+def main():
+    timings = []
+    for _ in range(RUNS):
+        ms, loaded = measure()
+        assert not loaded, f"Imported at startup instead of on first use: {loaded}"
+        timings.append(ms)
+
+    median = statistics.median(timings)
+    print(f"import main: median {median:.0f} ms over {RUNS} runs (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    assert median <= IMPORT_TIME_BUDGET_MS, f"Import took {median:.0f} ms, budget is {IMPORT_TIME_BUDGET_MS:.0f} ms"
+
+
+if __name__ == "__main__":
+    main()
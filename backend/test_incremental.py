@@ -0,0 +1,99 @@
+import os
+import tempfile
+
+# Run fully offline: local vector index in a temp dir, fake embedder
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+import pipeline
+from pipeline import Progress, index_document, _add_occurrence, _moved_chunks, _span_pages
+from embedding import set_embedder
+from vector_store import get_store
+from metrics import TimedIterator
+from fakes import FakeEmbedder
+from jobs import JobCancelled
+
+
+def page(number, topic):
+    return {"text": f"Page about {topic}. " + " ".join(f"{topic}{i}" for i in range(200)), "page_number": number}
+
+
+class CancelAfterFirstWindow(Progress):
+    """Cancels the job once the first embedding window has been handed to the writer."""
+
+    def __init__(self):
+        self.checks = 0
+
+    def check_cancelled(self):
+        self.checks += 1
+        if self.checks > 1:
+            raise JobCancelled()
+
+
+def upload(path, pages, progress=None):
+    """Index a file whose extracted pages are the given ones."""
+    filename = os.path.basename(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(repr(pages))  # new content, new file hash
+    extract_document = pipeline.extract_document
+    pipeline.extract_document = lambda _: TimedIterator("extract", ({**p, "filename": filename} for p in pages))
+    try:
+        return index_document(path, progress)
+    finally:
+        pipeline.extract_document = extract_document
+
+
+def stored_pages(filename):
+    return sorted((r["text"].split(".")[0], r["page_number"]) for r in get_store().index.records(filename))
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.0)
+    set_embedder(embedder)
+    path = os.path.join(tempfile.mkdtemp(prefix="documate-uploads-"), "report.pdf")
+    topics = [f"topic{n}" for n in range(10)]
+
+    print("Testing first upload...")
+    result = upload(path, [page(n + 1, t) for n, t in enumerate(topics)])
+    assert result["chunks_added"] == 10
+
+    print("Testing a cover page inserted in front...")
+    embedder.calls = 0
+    result = upload(path, [page(1, "cover")] + [page(n + 2, t) for n, t in enumerate(topics)])
+    print({k: result[k] for k in ("chunks_created", "chunks_reused", "chunks_added", "chunks_removed")})
+    assert result["chunks_reused"] == 10 and result["chunks_added"] == 1 and result["chunks_removed"] == 0
+    assert embedder.calls == 1
+    # Reused chunks moved one page down
+    assert ("Page about topic0", 2) in stored_pages("report.pdf")
+    assert ("Page about cover", 1) in stored_pages("report.pdf")
+
+    print("Testing a repeated page is stored once, listing both pages...")
+    pages = [page(1, "cover")] + [page(n + 2, t) for n, t in enumerate(topics)] + [page(12, "cover")]
+    result = upload(path, pages)
+    assert result["chunks_added"] == 0 and result["chunks_created"] == 11
+    cover = [r for r in get_store().index.records("report.pdf") if r["text"].startswith("Page about cover")]
+    assert len(cover) == 1 and cover[0]["pages"] == [1, 12]
+
+    print("Testing repeats of a chunk spanning pages list every page of each span...")
+    footer = {"page_number": 3, "page_start": 3, "page_end": 4}
+    place = {**footer, "pages": _span_pages(footer), "occurrences": 1}
+    assert _moved_chunks({"h": place}, {}) == {}  # one span: page_start..page_end says it all
+    _add_occurrence(place, {"page_number": 7, "page_start": 7, "page_end": 8})
+    assert _moved_chunks({"h": place}, {})["h"]["pages"] == [3, 4, 7, 8]
+
+    print("Testing a cancelled upload leaves nothing new searchable...")
+    before = stored_pages("report.pdf")
+    pages = [page(n + 1, f"draft{n}") for n in range(300)]  # more than one embedding window
+    for target in (path, os.path.join(os.path.dirname(path), "draft.pdf")):
+        try:
+            upload(target, pages, CancelAfterFirstWindow())
+            raise AssertionError("Upload should have been cancelled")
+        except JobCancelled:
+            pass
+        hits = get_store().search(embedder._vector(pages[0]["text"]), top_k=500)
+        assert not [h for h in hits if h["text"].startswith("Page about draft")]
+    assert stored_pages("report.pdf") == before and stored_pages("draft.pdf") == []
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ PDF_PATH = "data/uploads/article5.pdf"  # change if your PDF is elsewhere
 
 def main():
     print("Testing PDF extraction...")
-    pages = extract_pdf_with_pages(PDF_PATH)
+    pages = list(extract_pdf_with_pages(PDF_PATH))
 
     print(f"Total pages extracted: {len(pages)}")
     print("First page sample:")
@@ -12,11 +12,20 @@ def main():
     print("-" * 50)
 
     print("Testing chunking...")
-    chunks = chunk_text(pages)
+    chunks = list(chunk_text(pages))
 
     print(f"Total chunks created: {len(chunks)}")
     print("First chunk sample:")
     print(chunks[0])
+    print("-" * 50)
+
+    print("Testing cross-page chunking...")
+    stats = {}
+    flowed = list(chunk_text(pages, mode="flow", stats=stats))
+    print(f"Flow chunks: {stats['chunks']} (page mode baseline: {stats['per_page_chunks']})")
+    assert all(c["page_start"] <= c["page_end"] for c in flowed)
+    assert all(c["page_number"] == c["page_start"] for c in flowed)
+    assert stats["chunks"] <= stats["per_page_chunks"]
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+
+# Run fully offline: local vector index in a temp dir
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+from fastapi.testclient import TestClient
+
+from jobs import JobManager, FileBusy, QueueFull
+from main import app, job_manager
+
+
+def test_reservations():
+    manager = JobManager(workers=1, max_pending=2)
+
+    print("Testing concurrent reservations of one file...")
+    results = []
+
+    def reserve():
+        try:
+            results.append(manager.reserve("a.txt", "/tmp/a.txt"))
+        except FileBusy:
+            results.append(None)
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(job is not None for job in results) == 1
+
+    print("Testing the queue bound and releasing a reservation...")
+    second = manager.reserve("b.txt", "/tmp/b.txt")
+    try:
+        manager.reserve("c.txt", "/tmp/c.txt")
+        raise AssertionError("Queue should be full")
+    except QueueFull:
+        pass
+    manager.release(second)
+    third = manager.reserve("c.txt", "/tmp/c.txt")
+
+    print("Testing a reserved job runs once started...")
+    done = threading.Event()
+    manager.start(third, lambda job: done.set() or {"ok": True})
+    assert done.wait(5)
+    manager.shutdown()
+
+
+def test_upload_never_replaces_refused_file():
+    client = TestClient(app)
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    upload_dir = os.path.join(base_dir, "data", "uploads")
+    path = os.path.join(upload_dir, "jobs-test.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("original")
+
+    try:
+        print("Testing 409 leaves the file being indexed untouched...")
+        reserved = job_manager.reserve("jobs-test.txt", path)
+        response = client.post("/upload", files={"file": ("jobs-test.txt", b"replacement")})
+        assert response.status_code == 409, response.text
+        job_manager.release(reserved)
+
+        print("Testing 429 leaves the existing file untouched...")
+        max_pending, job_manager.max_pending = job_manager.max_pending, 0
+        try:
+            response = client.post("/upload", files={"file": ("jobs-test.txt", b"replacement")})
+        finally:
+            job_manager.max_pending = max_pending
+        assert response.status_code == 429, response.text
+
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "original"
+        assert not [name for name in os.listdir(upload_dir) if name.startswith(".upload-")]
+    finally:
+        os.remove(path)
+
+
+def test_reset_waits_for_jobs():
+    client = TestClient(app)
+
+    print("Testing /reset is refused while a job is queued or running...")
+    reserved = job_manager.reserve("reset-test.txt", "/tmp/reset-test.txt")
+    response = client.delete("/reset")
+    assert response.status_code == 409, response.text
+    job_manager.release(reserved)
+    assert client.delete("/reset").status_code == 200
+
+    print("Testing uploads are refused while the knowledge base is reset...")
+    with job_manager.exclusive():
+        try:
+            job_manager.reserve("reset-test.txt", "/tmp/reset-test.txt")
+            raise AssertionError("Reservation should be refused")
+        except FileBusy:
+            pass
+    job_manager.release(job_manager.reserve("reset-test.txt", "/tmp/reset-test.txt"))
+
+
+def main():
+    test_reservations()
+    test_upload_never_replaces_refused_file()
+    test_reset_waits_for_jobs()
+
+
+if __name__ == "__main__":
+    main()
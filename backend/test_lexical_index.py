@@ -0,0 +1,90 @@
+import os
+import pickle
+import tempfile
+
+import snapshot_log
+from lexical_index import InvertedIndex, reciprocal_rank_fusion, LEXICAL_INDEX_FILE
+from rag import page_label
+
+
+def chunk(filename, i, text=None):
+    return {
+        "text": text or f"Clause {i}.{i} covers item SKU_{i} of {filename}.",
+        "filename": filename,
+        "page_number": i + 1,
+        "chunk_hash": f"{filename}-{i}"
+    }
+
+
+def test_log_persistence():
+    index_dir = tempfile.mkdtemp(prefix="documate-bm25-")
+    writer = InvertedIndex(index_dir)
+    reader = InvertedIndex(index_dir)
+
+    print("Testing adds append to the log instead of rewriting the snapshot...")
+    writer.add([chunk("a.txt", 0)])
+    snapshot = os.stat(os.path.join(index_dir, LEXICAL_INDEX_FILE)).st_mtime_ns
+    for i in range(1, 50):
+        writer.add([chunk("a.txt", i)])
+    assert os.stat(os.path.join(index_dir, LEXICAL_INDEX_FILE)).st_mtime_ns == snapshot
+
+    print("Testing another instance replays the log...")
+    hits = reader.search("SKU_42", top_k=3)
+    assert hits[0]["chunk_hash"] == "a.txt-42" and "text" not in hits[0]
+    assert reader.count() == 50
+
+    writer.update_records("a.txt", {"a.txt-42": {"pages": [43, 44]}})
+    assert writer.delete_by_filename("a.txt", ["a.txt-7"]) == 1
+    assert reader.count() == 49
+    assert [r for r in reader.records if r and r["chunk_hash"] == "a.txt-42"][0]["pages"] == [43, 44]
+    # BM25-only hits carry every page of repeated text, like vector hits
+    hit = reader.search("SKU_42", top_k=1)[0]
+    assert hit["pages"] == [43, 44] and page_label(hit) == "Pages 43, 44"
+
+    print("Testing a large log is folded into a snapshot, without chunk text...")
+    min_bytes, snapshot_log.LOG_COMPACT_MIN_BYTES = snapshot_log.LOG_COMPACT_MIN_BYTES, 0
+    try:
+        writer.add([chunk("b.txt", i) for i in range(20)])
+    finally:
+        snapshot_log.LOG_COMPACT_MIN_BYTES = min_bytes
+    with open(os.path.join(index_dir, LEXICAL_INDEX_FILE), "rb") as f:
+        state = pickle.load(f)
+    assert all("text" not in r for r in state["records"] if r)
+    assert len([n for n in os.listdir(index_dir) if n.endswith(".log")]) <= 1
+    assert InvertedIndex(index_dir).count() == reader.count() == 69
+
+    print("Testing a torn log entry is ignored and overwritten...")
+    log = os.path.join(index_dir, writer._log_name)
+    with open(log, "ab") as f:
+        f.write(b"\x80\x05torn")
+    writer.add([chunk("c.txt", 0)])
+    assert InvertedIndex(index_dir).count() == 70
+
+    writer.clear()
+    assert reader.count() == 0
+    assert not [n for n in os.listdir(index_dir) if n.endswith((".pkl", ".log"))]
+
+
+def test_rrf_ordering():
+    print("Testing reciprocal-rank fusion ordering...")
+
+    def hit(name):
+        return {"filename": "doc.txt", "page_number": 1, "text": name}
+
+    vector = [hit("a"), hit("b"), hit("c")]
+    bm25 = [hit("c"), hit("b"), hit("d")]
+    fused = [r["text"] for r in reciprocal_rank_fusion([vector, bm25], top_k=4, k=60)]
+    # c: 1/63 + 1/61, b: 1/62 + 1/62, a: 1/61, d: 1/63
+    assert fused == ["c", "b", "a", "d"], fused
+    assert len(reciprocal_rank_fusion([vector, bm25], top_k=2)) == 2
+    # A chunk found by both retrievers outranks one found by a single retriever at the same rank
+    assert [r["text"] for r in reciprocal_rank_fusion([[hit("x"), hit("y")], [hit("y")]], top_k=2)] == ["y", "x"]
+
+
+def main():
+    test_log_persistence()
+    test_rrf_ordering()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+import local_index
+from local_index import LocalVectorIndex, META_FILE
+
+WRITERS = 4
+BATCHES = 10
+
+
+def chunk(writer, batch):
+    vector = np.random.RandomState(writer * 100 + batch).rand(8).tolist()
+    return {
+        "text": f"writer {writer} batch {batch} " + "x" * batch,
+        "embedding": vector,
+        "filename": f"w{writer}.txt",
+        "page_number": 1,
+        "chunk_hash": f"{writer}-{batch}"
+    }
+
+
+def write(index_dir, writer):
+    # Each process has its own index object; only the file lock serializes them
+    index = LocalVectorIndex(index_dir)
+    for batch in range(BATCHES):
+        index.add([chunk(writer, batch)])
+
+
+def test_concurrent_writers():
+    index_dir = tempfile.mkdtemp(prefix="documate-index-")
+
+    print(f"Testing {WRITERS} processes appending at once...")
+    processes = [multiprocessing.Process(target=write, args=(index_dir, w)) for w in range(WRITERS)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+
+    index = LocalVectorIndex(index_dir)
+    assert index.count() == WRITERS * BATCHES, index.count()
+    texts = {r["chunk_hash"]: r["text"] for r in index.all_records()}
+    assert all(texts[f"{w}-{b}"] == chunk(w, b)["text"] for w in range(WRITERS) for b in range(BATCHES))
+
+    print("Testing text survives compaction, for this and a stale reader...")
+    stale = LocalVectorIndex(index_dir)
+    query = chunk(3, 5)["embedding"]
+    fraction, local_index.LOCAL_COMPACT_DEAD_FRACTION = local_index.LOCAL_COMPACT_DEAD_FRACTION, 0
+    try:
+        assert index.delete_by_filename("w0.txt") == BATCHES
+    finally:
+        local_index.LOCAL_COMPACT_DEAD_FRACTION = fraction
+    assert "w0.txt" not in {r["filename"] for r in stale.all_records()}
+    hit = stale.search(query, top_k=1)[0]
+    assert hit["text"] == chunk(3, 5)["text"]
+    assert "text" not in index.records("w1.txt", include_text=False)[0]
+
+    index.clear()
+    assert LocalVectorIndex(index_dir).count() == 0
+    assert os.listdir(index_dir) == ["index.lock"]
+
+
+def data_files(index_dir):
+    """(name, inode, size) of every vector / records / texts file."""
+    return {
+        name: (os.stat(os.path.join(index_dir, name)).st_ino, os.path.getsize(os.path.join(index_dir, name)))
+        for name in os.listdir(index_dir) if name.startswith(("vectors", "records", "texts"))
+    }
+
+
+def test_append_only():
+    index_dir = tempfile.mkdtemp(prefix="documate-index-")
+    index = LocalVectorIndex(index_dir)
+    reader = LocalVectorIndex(index_dir)
+
+    print("Testing appends extend the files instead of rewriting them...")
+    index.add([chunk(0, b) for b in range(5)])
+    assert reader.count() == 5
+    before = data_files(index_dir)
+    index.add([chunk(1, b) for b in range(5)])
+    after = data_files(index_dir)
+    assert before.keys() == after.keys()
+    assert all(after[name][0] == inode and after[name][1] > size for name, (inode, size) in before.items())
+    assert reader.count() == 10 and reader.search(chunk(1, 3)["embedding"], top_k=1)[0]["text"] == chunk(1, 3)["text"]
+
+    print("Testing updates are logged, and skipped when nothing changes...")
+    index.update_records("w0.txt", {"file_hash": "h0"}, {"0-2": {"pages": [3, 9]}})
+    assert data_files(index_dir) == after
+    assert {r["file_hash"] for r in reader.records("w0.txt", include_text=False)} == {"h0"}
+    assert [r["pages"] for r in reader.records("w0.txt") if r["chunk_hash"] == "0-2"] == [[3, 9]]
+    meta = os.stat(os.path.join(index_dir, META_FILE)).st_ino
+    index.update_records("w0.txt", {"file_hash": "h0"}, {"0-2": {"pages": [3, 9]}})
+    assert os.stat(os.path.join(index_dir, META_FILE)).st_ino == meta
+    # Rows added after an update keep their own fields
+    index.add([{**chunk(0, 7), "file_hash": None}])
+    assert LocalVectorIndex(index_dir).records("w0.txt", include_text=False)[-1]["file_hash"] is None
+
+    print("Testing deletes mask rows until enough of them are dead...")
+    before = data_files(index_dir)
+    assert index.delete_by_filename("w1.txt", ["1-3"]) == 1
+    assert data_files(index_dir) == before
+    assert reader.count() == 10
+    hits = reader.search(chunk(1, 3)["embedding"], top_k=11)
+    assert len(hits) == 10 and chunk(1, 3)["text"] not in {h["text"] for h in hits}
+    assert "1-3" not in {r["chunk_hash"] for r in LocalVectorIndex(index_dir).all_records()}
+
+    print("Testing compaction drops dead rows and earlier files...")
+    assert index.delete_by_filename("w1.txt") == 4
+    compacted = data_files(index_dir)
+    assert not compacted.keys() & after.keys()
+    vectors = [size for name, (_, size) in compacted.items() if name.startswith("vectors")]
+    assert vectors == [6 * 8 * 4]
+    assert reader.count() == 6 and reader.filenames() == ["w0.txt"]
+    assert [r["pages"] for r in reader.records("w0.txt") if r["chunk_hash"] == "0-2"] == [[3, 9]]
+    assert reader.search(chunk(0, 4)["embedding"], top_k=1)[0]["text"] == chunk(0, 4)["text"]
+
+
+def main():
+    test_concurrent_writers()
+    test_append_only()
+
+if __name__ == "__main__":
+    main()
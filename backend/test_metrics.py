@@ -0,0 +1,101 @@
+import os
+import re
+import tempfile
+
+# Run fully offline: local vector index in a temp dir, fake embedder/generator
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+from fastapi.testclient import TestClient
+
+from main import app
+from embedding import set_embedder
+from generation import set_generator
+from vector_store import insert_chunks, finalize_document
+from fakes import FakeEmbedder, FakeGenerator
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+
+def parse(text):
+    """Check the exposition format; return ({name: type}, {(name, labels): value})."""
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram"), line
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"Malformed sample: {line!r}"
+        name, labels, value = match.groups()
+        samples[(name, labels or "")] = float(value)
+    return types, samples
+
+
+def histogram_ok(samples, name, labels):
+    """Buckets never decrease and the +Inf bucket equals the count."""
+    prefix = labels[1:-1] + "," if labels else ""
+    buckets = [
+        (float(re.search(r'le="([^"]+)"', key[1]).group(1)), value)
+        for key, value in samples.items()
+        if key[0] == name + "_bucket" and key[1].startswith("{" + prefix + "le=")
+    ]
+    counts = [value for _, value in sorted(buckets)]
+    assert counts and counts == sorted(counts), buckets
+    assert counts[-1] == samples[(name + "_count", labels)] > 0
+    return counts[-1]
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.0)
+    set_embedder(embedder)
+    set_generator(FakeGenerator())
+
+    texts = ["Smart cities use sensors.", "Traffic lights adapt to congestion."]
+    insert_chunks([
+        {"text": t, "embedding": embedder.embed(t), "filename": "city.txt", "page_number": i + 1, "chunk_hash": f"city-{i}"}
+        for i, t in enumerate(texts)
+    ])
+    finalize_document("city.txt", "city-hash", [], chunk_count=len(texts), text_bytes=sum(len(t) for t in texts))
+
+    client = TestClient(app)
+    for _ in range(2):
+        assert client.post("/ask", json={"question": "What do smart cities use?"}).status_code == 200
+
+    print("Testing /metrics serves the Prometheus text format...")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    types, samples = parse(response.text)
+    for (name, _) in samples:
+        assert re.sub(r"_(bucket|sum|count)$", "", name) in types or name in types, name
+
+    print("Testing metric types and values...")
+    assert types["documate_stage_seconds"] == "histogram"
+    assert types["documate_http_request_seconds"] == "histogram"
+    assert types["documate_cache_hits_total"] == "counter"
+    assert types["documate_chunks"] == "gauge"
+    for stage in ("embed_query", "vector_search", "packing", "generate"):
+        histogram_ok(samples, "documate_stage_seconds", f'{{stage="{stage}"}}')
+    assert histogram_ok(samples, "documate_http_request_seconds", '{method="POST",route="/ask",status="200"}') == 2
+    # The second question hits both caches
+    assert samples[("documate_cache_misses_total", '{cache="query_embeddings"}')] == 1
+    assert samples[("documate_cache_hits_total", '{cache="query_embeddings"}')] == 1
+    assert samples[("documate_cache_hit_ratio", '{cache="answers"}')] == 0.5
+    assert samples[("documate_chunks", "")] == 2
+    assert samples[("documate_documents", "")] == 1
+    assert samples[("documate_ingest_jobs", '{state="queued"}')] == 0
+
+    print("Testing /ask debug timings match the recorded stages...")
+    response = client.post("/ask", json={"question": "Which lights adapt?", "debug_timings": True})
+    timings = response.json()["debug_timings"]
+    assert {"embed_query", "vector_search", "generate"} <= set(timings), timings
+    _, after = parse(client.get("/metrics").text)
+    assert after[("documate_stage_seconds_count", '{stage="generate"}')] == samples[("documate_stage_seconds_count", '{stage="generate"}')] + 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# Run fully offline: local vector index in a temp dir, fake embedder/generator
+os.environ["VECTOR_BACKEND"] = "local"
+os.environ["LOCAL_INDEX_DIR"] = tempfile.mkdtemp(prefix="documate-index-")
+
+import requests
+import uvicorn
+
+from main import app
+from embedding import set_embedder
+from generation import set_generator
+from vector_store import insert_chunks
+from fakes import ANSWER, FakeEmbedder, FakeGenerator
+
+def read_events(response):
+    """Parse a server-sent events body into (event, data, arrival time) tuples."""
+    events = []
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):]), time.perf_counter()))
+    return events
+
+
+def start_server():
+    """Run the app on a free local port (TestClient would buffer the stream)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def main():
+    embedder = FakeEmbedder(latency=0.0)
+    set_embedder(embedder)
+    set_generator(FakeGenerator(interval=0.1))
+
+    text = "Smart cities use sensors and data to improve services."
+    insert_chunks([{
+        "text": text,
+        "embedding": embedder.embed(text),
+        "filename": "city.txt",
+        "page_number": 1
+    }])
+
+    server, url = start_server()
+    try:
+        print("Testing /ask/stream...")
+        start = time.perf_counter()
+        payload = {"question": "What are smart cities?", "top_k": 3}
+        with requests.post(f"{url}/ask/stream", json=payload, stream=True) as response:
+            assert response.status_code == 200
+            events = read_events(response)
+    finally:
+        server.should_exit = True
+
+    names = [e[0] for e in events]
+    print("Events:", names)
+    assert names[0] == "citations" and names[-1] == "done"
+    assert names.count("token") == len(ANSWER.split())
+
+    done = events[-1][1]
+    print(f"Answer: {done['answer']}")
+    print(f"Server TTFT: {done['ttft_ms']} ms, total: {done['total_ms']} ms")
+    print(f"Client saw citations after {(events[0][2] - start) * 1000:.1f} ms, "
+          f"first token after {(events[1][2] - start) * 1000:.1f} ms, "
+          f"done after {(events[-1][2] - start) * 1000:.1f} ms")
+    assert done["ttft_ms"] < done["total_ms"]
+    assert events[1][2] < events[-1][2] - 0.5, "Tokens were not streamed incrementally"
+    assert done["citations"] == [{"filename": "city.txt", "page_number": 1}]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,82 @@
-from vector_store import clear_collection, get_stats
+import os
+
+from pymongo.errors import AutoReconnect
+
+import vector_store
+from vector_store import (
+    init_client, close_client, get_client, get_collection,
+    insert_chunks, clear_collection, get_stats,
+    finalize_document, delete_document, rebuild_manifest, get_manifest
+)
 
 def main():
+    # Without a real cluster, run against an in-memory mongomock client
+    if not os.getenv("MONGODB_URI"):
+        os.environ["MONGODB_URI"] = "mongomock://localhost"
+
+    init_client()
+    assert get_collection().database.client is get_client(), "Client is not shared"
+
     clear_collection()
+    insert_chunks([
+        {"text": "hello", "embedding": [0.1, 0.2], "filename": "a.txt", "page_number": 1, "chunk_hash": "h1"},
+        {"text": "world", "embedding": [0.2, 0.1], "filename": "b.txt", "page_number": 1, "chunk_hash": "h2"}
+    ])
+    finalize_document("a.txt", "f1", [], chunk_count=1, text_bytes=5, file_bytes=10)
+    finalize_document("b.txt", "f2", [], chunk_count=1, text_bytes=5, file_bytes=20)
     stats = get_stats()
     print("MongoDB stats:", stats)
+    assert stats["total_chunks"] == 2
+    assert stats["documents"] == ["a.txt", "b.txt"]
+
+    # Drift repair: a wrong chunk count is recomputed from the chunks
+    before = get_manifest()
+    get_client()["document_qa"]["documents"].update_one({"filename": "a.txt"}, {"$set": {"chunk_count": 99}})
+    assert rebuild_manifest() == 2
+    assert get_manifest() == before, "Rebuild lost manifest fields"
+
+    # Chunks are upserted by id: writing them again adds nothing
+    insert_chunks([
+        {"text": "hello", "embedding": [0.1, 0.2], "filename": "a.txt", "page_number": 1, "chunk_hash": "h1"}
+    ])
+    assert get_collection().count_documents({}) == 2, "Re-insert duplicated a chunk"
+
+    # A transient error is retried instead of failing the document
+    collection = get_collection()
+    failures = []
+
+    class Flaky:
+        def with_options(self, **kwargs):
+            return self
+
+        def bulk_write(self, requests, ordered=True):
+            assert not ordered
+            if not failures:
+                failures.append(1)
+                raise AutoReconnect("primary stepped down")
+            return collection.bulk_write(requests, ordered=ordered)
+
+    original, backoff = vector_store.get_collection, vector_store.INSERT_RETRY_BACKOFF
+    vector_store.get_collection, vector_store.INSERT_RETRY_BACKOFF = Flaky, 0
+    try:
+        insert_chunks([
+            {"text": "again", "embedding": [0.3, 0.1], "filename": "b.txt", "page_number": 2, "chunk_hash": "h3"}
+        ])
+    finally:
+        vector_store.get_collection, vector_store.INSERT_RETRY_BACKOFF = original, backoff
+    assert failures and collection.count_documents({"filename": "b.txt"}) == 2
+
+    assert delete_document("b.txt") == 2
+    assert get_stats()["documents"] == ["a.txt"]
+
+    # $vectorSearch: limit <= numCandidates <= 10000 for any requested depth
+    for top_k in (1, 5, 34, 150, 999, 20000):
+        stage = vector_store.AtlasVectorStore._search_pipeline([0.1, 0.2], top_k, False, None)[0]["$vectorSearch"]
+        assert stage["limit"] <= stage["numCandidates"] <= vector_store.ATLAS_MAX_NUM_CANDIDATES, stage
+
+    clear_collection()
+    print("MongoDB stats after reset:", get_stats())
+    close_client()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+# backend/upstream.py
+
+"""
+Per-Upstream Concurrency Limits (async request path)
+
+Async handlers do not tie up a worker thread while they wait, so nothing
+else stops a burst of /ask requests from sending hundreds of calls to
+the embedding API, MongoDB or the generation API at once. Each upstream
+gets its own semaphore; callers wait their turn with:
+
+    async with limit("embedding"):
+        ...
+
+Limits apply per event loop, i.e. per uvicorn worker process.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Dict
+import asyncio
+import os
+import threading
+import weakref
+from dotenv import load_dotenv
+
+from metrics import REGISTRY, GaugeFunc
+
+# Load environment variables
+load_dotenv()
+
+# Calls in flight per upstream; the Mongo default matches the connection pool
+UPSTREAM_CONCURRENCY = {
+    "embedding": int(os.getenv("EMBED_UPSTREAM_CONCURRENCY", "64")),
+    "mongo": int(os.getenv("MONGO_UPSTREAM_CONCURRENCY", os.getenv("MONGO_MAX_POOL_SIZE", "50"))),
+    "generation": int(os.getenv("GENERATION_UPSTREAM_CONCURRENCY", "64")),
+}
+
+# event loop -> upstream -> semaphore (asyncio primitives belong to one loop)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_in_flight = {name: 0 for name in UPSTREAM_CONCURRENCY}
+_waiting = {name: 0 for name in UPSTREAM_CONCURRENCY}
+_lock = threading.Lock()
+
+
+def _semaphore(name: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphores = _semaphores.setdefault(loop, {})
+        if name not in semaphores:
+            semaphores[name] = asyncio.Semaphore(UPSTREAM_CONCURRENCY[name])
+        return semaphores[name]
+
+
+def _add(counts: Dict[str, int], name: str, delta: int):
+    with _lock:
+        counts[name] += delta
+
+
+@asynccontextmanager
+async def limit(name: str):
+    """Hold one of the upstream's concurrency slots for the enclosed block."""
+    semaphore = _semaphore(name)
+    _add(_waiting, name, 1)
+    try:
+        await semaphore.acquire()
+    finally:
+        _add(_waiting, name, -1)
+    _add(_in_flight, name, 1)
+    try:
+        yield
+    finally:
+        _add(_in_flight, name, -1)
+        semaphore.release()
+
+
+def _snapshot(counts: Dict[str, int]):
+    with _lock:
+        return {(name,): value for name, value in counts.items()}
+
+
+REGISTRY.register(GaugeFunc(
+    "documate_upstream_in_flight",
+    "Async upstream calls in progress",
+    lambda: _snapshot(_in_flight),
+    ("upstream",)
+))
+REGISTRY.register(GaugeFunc(
+    "documate_upstream_waiting",
+    "Async upstream calls waiting for a concurrency slot",
+    lambda: _snapshot(_waiting),
+    ("upstream",)
+))
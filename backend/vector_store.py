@@ -7,61 +7,925 @@ Why MongoDB?
 - Stores text, embeddings, and metadata together
 - Supports native vector search using cosine similarity
 - Free tier is sufficient for prototype-scale RAG systems
+
+Retrieval is pluggable: VECTOR_BACKEND=local swaps Atlas for an
+in-process NumPy index (see local_index.py) that needs no database.
+RETRIEVAL_MODE=hybrid also maintains a BM25 index (see lexical_index.py),
+and DEDUP_NEAR_DUPLICATES=true a MinHash index of chunks (see dedup.py).
+
+Alongside the chunks, a manifest keeps one summary row per document
+(chunk count, sizes, file hash, ingest time). Ingest and delete update it
+in the same transaction as the chunks, so /status reads O(#documents)
+rows instead of scanning every chunk.
+
+One MongoClient (and its connection pool) is shared by the whole process.
+It is opened in the FastAPI lifespan, recreated after a fork, and closed
+on shutdown. pymongo itself is imported on first use, so the local
+backend (and startup) never pay for it. The async request path uses a
+motor client over the same URI (see search_chunks_async).
 """
 
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import asyncio
 import os
-from pymongo import MongoClient
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from metrics import span
+from upstream import limit
+
 # Load environment variables
 load_dotenv()
 
+DATABASE_NAME = "document_qa"
+COLLECTION_NAME = "chunks"
+MANIFEST_COLLECTION_NAME = "documents"
 
-def get_collection():
+# Connection pool parameters
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+# Concurrent $vectorSearch queries for batched retrieval
+ATLAS_SEARCH_CONCURRENCY = int(os.getenv("ATLAS_SEARCH_CONCURRENCY", "8"))
+
+# $vectorSearch candidates per result (ANN accuracy), and Atlas' ceiling;
+# numCandidates must never be below limit or Atlas rejects the query
+ATLAS_CANDIDATES_PER_RESULT = int(os.getenv("ATLAS_CANDIDATES_PER_RESULT", "10"))
+ATLAS_MAX_NUM_CANDIDATES = 10000
+
+# Chunk writes: documents per bulk write, write concern, transient-error retries
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "100"))
+INSERT_WRITE_CONCERN_W = os.getenv("INSERT_WRITE_CONCERN_W", "")  # e.g. "1" or "majority"; empty = client default
+INSERT_JOURNAL = os.getenv("INSERT_JOURNAL", "").lower()  # "true" / "false"; empty = server default
+INSERT_MAX_RETRIES = int(os.getenv("INSERT_MAX_RETRIES", "3"))
+INSERT_RETRY_BACKOFF = float(os.getenv("INSERT_RETRY_BACKOFF", "0.5"))  # seconds, doubled per retry
+
+_client = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+# Async (motor) client for the async request path, opened on first use
+_async_client = None
+_async_client_pid: Optional[int] = None
+
+# Per-client facts, reset whenever a new client is opened
+_manifest_indexed = False
+_transactions_supported: Optional[bool] = None
+
+
+def _create_client():
     """
-    Create and return the MongoDB collection.
-    Connection is created lazily to avoid import-time failures.
+    Build a MongoClient from MONGODB_URI.
+    A "mongomock://" URI returns an in-memory mongomock client for tests.
     """
     mongodb_uri = os.getenv("MONGODB_URI")
     if not mongodb_uri:
         raise ValueError("MONGODB_URI is not set in environment variables")
 
-    client = MongoClient(mongodb_uri)
-    db = client["document_qa"]
-    return db["chunks"]
+    if mongodb_uri.startswith("mongomock://"):
+        import mongomock
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+
+    # connect=False defers opening sockets until the first operation,
+    # so a client created before a fork is never used by the child
+    return MongoClient(
+        mongodb_uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        connect=False,
+    )
+
+
+def init_client(client=None):
+    """
+    Open the process-wide client.
+    A ready-made client (e.g. mongomock.MongoClient()) can be passed in.
+    """
+    global _client, _client_pid, _manifest_indexed, _transactions_supported
+    with _client_lock:
+        if client is None and _client is not None and _client_pid == os.getpid():
+            return _client
+        _client = client if client is not None else _create_client()
+        _client_pid = os.getpid()
+        _manifest_indexed = False
+        _transactions_supported = None
+        return _client
+
+
+def get_client():
+    """
+    Return the process-wide client, creating it on first use.
+    A client inherited across fork() is replaced, never reused.
+    """
+    if _client is None or _client_pid != os.getpid():
+        return init_client()
+    return _client
+
+
+def get_async_client():
+    """
+    Return the process-wide motor client (same URI and pool settings).
+    Returns None for a mongomock URI: there is no async mock, so callers
+    run the sync client on a worker thread instead.
+    """
+    global _async_client, _async_client_pid
+    if _async_client is not None and _async_client_pid == os.getpid():
+        return _async_client
+
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise ValueError("MONGODB_URI is not set in environment variables")
+    if mongodb_uri.startswith("mongomock://"):
+        return None
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    with _client_lock:
+        if _async_client is None or _async_client_pid != os.getpid():
+            _async_client = AsyncIOMotorClient(
+                mongodb_uri,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            )
+            _async_client_pid = os.getpid()
+        return _async_client
+
+
+def close_client():
+    """Close the process-wide clients and release their connection pools."""
+    global _client, _client_pid, _async_client, _async_client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+        if _async_client is not None and _async_client_pid == os.getpid():
+            _async_client.close()
+        _async_client = None
+        _async_client_pid = None
+
+
+def _forget_client_after_fork():
+    # The child must not touch the parent's sockets; drop the reference
+    # without closing so the parent's pool stays intact.
+    global _client, _client_pid, _client_lock, _async_client, _async_client_pid
+    _client = None
+    _client_pid = None
+    _async_client = None
+    _async_client_pid = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+
+def get_collection():
+    """
+    Return the chunks collection on the shared client.
+    Connection is created lazily to avoid import-time failures.
+    """
+    return get_client()[DATABASE_NAME][COLLECTION_NAME]
+
+
+def ensure_indexes():
+    """
+    Create the standard (non-search) indexes on the chunks collection.
+    (filename, chunk_hash) serves per-document deletes, fingerprint lookups
+    and stale-chunk removal; its filename prefix serves filename filters.
+    The vector_index search index is created in Atlas (see README).
+    """
+    get_collection().create_index([("filename", 1), ("chunk_hash", 1)])
+    get_manifest_collection()
+
+
+def get_manifest_collection():
+    """Return the document manifest collection (unique on filename)."""
+    global _manifest_indexed
+    collection = get_client()[DATABASE_NAME][MANIFEST_COLLECTION_NAME]
+    if not _manifest_indexed:
+        collection.create_index("filename", unique=True)
+        _manifest_indexed = True
+    return collection
+
+
+# Server error code for "transactions need a replica set or mongos"
+ILLEGAL_OPERATION = 20
+
+
+def run_transaction(write):
+    """
+    Run write(session) in a multi-document transaction.
+    Standalone servers and mongomock have no transactions; there the same
+    writes run one after another with session=None (manage.py
+    rebuild-manifest repairs any drift left by a crash in between).
+    """
+    global _transactions_supported
+    from pymongo.errors import OperationFailure
+
+    if _transactions_supported is not False:
+        try:
+            with get_client().start_session() as session:
+                result = session.with_transaction(write)
+            _transactions_supported = True
+            return result
+        except NotImplementedError:
+            _transactions_supported = False
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+            _transactions_supported = False
+    return write(None)
+
+
+# Server error codes worth retrying: elections, shutdowns, network trouble,
+# write concern timeouts and duplicate keys from racing upserts
+TRANSIENT_ERROR_CODES = {6, 7, 64, 89, 91, 189, 262, 9001, 10107, 11000, 11600, 11602, 13435, 13436}
+
+
+# Where a chunk sits in its document; updated in place when a re-upload moves it
+PLACEMENT_FIELDS = ("page_number", "page_start", "page_end", "pages")
+
+
+def chunk_id(filename: str, chunk_hash: str) -> str:
+    """Stable _id of a chunk, so rewriting it is an idempotent upsert."""
+    return f"{filename}:{chunk_hash}"
+
+
+def _insert_write_concern():
+    """WriteConcern for chunk writes, or None for the client default."""
+    if not INSERT_WRITE_CONCERN_W and not INSERT_JOURNAL:
+        return None
+    from pymongo.write_concern import WriteConcern
+
+    options = {}
+    if INSERT_WRITE_CONCERN_W:
+        w = INSERT_WRITE_CONCERN_W
+        options["w"] = int(w) if w.isdigit() else w
+    if INSERT_JOURNAL:
+        options["j"] = INSERT_JOURNAL == "true"
+    return WriteConcern(**options)
+
+
+def _is_transient(error) -> bool:
+    from pymongo.errors import AutoReconnect, BulkWriteError, OperationFailure
+
+    if isinstance(error, AutoReconnect) or error.has_error_label("RetryableWriteError"):
+        return True
+    if isinstance(error, BulkWriteError):
+        details = error.details or {}
+        codes = [e.get("code") for e in details.get("writeErrors", [])]
+        codes += [e.get("code") for e in details.get("writeConcernErrors", [])]
+        return bool(codes) and all(code in TRANSIENT_ERROR_CODES for code in codes)
+    return isinstance(error, OperationFailure) and error.code in TRANSIENT_ERROR_CODES
+
+
+def _candidate_window(top_k: int) -> Dict[str, int]:
+    """numCandidates / limit for $vectorSearch, keeping limit <= numCandidates <= 10000."""
+    limit = min(top_k, ATLAS_MAX_NUM_CANDIDATES)
+    num_candidates = min(ATLAS_MAX_NUM_CANDIDATES, max(100, limit * ATLAS_CANDIDATES_PER_RESULT))
+    return {"numCandidates": num_candidates, "limit": limit}
+
+
+class AtlasVectorStore:
+    """Retrieval backend using MongoDB Atlas $vectorSearch."""
+
+    def insert(self, documents: List[Dict]):
+        """
+        One unordered bulk write of upserts keyed by chunk_id, so a retry
+        (or a re-run after a crash) rewrites chunks instead of duplicating
+        them. Transient errors are retried with exponential backoff.
+        """
+        from pymongo import InsertOne, ReplaceOne
+        from pymongo.errors import PyMongoError
+
+        collection = get_collection()
+        write_concern = _insert_write_concern()
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+
+        requests = []
+        for document in documents:
+            if document.get("chunk_hash"):
+                _id = chunk_id(document["filename"], document["chunk_hash"])
+                requests.append(ReplaceOne({"_id": _id}, {**document, "_id": _id}, upsert=True))
+            else:
+                # No fingerprint to key on; inserted as-is
+                requests.append(InsertOne(dict(document)))
+
+        for attempt in range(INSERT_MAX_RETRIES + 1):
+            try:
+                collection.bulk_write(requests, ordered=False)
+                return
+            except PyMongoError as e:
+                if attempt == INSERT_MAX_RETRIES or not _is_transient(e):
+                    raise
+                time.sleep(INSERT_RETRY_BACKOFF * 2 ** attempt)
+
+    @staticmethod
+    def _search_pipeline(
+        query_embedding: List[float],
+        top_k: int,
+        include_embeddings: bool,
+        filenames: Optional[List[str]]
+    ) -> List[Dict]:
+        projection = {
+            "_id": 0,
+            "text": 1,
+            "filename": 1,
+            "page_number": 1,
+            "page_end": 1,
+            "pages": 1
+        }
+        if include_embeddings:
+            projection["embedding"] = 1
+
+        vector_search = {
+            "index": "vector_index",
+            "path": "embedding",
+            "queryVector": query_embedding,
+            **_candidate_window(top_k)
+        }
+        if filenames is not None:
+            # Pre-filter: needs "filename" declared as a filter field in vector_index
+            vector_search["filter"] = {"filename": {"$in": list(filenames)}}
+
+        return [
+            {
+                "$vectorSearch": vector_search
+            },
+            {
+                "$project": projection
+            }
+        ]
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        pipeline = self._search_pipeline(query_embedding, top_k, include_embeddings, filenames)
+        return list(get_collection().aggregate(pipeline))
+
+    async def search_async(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        async with limit("mongo"):
+            client = get_async_client()
+            if client is None:
+                return await asyncio.to_thread(self.search, query_embedding, top_k, include_embeddings, filenames)
+            pipeline = self._search_pipeline(query_embedding, top_k, include_embeddings, filenames)
+            cursor = client[DATABASE_NAME][COLLECTION_NAME].aggregate(pipeline)
+            return await cursor.to_list(length=None)
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        # $vectorSearch takes one query vector; run the queries concurrently
+        # over the shared connection pool
+        def search(query_embedding):
+            return self.search(query_embedding, top_k, include_embeddings, filenames)
+
+        if len(query_embeddings) <= 1:
+            return [search(q) for q in query_embeddings]
+        workers = min(ATLAS_SEARCH_CONCURRENCY, len(query_embeddings))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(search, query_embeddings))
+
+    def fingerprints(self, filename: str) -> List[Dict]:
+        cursor = get_collection().find(
+            {"filename": filename},
+            {"_id": 0, "chunk_hash": 1, "file_hash": 1, **{field: 1 for field in PLACEMENT_FIELDS}}
+        )
+        return list(cursor)
+
+    def delete_by_filename(self, filename: str, chunk_hashes: List[str]) -> int:
+        query = {"filename": filename, "chunk_hash": {"$in": list(chunk_hashes)}}
+        return get_collection().delete_many(query).deleted_count
+
+    def embeddings(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[float]]:
+        cursor = get_collection().find(
+            {"_id": {"$in": [chunk_id(filename, chunk_hash) for filename, chunk_hash in keys]}},
+            {"_id": 0, "filename": 1, "chunk_hash": 1, "embedding": 1}
+        )
+        return {(d["filename"], d["chunk_hash"]): d["embedding"] for d in cursor}
+
+    def texts(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        cursor = get_collection().find(
+            {"_id": {"$in": [chunk_id(filename, chunk_hash) for filename, chunk_hash in keys]}},
+            {"_id": 0, "filename": 1, "chunk_hash": 1, "text": 1}
+        )
+        return {(d["filename"], d["chunk_hash"]): d["text"] for d in cursor}
+
+    def iter_records(self):
+        return get_collection().find(
+            {},
+            {"_id": 0, "text": 1, "filename": 1, "chunk_hash": 1, "file_hash": 1, **{field: 1 for field in PLACEMENT_FIELDS}}
+        )
+
+    def finalize_document(
+        self,
+        filename: str,
+        file_hash: str,
+        stale_hashes: List[str],
+        entry: Dict,
+        chunk_fields: Optional[Dict[str, Dict]] = None
+    ) -> int:
+        from pymongo import UpdateOne
+
+        def write(session):
+            chunks = get_collection()
+            removed = 0
+            if stale_hashes:
+                removed = chunks.delete_many(
+                    {"filename": filename, "chunk_hash": {"$in": list(stale_hashes)}},
+                    session=session
+                ).deleted_count
+            chunks.update_many({"filename": filename}, {"$set": {"file_hash": file_hash}}, session=session)
+            if chunk_fields:
+                chunks.bulk_write([
+                    UpdateOne({"_id": chunk_id(filename, chunk_hash)}, {"$set": fields})
+                    for chunk_hash, fields in chunk_fields.items()
+                ], ordered=False, session=session)
+            get_manifest_collection().replace_one({"filename": filename}, entry, upsert=True, session=session)
+            return removed
+
+        return run_transaction(write)
+
+    def remove_document(self, filename: str) -> int:
+        def write(session):
+            removed = get_collection().delete_many({"filename": filename}, session=session).deleted_count
+            get_manifest_collection().delete_one({"filename": filename}, session=session)
+            return removed
+
+        return run_transaction(write)
+
+    def manifest(self) -> List[Dict]:
+        return list(get_manifest_collection().find({}, {"_id": 0}).sort("filename", 1))
+
+    def replace_manifest(self, entries: List[Dict]):
+        def write(session):
+            manifest = get_manifest_collection()
+            manifest.delete_many({}, session=session)
+            if entries:
+                manifest.insert_many([dict(e) for e in entries], session=session)
+
+        run_transaction(write)
+
+    def clear(self):
+        get_collection().delete_many({})
+        get_manifest_collection().delete_many({})
+
+    def count(self) -> int:
+        return get_collection().count_documents({})
+
+    def filenames(self) -> List[str]:
+        return get_collection().distinct("filename")
+
+
+class LocalVectorStore:
+    """Retrieval backend using the in-process NumPy index (no database)."""
+
+    def __init__(self):
+        from local_index import LocalVectorIndex, LocalManifest
+        self.index = LocalVectorIndex()
+        self.manifest_file = LocalManifest(self.index.index_dir)
+
+    def insert(self, documents: List[Dict]):
+        self.index.add(documents)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        return self.index.search(query_embedding, top_k, include_embeddings, filenames)
+
+    async def search_async(
+        self,
+        query_embedding: List[float],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[Dict]:
+        # In-process and CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self.index.search, query_embedding, top_k, include_embeddings, filenames)
+
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 8,
+        include_embeddings: bool = False,
+        filenames: Optional[List[str]] = None
+    ) -> List[List[Dict]]:
+        return self.index.search_batch(query_embeddings, top_k, include_embeddings, filenames)
+
+    def fingerprints(self, filename: str) -> List[Dict]:
+        return [
+            {field: r.get(field) for field in ("chunk_hash", "file_hash", *PLACEMENT_FIELDS)}
+            for r in self.index.records(filename)
+        ]
+
+    def delete_by_filename(self, filename: str, chunk_hashes: List[str]) -> int:
+        return self.index.delete_by_filename(filename, chunk_hashes)
+
+    def embeddings(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[float]]:
+        return self.index.embeddings(keys)
+
+    def texts(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        return self.index.texts(keys)
+
+    def iter_records(self):
+        return iter(self.index.all_records())
+
+    def finalize_document(
+        self,
+        filename: str,
+        file_hash: str,
+        stale_hashes: List[str],
+        entry: Dict,
+        chunk_fields: Optional[Dict[str, Dict]] = None
+    ) -> int:
+        # No transactions here: chunks are written first, the manifest last
+        removed = self.index.delete_by_filename(filename, stale_hashes) if stale_hashes else 0
+        self.index.update_records(filename, {"file_hash": file_hash}, chunk_fields)
+        self.manifest_file.upsert(entry)
+        return removed
+
+    def remove_document(self, filename: str) -> int:
+        removed = self.index.delete_by_filename(filename)
+        self.manifest_file.remove(filename)
+        return removed
+
+    def manifest(self) -> List[Dict]:
+        return self.manifest_file.entries()
+
+    def replace_manifest(self, entries: List[Dict]):
+        self.manifest_file.replace(entries)
+
+    def clear(self):
+        self.index.clear()
+        self.manifest_file.clear()
+
+    def count(self) -> int:
+        return self.index.count()
+
+    def filenames(self) -> List[str]:
+        return self.index.filenames()
+
+
+# Retrieval backend: "atlas" (MongoDB $vectorSearch) or "local" (NumPy index)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "atlas").lower()
+
+BACKENDS = {
+    "atlas": AtlasVectorStore,
+    "local": LocalVectorStore,
+}
+
+_store = None
+
+
+def get_store():
+    """Return the configured retrieval backend (created on first use)."""
+    global _store
+    if _store is None:
+        if VECTOR_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+        _store = BACKENDS[VECTOR_BACKEND]()
+    return _store
+
+
+def set_store(store):
+    """Replace the retrieval backend (used by tests and benchmarks)."""
+    global _store
+    _store = store
+
+
+# Retrieval mode: "vector" or "hybrid" (vector + local BM25 index).
+# In hybrid mode every insert/delete below is mirrored into the BM25 index.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+
+_lexical = None
+
+
+def get_lexical_index():
+    """Return the BM25 index in hybrid mode, otherwise None."""
+    global _lexical
+    if RETRIEVAL_MODE != "hybrid":
+        return None
+    if _lexical is None:
+        from lexical_index import InvertedIndex
+        _lexical = InvertedIndex()
+    return _lexical
+
+
+# Near-duplicate detection at ingestion (see dedup.py). When enabled, the
+# corpus MinHash index mirrors every insert/delete, like the BM25 index.
+DEDUP_NEAR_DUPLICATES = os.getenv("DEDUP_NEAR_DUPLICATES", "false").lower() == "true"
+
+_duplicates = None
+
+
+def get_duplicate_index():
+    """Return the corpus near-duplicate index when dedup is enabled, otherwise None."""
+    global _duplicates
+    if not DEDUP_NEAR_DUPLICATES:
+        return None
+    if _duplicates is None:
+        from dedup import NearDuplicateIndex, DEDUP_INDEX_FILE
+        from local_index import LOCAL_INDEX_DIR
+        _duplicates = NearDuplicateIndex(os.path.join(LOCAL_INDEX_DIR, DEDUP_INDEX_FILE))
+    return _duplicates
+
+
+def rebuild_lexical_index() -> int:
+    """Rebuild the BM25 index from every chunk in the vector store."""
+    lexical = get_lexical_index()
+    if lexical is None:
+        raise ValueError("RETRIEVAL_MODE is not 'hybrid'")
+
+    lexical.clear()
+    batch = []
+    total = 0
+    for record in get_store().iter_records():
+        batch.append(record)
+        if len(batch) == 1000:
+            lexical.add(batch)
+            total += len(batch)
+            batch = []
+    lexical.add(batch)
+    return total + len(batch)
+
+
+def rebuild_duplicate_index() -> int:
+    """Rebuild the near-duplicate index from every chunk in the vector store."""
+    duplicates = get_duplicate_index()
+    if duplicates is None:
+        raise ValueError("DEDUP_NEAR_DUPLICATES is not enabled")
+
+    duplicates.clear()
+    batch = []
+    total = 0
+    for record in get_store().iter_records():
+        batch.append(record)
+        if len(batch) == 1000:
+            duplicates.add_chunks(batch)
+            total += len(batch)
+            batch = []
+    duplicates.add_chunks(batch)
+    return total + len(batch)
+
+
+def get_embeddings(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[float]]:
+    """Stored vectors of chunks by (filename, chunk_hash); missing chunks are left out."""
+    if not keys:
+        return {}
+    with span("embedding_lookup"):
+        return get_store().embeddings(list(keys))
+
+
+def lexical_search(query: str, top_k: int = 8, filenames: Optional[List[str]] = None) -> List[Dict]:
+    """Top-k chunks by BM25 score (empty outside hybrid mode)."""
+    lexical = get_lexical_index()
+    if lexical is None:
+        return []
+    with span("bm25_search"):
+        hits = lexical.search(query, top_k, filenames)
+        # The BM25 index keeps no text; read it back by (filename, chunk_hash)
+        missing = [(h["filename"], h["chunk_hash"]) for h in hits if "text" not in h]
+        if missing:
+            texts = get_store().texts(missing)
+            for hit in hits:
+                if "text" not in hit:
+                    hit["text"] = texts.get((hit["filename"], hit["chunk_hash"]))
+        return [h for h in hits if h["text"] is not None]
 
 
 def insert_chunks(chunks_with_embeddings: List[Dict]):
     """
-    Insert chunk documents into MongoDB.
+    Insert chunk documents into the vector store.
 
     Each document should contain:
     - text
     - embedding (vector)
     - filename
-    - page_number
+    - page_number (page_start / page_end for chunks spanning pages, optional)
+    - chunk_hash / file_hash (content fingerprints, optional)
     """
     if not chunks_with_embeddings:
         return
 
-    collection = get_collection()
-    collection.insert_many(chunks_with_embeddings)
+    # Written in INSERT_BATCH_SIZE sub-batches; if one fails, the ones
+    # already stored stay stored (and searchable) and the error propagates
+    stored = 0
+    try:
+        for start in range(0, len(chunks_with_embeddings), INSERT_BATCH_SIZE):
+            batch = chunks_with_embeddings[start:start + INSERT_BATCH_SIZE]
+            with span("insert"):
+                get_store().insert(batch)
+            stored += len(batch)
+    finally:
+        lexical = get_lexical_index()
+        if lexical is not None and stored:
+            with span("bm25_insert"):
+                lexical.add(chunks_with_embeddings[:stored])
+        duplicates = get_duplicate_index()
+        if duplicates is not None and stored:
+            duplicates.add_chunks(chunks_with_embeddings[:stored])
+
+
+def search_chunks(
+    query_embedding: List[float],
+    top_k: int = 8,
+    include_embeddings: bool = False,
+    filenames: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    Return the top-k chunks most similar to the query embedding.
+    Each result has text, filename and page_number (and embedding if asked).
+    With filenames, only chunks of those documents are searched.
+    """
+    with span("vector_search"):
+        return get_store().search(query_embedding, top_k, include_embeddings, filenames)
+
+
+async def search_chunks_async(
+    query_embedding: List[float],
+    top_k: int = 8,
+    include_embeddings: bool = False,
+    filenames: Optional[List[str]] = None
+) -> List[Dict]:
+    """search_chunks for the async request path; never blocks the event loop."""
+    with span("vector_search"):
+        return await get_store().search_async(query_embedding, top_k, include_embeddings, filenames)
+
+
+def search_chunks_batch(
+    query_embeddings: List[List[float]],
+    top_k: int = 8,
+    include_embeddings: bool = False,
+    filenames: Optional[List[str]] = None
+) -> List[List[Dict]]:
+    """
+    search_chunks for many queries at once: one matrix product on the local
+    index, concurrent queries on Atlas. Results are in query order.
+    """
+    if not query_embeddings:
+        return []
+    with span("vector_search_batch"):
+        return get_store().search_batch(query_embeddings, top_k, include_embeddings, filenames)
+
+
+def delete_document(filename: str) -> int:
+    """Remove every chunk of one document and its manifest entry. Returns chunks removed."""
+    for index in (get_lexical_index(), get_duplicate_index()):
+        if index is not None:
+            index.delete_by_filename(filename)
+    with span("delete_document"):
+        return get_store().remove_document(filename)
+
+
+def get_fingerprints(filename: str) -> List[Dict]:
+    """Return chunk_hash / file_hash for every stored chunk of a document."""
+    with span("fingerprint_lookup"):
+        return get_store().fingerprints(filename)
+
+
+def delete_chunks(filename: str, chunk_hashes: List[str]) -> int:
+    """Remove the listed chunks (by chunk_hash) of one document, e.g. those of an interrupted ingest."""
+    if not chunk_hashes:
+        return 0
+    for index in (get_lexical_index(), get_duplicate_index()):
+        if index is not None:
+            index.delete_by_filename(filename, list(chunk_hashes))
+    with span("delete_chunks"):
+        return get_store().delete_by_filename(filename, list(chunk_hashes))
+
+
+def finalize_document(
+    filename: str,
+    file_hash: str,
+    stale_hashes: List[str],
+    chunk_count: int,
+    text_bytes: int,
+    file_bytes: Optional[int] = None,
+    chunk_fields: Optional[Dict[str, Dict]] = None
+) -> int:
+    """
+    Finish ingesting a document: remove its stale chunks, record the file
+    hash on the rest and upsert its manifest entry, all in one transaction
+    where the backend supports it. chunk_fields sets page fields (see
+    PLACEMENT_FIELDS) by chunk_hash, for chunks that moved. Returns chunks removed.
+    """
+    for index in (get_lexical_index(), get_duplicate_index()):
+        if index is not None and stale_hashes:
+            index.delete_by_filename(filename, list(stale_hashes))
+    lexical = get_lexical_index()
+    if lexical is not None and chunk_fields:
+        lexical.update_records(filename, chunk_fields)
+
+    entry = {
+        "filename": filename,
+        "chunk_count": chunk_count,
+        "text_bytes": text_bytes,
+        "file_bytes": file_bytes,
+        "file_hash": file_hash,
+        "ingested_at": datetime.now(timezone.utc).isoformat()
+    }
+    with span("finalize"):
+        return get_store().finalize_document(filename, file_hash, list(stale_hashes), entry, chunk_fields)
+
+
+def get_manifest() -> List[Dict]:
+    """One entry per document, sorted by filename."""
+    return get_store().manifest()
+
+
+def rebuild_manifest() -> int:
+    """
+    Recompute the manifest from the stored chunks (repairs drift).
+    file_bytes / ingested_at are kept for documents whose file hash is
+    unchanged. Returns the number of documents.
+    """
+    store = get_store()
+    previous = {e["filename"]: e for e in store.manifest()}
+
+    entries: Dict[str, Dict] = {}
+    for record in store.iter_records():
+        entry = entries.get(record["filename"])
+        if entry is None:
+            entry = entries[record["filename"]] = {
+                "filename": record["filename"],
+                "chunk_count": 0,
+                "text_bytes": 0,
+                "file_bytes": None,
+                "file_hash": record.get("file_hash"),
+                "ingested_at": None
+            }
+        entry["chunk_count"] += 1
+        entry["text_bytes"] += len(record["text"].encode("utf-8"))
+        if record.get("file_hash") != entry["file_hash"]:
+            entry["file_hash"] = None  # interrupted or mixed ingest
+
+    for filename, entry in entries.items():
+        old = previous.get(filename)
+        if old is not None and entry["file_hash"] is not None and old.get("file_hash") == entry["file_hash"]:
+            entry["file_bytes"] = old.get("file_bytes")
+            entry["ingested_at"] = old.get("ingested_at")
+
+    store.replace_manifest(sorted(entries.values(), key=lambda e: e["filename"]))
+    return len(entries)
 
 
 def clear_collection():
     """
-    Remove all documents from the collection.
+    Remove all documents from the vector store.
     Used to reset the knowledge base.
     """
-    collection = get_collection()
-    collection.delete_many({})
+    get_store().clear()
+
+    for index in (get_lexical_index(), get_duplicate_index()):
+        if index is not None:
+            index.clear()
 
 
 def get_stats() -> Dict:
     """
     Return basic statistics about stored data.
+    Read from the document manifest, not by scanning chunks.
     """
-    collection = get_collection()
-    total_chunks = collection.count_documents({})
-    return {"total_chunks": total_chunks}
+    manifest = get_manifest()
+    return {
+        "total_chunks": sum(e["chunk_count"] for e in manifest),
+        "documents": [e["filename"] for e in manifest],
+        "manifest": manifest
+    }
@@ -0,0 +1,104 @@
+# backend/warmup.py
+
+"""
+Startup Warm-Up
+
+Heavy dependencies (Gemini SDK, PyPDF2, python-docx, pymongo) are
+imported on first use, so the app can serve health checks as soon as it
+has started. The FastAPI lifespan then calls start(), which does that
+first use on a background thread:
+- atlas: creates the standard indexes, which also opens the Mongo pool
+- local: maps the vector index (and loads BM25 in hybrid mode)
+- imports and configures the Gemini SDK and creates its client
+- imports the PDF / DOCX parsers
+
+Requests that arrive before a step finishes just load what they need
+themselves. WARMUP=false skips everything except index creation.
+"""
+
+from typing import Callable, Dict, List, Tuple
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+
+_lock = threading.Lock()
+_steps: Dict[str, Dict] = {}
+
+
+def _atlas_indexes():
+    from vector_store import ensure_indexes
+    ensure_indexes()
+
+
+def _local_index():
+    from vector_store import get_store, get_lexical_index
+    get_store()
+    get_lexical_index()
+
+
+def _gemini():
+    from embedding import get_embedder, GeminiEmbedder
+    from generation import get_generator, GeminiGenerator
+    from gemini import open_client
+
+    # Skip when tests or benchmarks have swapped in fakes
+    if isinstance(get_embedder(), GeminiEmbedder) or isinstance(get_generator(), GeminiGenerator):
+        open_client()
+
+
+def _parsers():
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
+
+
+def default_steps(vector_backend: str, enabled: bool = WARMUP) -> List[Tuple[str, Callable]]:
+    """The warm-up steps for this configuration, in run order."""
+    steps = []
+    if vector_backend == "atlas":
+        steps.append(("mongo", _atlas_indexes))
+    if not enabled:
+        return steps
+    if vector_backend == "local":
+        steps.append(("local_index", _local_index))
+    steps.append(("gemini", _gemini))
+    steps.append(("parsers", _parsers))
+    return steps
+
+
+def _run(steps: List[Tuple[str, Callable]]):
+    for name, step in steps:
+        with _lock:
+            _steps[name] = {"state": "running"}
+        start = time.perf_counter()
+        try:
+            step()
+            result = {"state": "done"}
+        except Exception as e:
+            # Not fatal: the first request that needs it will try again
+            result = {"state": "failed", "error": str(e)}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        with _lock:
+            _steps[name] = result
+
+
+def start(steps: List[Tuple[str, Callable]]) -> threading.Thread:
+    """Run the steps on a background thread and return immediately."""
+    with _lock:
+        _steps.clear()
+        for name, _ in steps:
+            _steps[name] = {"state": "pending"}
+    thread = threading.Thread(target=_run, args=(steps,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def status() -> Dict[str, Dict]:
+    """Per-step state ("pending", "running", "done", "failed") and duration."""
+    with _lock:
+        return {name: dict(step) for name, step in _steps.items()}
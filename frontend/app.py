@@ -1,5 +1,7 @@
 # frontend/app.py
 
+import json
+import time
 import streamlit as st
 import requests
 
@@ -19,21 +21,57 @@ uploaded_file = st.sidebar.file_uploader(
 )
 
 # Upload logic
-if uploaded_file is not None:
-    with st.spinner("Uploading and indexing document..."):
+def wait_for_job(job_id):
+    """Poll an ingestion job until it finishes, showing progress in the sidebar."""
+    progress_bar = st.sidebar.progress(0.0, text="Queued")
+    while True:
+        job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            progress_bar.empty()
+            return job
+
+        fraction = job["chunks_processed"] / job["chunks_total"] if job["chunks_total"] else 0.0
+        progress_bar.progress(
+            min(fraction, 1.0),
+            text=f"{job['stage'].title()} · {job['chunks_processed']}/{job['chunks_total']} chunks"
+        )
+        time.sleep(0.5)
+
+
+if "indexed_files" not in st.session_state:
+    st.session_state.indexed_files = {}
+
+# Streamlit reruns this script on every interaction; only submit each file once
+upload_key = (uploaded_file.name, uploaded_file.size) if uploaded_file is not None else None
+
+if uploaded_file is not None and upload_key not in st.session_state.indexed_files:
+    with st.spinner("Uploading document..."):
         files = {"file": (uploaded_file.name, uploaded_file.getvalue())}
         response = requests.post(f"{BACKEND_URL}/upload", files=files)
 
-    if response.status_code == 200:
-        result = response.json()
-        st.sidebar.success("✅ Indexed successfully!")
-        st.sidebar.info(f"📊 {result['chunks_created']} chunks created")
+    if response.status_code == 202:
+        job = wait_for_job(response.json()["job_id"])
+        if job["status"] == "completed":
+            st.session_state.indexed_files[upload_key] = job["result"]
+        else:
+            st.sidebar.error(job.get("error") or f"Indexing {job['status']}")
     else:
         st.sidebar.error(response.json().get("detail", "Upload failed"))
 
+if upload_key in st.session_state.indexed_files:
+    result = st.session_state.indexed_files[upload_key]
+    st.sidebar.success(f"✅ {result['message']}")
+    st.sidebar.info(f"📊 {result['chunks_created']} chunks created")
+    if result.get("chunks_reused"):
+        st.sidebar.caption(
+            f"♻️ {result['chunks_reused']} reused, "
+            f"{result['chunks_added']} added, {result['chunks_removed']} removed"
+        )
+
 st.sidebar.divider()
 
 # Show current knowledge base status
+documents = []
 try:
     status_response = requests.get(f"{BACKEND_URL}/status")
     if status_response.status_code == 200:
@@ -43,11 +81,22 @@ try:
             st.sidebar.metric("Documents", status_data["total_documents"])
             st.sidebar.metric("Total Chunks", status_data["total_chunks"])
             
-            # Show list of uploaded documents
+            # Show list of uploaded documents, each removable on its own
             if "documents" in status_data and status_data["documents"]:
+                documents = status_data["documents"]
                 st.sidebar.markdown("**Uploaded Documents:**")
-                for doc in status_data["documents"]:
-                    st.sidebar.text(f"• {doc}")
+                for doc in documents:
+                    name_col, delete_col = st.sidebar.columns([5, 1])
+                    name_col.text(f"• {doc}")
+                    if delete_col.button("🗑️", key=f"delete_{doc}", help=f"Remove {doc}"):
+                        res = requests.delete(f"{BACKEND_URL}/documents/{requests.utils.quote(doc)}")
+                        if res.status_code == 200:
+                            st.session_state.indexed_files = {
+                                k: v for k, v in st.session_state.indexed_files.items() if k[0] != doc
+                            }
+                            st.rerun()
+                        else:
+                            st.sidebar.error(res.json().get("detail", "Failed to remove document"))
         else:
             st.sidebar.info("📭 No documents indexed")
 except:
@@ -58,10 +107,11 @@ st.sidebar.divider()
 if st.sidebar.button("Reset Knowledge Base"):
     res = requests.delete(f"{BACKEND_URL}/reset")
     if res.status_code == 200:
+        st.session_state.indexed_files = {}
         st.sidebar.success("Knowledge base reset successfully")
         st.rerun()
     else:
-        st.sidebar.error("Failed to reset knowledge base")
+        st.sidebar.error(res.json().get("detail", "Failed to reset knowledge base"))
 
 # Chat section
 st.header("💬 Ask a Question")
@@ -79,23 +129,88 @@ if uploaded_file is None and not st.session_state.chat_history:
 default_question = "" if st.session_state.clear_input else None
 question = st.text_input("Enter your question", value=default_question, key="question_input")
 
+# Optional: only search some documents (empty = all)
+selected_documents = st.multiselect("Search only in", documents, placeholder="All documents") if len(documents) > 1 else []
+
 # Reset clear flag after rendering
 if st.session_state.clear_input:
     st.session_state.clear_input = False
 
+def read_sse(response):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+
+
+def page_label(src):
+    """"Page 3", "Pages 3-4" for a source that runs across pages, or "Pages 1, 3, 5"."""
+    if len(src.get("pages") or []) > 1:
+        return "Pages " + ", ".join(str(p) for p in src["pages"])
+    end = src.get("page_end")
+    if end and end != src["page_number"]:
+        return f"Pages {src['page_number']}-{end}"
+    return f"Page {src['page_number']}"
+
+
+def stream_answer(payload):
+    """
+    Ask via /ask/stream, rendering sources and answer text as they arrive.
+    Returns the final result, or None on error.
+    """
+    live = st.empty()
+    searching = ""
+    answer = ""
+
+    def render():
+        with live.container():
+            if searching:
+                st.caption(searching)
+            st.markdown(answer + "▌")
+
+    with requests.post(f"{BACKEND_URL}/ask/stream", json=payload, stream=True) as response:
+        if response.status_code != 200:
+            st.error(response.json().get("detail", "Error answering question"))
+            return None
+
+        for event, data in read_sse(response):
+            if event == "citations" and data:
+                searching = "Searching in: " + ", ".join(
+                    f"{src['filename']} ({page_label(src)})" for src in data
+                )
+                render()
+            elif event == "token":
+                answer += data
+                render()
+            elif event == "done":
+                live.empty()
+                return {
+                    "answer": data["answer"],
+                    "sources": data["citations"],
+                    "ttft_ms": data["ttft_ms"]
+                }
+            elif event == "error":
+                live.empty()
+                st.error(data.get("detail", "Error answering question"))
+                return None
+    return None
+
+
 if st.button("Ask"):
     if not question.strip():
         st.warning("Please enter a question.")
     else:
         payload = {"question": question, "top_k": 5}
-        response = requests.post(f"{BACKEND_URL}/ask", json=payload)
+        if selected_documents:
+            payload["filenames"] = selected_documents
+        result = stream_answer(payload)
 
-        if response.status_code == 200:
-            result = response.json()
+        if result is not None:
             # Clear previous history and show only current answer
             st.session_state.chat_history = [result]
-        else:
-            st.error(response.json().get("detail", "Error answering question"))
 
 # Display chat history
 for item in st.session_state.chat_history:
@@ -105,7 +220,10 @@ for item in st.session_state.chat_history:
     if item["sources"]:
         st.markdown("**Sources:**")
         for src in item["sources"]:
-            st.write(f"- {src['filename']} (Page {src['page_number']})")
+            st.write(f"- {src['filename']} ({page_label(src)})")
+
+    if item.get("ttft_ms") is not None:
+        st.caption(f"⚡ First token in {item['ttft_ms']:.0f} ms")
 
 st.divider()
 